@@ -0,0 +1,76 @@
+"""
+Массовое включение и выключение объявлений.
+
+UPDATE в обход save() не вызывает сигналы post_save, поэтому вместе
+с флагом is_active здесь же сбрасываются кэши объявлений, объявления
+ставятся в очередь пересчета похожих и обновляются индексы поиска
+и подсказок — так же, как это делают сигналы при сохранении одного
+объявления. Индексы в памяти процесса обновляются сразу, остальные
+процессы перестраивают их по версии в общем кэше (см. index_versions).
+"""
+from django.db.models.functions import Now
+
+from . import autocomplete
+from .autocomplete import prefix_index
+from .http_cache import purge_ads
+from .index_versions import bump_version
+from .models import Ad
+from .object_cache import invalidate_ads
+from .search import trigram_index
+from .similarity import queue_similar_ads
+
+
+def add_to_ad_indexes(ads):
+    """Добавляет в индексы пары (id объявления, заголовок)"""
+    for ad_id, title in ads:
+        if trigram_index.is_built:
+            trigram_index.add(ad_id, title)
+        if prefix_index.is_built:
+            prefix_index.add(autocomplete.AD, ad_id, title)
+    bump_version(trigram_index)
+    bump_version(prefix_index)
+
+
+def remove_from_ad_indexes(ad_ids):
+    for ad_id in ad_ids:
+        if trigram_index.is_built:
+            trigram_index.remove(ad_id)
+        if prefix_index.is_built:
+            prefix_index.remove(autocomplete.AD, ad_id)
+    bump_version(trigram_index)
+    bump_version(prefix_index)
+
+
+def set_ads_active(ad_ids, is_active):
+    """
+    Включает или выключает объявления ad_ids одним UPDATE.
+    Возвращает число обновленных объявлений.
+    """
+    ad_ids = list(ad_ids)
+    if not ad_ids:
+        return 0
+
+    updated = Ad.objects.filter(id__in=ad_ids).update(
+        is_active=is_active,
+        updated_at=Now()
+    )
+    invalidate_ads(ad_ids)
+    purge_ads(ad_ids)
+    queue_similar_ads(ad_ids)
+
+    if not is_active:
+        remove_from_ad_indexes(ad_ids)
+    else:
+        add_to_ad_indexes(
+            Ad.objects.filter(id__in=ad_ids).values_list('id', 'title')
+            if trigram_index.is_built or prefix_index.is_built else []
+        )
+    return updated
+
+
+def deactivate_ads(ad_ids):
+    return set_ads_active(ad_ids, False)
+
+
+def activate_ads(ad_ids):
+    return set_ads_active(ad_ids, True)
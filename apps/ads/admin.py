@@ -1,18 +1,73 @@
 from django.contrib import admin
 
-from .models import Ad, Category, ExchangeProposal
+from .activation import activate_ads, deactivate_ads
+from .models import (
+    Ad, BatchJobCheckpoint, Category, ExchangeProposal, SavedSearch
+)
+from .pagination import EstimatedCountPaginator
+from .proposals import accept_proposals, reject_proposals
 
 
 @admin.register(Ad)
 class AdAdmin(admin.ModelAdmin):
-    pass
+    list_display = (
+        'id', 'title', 'user', 'category', 'condition', 'is_active', 'created_at'
+    )
+    list_select_related = ('user', 'category')
+    list_filter = ('is_active', 'condition')
+    search_fields = ('title',)
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('category',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('activate', 'deactivate')
+
+    @admin.action(description='Активировать выбранные объявления')
+    def activate(self, request, queryset):
+        updated = activate_ads(queryset.values_list('id', flat=True))
+        self.message_user(request, f'Активировано объявлений: {updated}')
+
+    @admin.action(description='Деактивировать выбранные объявления')
+    def deactivate(self, request, queryset):
+        updated = deactivate_ads(queryset.values_list('id', flat=True))
+        self.message_user(request, f'Деактивировано объявлений: {updated}')
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    pass
+    search_fields = ('name',)
 
 
 @admin.register(ExchangeProposal)
 class ExchangeProposalAdmin(admin.ModelAdmin):
-    pass
\ No newline at end of file
+    list_display = ('id', 'ad_sender', 'ad_receiver', 'status', 'created_at')
+    list_select_related = ('ad_sender', 'ad_receiver')
+    list_filter = ('status',)
+    autocomplete_fields = ('ad_sender', 'ad_receiver')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('accept', 'reject')
+
+    @admin.action(description='Принять выбранные предложения')
+    def accept(self, request, queryset):
+        accepted = accept_proposals(queryset)
+        self.message_user(request, f'Принято предложений: {len(accepted)}')
+
+    @admin.action(description='Отклонить выбранные предложения')
+    def reject(self, request, queryset):
+        rejected = reject_proposals(queryset)
+        self.message_user(request, f'Отклонено предложений: {len(rejected)}')
+
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'query', 'category', 'condition', 'created_at')
+    list_select_related = ('user', 'category')
+    raw_id_fields = ('user',)
+    readonly_fields = ('term_count',)
+
+
+@admin.register(BatchJobCheckpoint)
+class BatchJobCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_id', 'processed', 'updated_at', 'finished_at')
+    readonly_fields = ('last_id', 'processed', 'updated_at', 'finished_at')
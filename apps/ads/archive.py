@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Ad, ArchivedAd, ArchivedExchangeProposal, ExchangeProposal
+
+
+def archivable_ads(older_than_days):
+    """
+    Неактивные объявления, не менявшиеся older_than_days дней
+    и без ожидающих ответа предложений обмена.
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    waiting_proposals = ExchangeProposal.objects.filter(
+        Q(ad_sender=OuterRef('pk')) | Q(ad_receiver=OuterRef('pk')),
+        status=ExchangeProposal.Status.WAITING
+    )
+    return (
+        Ad.objects
+        .filter(is_active=False, updated_at__lt=cutoff)
+        .exclude(Exists(waiting_proposals))
+        .order_by('id')
+    )
+
+
+def _archived_ad(ad):
+    return ArchivedAd(
+        id=ad.id,
+        user_id=ad.user_id,
+        title=ad.title,
+        description=ad.description,
+        image_url=ad.image_url,
+        category_id=ad.category_id,
+        condition=ad.condition,
+        created_at=ad.created_at,
+        updated_at=ad.updated_at,
+    )
+
+
+def _archived_proposal(proposal):
+    return ArchivedExchangeProposal(
+        id=proposal.id,
+        ad_sender_id=proposal.ad_sender_id,
+        ad_receiver_id=proposal.ad_receiver_id,
+        comment=proposal.comment,
+        status=proposal.status,
+        created_at=proposal.created_at,
+        updated_at=proposal.updated_at,
+    )
+
+
+def archive_batch(older_than_days, after_id=0, batch_size=500):
+    """
+    Переносит в архив следующую пачку объявлений с id > after_id
+    вместе с их предложениями обмена.
+
+    Пачка переносится в одной транзакции, поэтому прерванную архивацию
+    можно просто запустить заново. Возвращает (последний id в пачке,
+    число объявлений, число предложений); id равен None, если
+    переносить больше нечего.
+    """
+    with transaction.atomic():
+        ads = list(
+            archivable_ads(older_than_days)
+            .filter(id__gt=after_id)
+            .select_for_update(skip_locked=True)
+            [:batch_size]
+        )
+        if not ads:
+            return None, 0, 0
+
+        ad_ids = [ad.id for ad in ads]
+        proposals = list(ExchangeProposal.objects.filter(
+            Q(ad_sender_id__in=ad_ids) | Q(ad_receiver_id__in=ad_ids)
+        ))
+
+        ArchivedAd.objects.bulk_create(
+            [_archived_ad(ad) for ad in ads],
+            ignore_conflicts=True
+        )
+        ArchivedExchangeProposal.objects.bulk_create(
+            [_archived_proposal(proposal) for proposal in proposals],
+            ignore_conflicts=True
+        )
+        ExchangeProposal.objects.filter(
+            id__in=[proposal.id for proposal in proposals]
+        ).delete()
+        Ad.objects.filter(id__in=ad_ids).delete()
+
+    return ad_ids[-1], len(ads), len(proposals)
@@ -0,0 +1,129 @@
+import logging
+import threading
+from bisect import bisect_left, insort
+
+from django.db import DatabaseError
+
+from .index_versions import rebuild, refresh_if_stale
+from .models import Ad, Category
+from .text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+AD = 'ad'
+CATEGORY = 'category'
+
+
+class PrefixIndex:
+    """
+    Индекс подсказок по префиксу на отсортированном массиве.
+
+    Хранит кортежи (нормализованная строка, тип, id), поэтому поиск
+    по префиксу - это бинарный поиск и короткий последовательный обход.
+    """
+
+    # Сколько записей просматривается в поиске уникальных подсказок
+    SCAN_FACTOR = 4
+
+    name = 'prefix'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._labels = {}
+        self.is_built = False
+        # Общая версия, с которой построен индекс, и время ее проверки
+        self.version = None
+        self.checked_at = 0.0
+
+    def build(self, entries):
+        """Заполняет индекс из итерируемого (тип, id, подпись)"""
+        keys = []
+        labels = {}
+        for kind, object_id, label in entries:
+            keys.append((normalize_text(label), kind, object_id))
+            labels[(kind, object_id)] = label
+        keys.sort()
+
+        with self._lock:
+            self._keys = keys
+            self._labels = labels
+            self.is_built = True
+
+    def add(self, kind, object_id, label):
+        with self._lock:
+            self._remove(kind, object_id)
+            insort(self._keys, (normalize_text(label), kind, object_id))
+            self._labels[(kind, object_id)] = label
+
+    def remove(self, kind, object_id):
+        with self._lock:
+            self._remove(kind, object_id)
+
+    def suggest(self, prefix, limit=10):
+        """Возвращает до limit уникальных подписей, начинающихся с prefix"""
+        prefix = normalize_text(prefix)
+        if not prefix:
+            return []
+
+        suggestions = []
+        with self._lock:
+            position = bisect_left(self._keys, (prefix,))
+            end = min(position + limit * self.SCAN_FACTOR, len(self._keys))
+            for key, kind, object_id in self._keys[position:end]:
+                if not key.startswith(prefix):
+                    break
+                label = self._labels[(kind, object_id)]
+                if label not in suggestions:
+                    suggestions.append(label)
+                    if len(suggestions) == limit:
+                        break
+        return suggestions
+
+    def _remove(self, kind, object_id):
+        label = self._labels.pop((kind, object_id), None)
+        if label is None:
+            return
+        key = (normalize_text(label), kind, object_id)
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+
+
+prefix_index = PrefixIndex()
+
+
+def _index_entries():
+    ads = Ad.objects.filter(is_active=True).values_list('id', 'title')
+    for ad_id, title in ads.iterator():
+        yield AD, ad_id, title
+    for category_id, name in Category.objects.values_list('id', 'name'):
+        yield CATEGORY, category_id, name
+
+
+def _build():
+    prefix_index.build(_index_entries())
+
+
+def build_prefix_index():
+    rebuild(prefix_index, _build)
+
+
+def get_prefix_index():
+    """
+    Возвращает индекс, заполняя его из базы при первом обращении
+    и после изменений в других процессах
+    """
+    refresh_if_stale(prefix_index, _build)
+    return prefix_index
+
+
+def warm_up_prefix_index():
+    """Заполняет индекс при старте воркера, не мешая запуску при ошибке БД"""
+    try:
+        build_prefix_index()
+    except DatabaseError:
+        logger.warning(
+            'Индекс подсказок будет построен при первом запросе',
+            exc_info=True
+        )
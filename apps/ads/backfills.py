@@ -0,0 +1,242 @@
+"""
+Онлайн-заполнение данных в больших таблицах.
+
+Схема и данные меняются раздельно: миграция только добавляет столбец
+или таблицу (допускающие NULL или со значением по умолчанию), данные
+заполняет команда backfill на работающем сервисе, а ограничения вроде
+NOT NULL добавляет следующая миграция, когда verify показывает, что
+незаполненных строк не осталось.
+
+Задача заполнения наследует BackfillJob и регистрируется декоратором
+register. Команда проходит таблицу диапазонами первичного ключа,
+каждый диапазон обрабатывается в отдельной короткой транзакции,
+а последний обработанный id сохраняется в BatchJobCheckpoint, поэтому
+прерванное заполнение продолжается с того же места.
+"""
+import time
+from abc import ABC, abstractmethod
+
+from django.db import connection, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import F, Max, Min
+
+from .batching import pause
+from .duplicates import signature_fields
+from .geo import encode
+from .models import Ad, AdSignature, BatchJobCheckpoint, ExchangeProposal
+
+CHECKPOINT_NAME = 'backfill:{}'
+
+jobs = {}
+
+
+def register(job_class):
+    """
+    Регистрирует задачу. Экземпляр создается сразу, поэтому задача
+    без pending или backfill падает с TypeError при импорте модуля,
+    а не посреди заполнения.
+    """
+    jobs[job_class.name] = job_class()
+    return job_class
+
+
+class BackfillJob(ABC):
+    """Задача заполнения данных"""
+
+    name = None
+    description = ''
+    model = None
+
+    @abstractmethod
+    def pending(self):
+        """Строки, которые еще нужно заполнить"""
+
+    @abstractmethod
+    def backfill(self, queryset):
+        """Заполняет строки пачки, возвращает число заполненных"""
+
+    def backfill_range(self, start_id, end_id):
+        return self.backfill(
+            self.pending().filter(pk__gte=start_id, pk__lte=end_id).order_by('pk')
+        )
+
+    def key_range(self):
+        """(наименьший, наибольший) id таблицы или (None, None) для пустой"""
+        bounds = self.model.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        return bounds['first'], bounds['last']
+
+    def verify(self):
+        """Число незаполненных строк; 0 означает, что заполнение завершено"""
+        return self.pending().count()
+
+
+class BackfillProgress:
+    """Прогресс заполнения для вывода в команде"""
+
+    def __init__(self, first_id, last_id, position, processed=0):
+        self.first_id = first_id
+        self.last_id = last_id
+        self.position = position
+        # Заполнено строк всего, с учетом прерванных запусков
+        self.processed = processed
+        # Заполнено строк в этом запуске
+        self.updated = 0
+        self.started = time.monotonic()
+
+    @property
+    def percent(self):
+        done = self.position - self.first_id + 1
+        total = self.last_id - self.first_id + 1
+        return max(0.0, min(100.0, 100.0 * done / total))
+
+    @property
+    def rate(self):
+        """Заполнено строк в секунду"""
+        elapsed = time.monotonic() - self.started
+        return self.updated / elapsed if elapsed else 0.0
+
+
+def backfill_checkpoint(job, restart=False):
+    checkpoint, _ = BatchJobCheckpoint.objects.get_or_create(
+        name=CHECKPOINT_NAME.format(job.name)
+    )
+    if restart or checkpoint.finished_at is not None:
+        checkpoint.reset()
+    return checkpoint
+
+
+def run_backfill(job, batch_size=1000, sleep=0.1, rows_per_second=None,
+                 max_replication_lag=None, restart=False, on_progress=None):
+    """
+    Заполняет строки задачи диапазонами id по batch_size.
+
+    rows_per_second ограничивает скорость: после пачки пауза
+    продлевается так, чтобы средняя скорость не превышала лимит.
+    on_progress(progress) вызывается после каждой пачки.
+    """
+    checkpoint = backfill_checkpoint(job, restart=restart)
+    first_id, last_id = job.key_range()
+    if first_id is None:
+        checkpoint.finish()
+        return BackfillProgress(0, 0, 0)
+
+    start_id = max(first_id, checkpoint.last_id + 1)
+    progress = BackfillProgress(
+        first_id, last_id, start_id - 1, checkpoint.processed
+    )
+
+    while start_id <= last_id:
+        end_id = start_id + batch_size - 1
+        batch_started = time.monotonic()
+        with transaction.atomic():
+            updated = job.backfill_range(start_id, end_id)
+        checkpoint.advance(min(end_id, last_id), updated)
+
+        progress.position = min(end_id, last_id)
+        progress.processed = checkpoint.processed
+        progress.updated += updated
+        if on_progress is not None:
+            on_progress(progress)
+
+        delay = sleep
+        if rows_per_second and updated:
+            elapsed = time.monotonic() - batch_started
+            delay = max(delay, updated / rows_per_second - elapsed)
+        pause(delay, max_replication_lag)
+        start_id = end_id + 1
+
+    checkpoint.finish()
+    return progress
+
+
+@register
+class AdSignatureBackfill(BackfillJob):
+    name = 'ad_signatures'
+    description = 'Сигнатуры поиска дубликатов для объявлений без них'
+    model = Ad
+
+    def pending(self):
+        return Ad.objects.filter(signature__isnull=True)
+
+    def backfill(self, queryset):
+        signatures = [
+            AdSignature(ad_id=ad_id, **signature_fields(title, description))
+            for ad_id, title, description in
+            queryset.values_list('id', 'title', 'description')
+        ]
+        AdSignature.objects.bulk_create(signatures, ignore_conflicts=True)
+        return len(signatures)
+
+
+@register
+class AdGeohashBackfill(BackfillJob):
+    name = 'ad_geohash'
+    description = 'Geohash для объявлений с координатами, но без geohash'
+    model = Ad
+
+    def pending(self):
+        return Ad.objects.filter(
+            latitude__isnull=False,
+            longitude__isnull=False,
+            geohash=''
+        )
+
+    def backfill(self, queryset):
+        # Блокировка не дает затереть координаты, измененные параллельно
+        ads = list(
+            queryset.select_for_update().only('id', 'latitude', 'longitude')
+        )
+        for ad in ads:
+            ad.geohash = encode(ad.latitude, ad.longitude)
+        Ad.objects.bulk_update(ads, ['geohash'])
+        return len(ads)
+
+
+class UpdatedAtBackfill(BackfillJob):
+    """
+    Дата изменения строк, созданных до миграции 0006_archive.
+
+    AddField проставляет всем существующим строкам время миграции,
+    и без заполнения ни одна из них не стала бы архивной раньше чем
+    через AD_ARCHIVE_AFTER_DAYS дней после выката. Незаполненная
+    строка создана до применения миграции и с тех пор не менялась:
+    ее updated_at больше created_at, но не позже времени применения.
+    """
+
+    migration = ('ads', '0006_archive')
+
+    def migration_applied(self):
+        app, name = self.migration
+        return (
+            MigrationRecorder(connection).migration_qs
+            .filter(app=app, name=name)
+            .values_list('applied', flat=True)
+            .first()
+        )
+
+    def pending(self):
+        applied = self.migration_applied()
+        if applied is None:
+            return self.model.objects.none()
+        return self.model.objects.filter(
+            created_at__lt=applied,
+            updated_at__lte=applied,
+            updated_at__gt=F('created_at')
+        )
+
+    def backfill(self, queryset):
+        return queryset.update(updated_at=F('created_at'))
+
+
+@register
+class AdUpdatedAtBackfill(UpdatedAtBackfill):
+    name = 'ad_updated_at'
+    description = 'Дата изменения объявлений, созданных до миграции 0006'
+    model = Ad
+
+
+@register
+class ProposalUpdatedAtBackfill(UpdatedAtBackfill):
+    name = 'proposal_updated_at'
+    description = 'Дата изменения предложений обмена, созданных до миграции 0006'
+    model = ExchangeProposal
@@ -0,0 +1,45 @@
+"""
+Общие части пакетных задач над большими таблицами.
+
+Задачи обрабатывают строки короткими транзакциями по возрастанию
+первичного ключа и между пачками делают паузу, а на PostgreSQL
+дополнительно ждут, пока реплики догонят основной сервер.
+"""
+import time
+
+from django.db import connection
+
+# Как часто проверять отставание реплик во время ожидания, секунд
+REPLICATION_CHECK_INTERVAL = 1
+# Дольше этого не ждать реплики, чтобы задача не зависла навсегда
+REPLICATION_WAIT_LIMIT = 300
+
+
+def replication_lag():
+    """Наибольшее отставание реплик в секундах (0 без реплик)"""
+    if connection.vendor != 'postgresql':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT COALESCE(EXTRACT(EPOCH FROM MAX(replay_lag)), 0) '
+            'FROM pg_stat_replication'
+        )
+        return float(cursor.fetchone()[0])
+
+
+def pause(sleep, max_replication_lag=None):
+    """
+    Пауза между пачками. Если задан max_replication_lag, пауза
+    продлевается, пока отставание реплик больше него.
+    """
+    time.sleep(sleep)
+    if max_replication_lag is None:
+        return
+
+    waited = 0
+    while (
+        waited < REPLICATION_WAIT_LIMIT and
+        replication_lag() > max_replication_lag
+    ):
+        time.sleep(REPLICATION_CHECK_INTERVAL)
+        waited += REPLICATION_CHECK_INTERVAL
@@ -0,0 +1,95 @@
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import AdSignature
+from .text import tokenize
+
+SIMHASH_BITS = 64
+BAND_COUNT = 4
+BAND_BITS = SIMHASH_BITS // BAND_COUNT
+
+
+def _features(title, description):
+    words = tokenize(f'{title} {description}')
+    return Counter(words + [
+        f'{first} {second}' for first, second in zip(words, words[1:])
+    ])
+
+
+def _hash(feature):
+    digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def simhash(title, description):
+    """64-битный SimHash по словам и парам слов заголовка и описания"""
+    weights = [0] * SIMHASH_BITS
+    for feature, count in _features(title, description).items():
+        feature_hash = _hash(feature)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if feature_hash >> bit & 1 else -count
+
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def to_signed(value):
+    """Переводит 64-битное значение в диапазон BigIntegerField"""
+    if value >= 1 << (SIMHASH_BITS - 1):
+        return value - (1 << SIMHASH_BITS)
+    return value
+
+
+def bands(value):
+    """Делит хэш на BAND_COUNT полос по BAND_BITS бит"""
+    mask = (1 << BAND_BITS) - 1
+    return [value >> (BAND_BITS * i) & mask for i in range(BAND_COUNT)]
+
+
+def hamming_distance(first, second):
+    return ((first ^ second) & ((1 << SIMHASH_BITS) - 1)).bit_count()
+
+
+def signature_fields(title, description):
+    value = simhash(title, description)
+    fields = {'simhash': to_signed(value)}
+    for number, band in enumerate(bands(value)):
+        fields[f'band_{number}'] = band
+    return fields
+
+
+def save_signature(ad):
+    AdSignature.objects.update_or_create(
+        ad_id=ad.id,
+        defaults=signature_fields(ad.title, ad.description)
+    )
+
+
+def find_near_duplicates(title, description, user_id=None, exclude_id=None):
+    """
+    Возвращает активные объявления, почти совпадающие по тексту.
+
+    Если хэши отличаются не более чем на BAND_COUNT - 1 бит, хотя бы
+    одна полоса совпадает целиком, поэтому кандидаты выбираются по
+    индексам полос, а расстояние Хэмминга проверяется только для них.
+    """
+    value = simhash(title, description)
+    same_band = Q()
+    for number, band in enumerate(bands(value)):
+        same_band |= Q(**{f'band_{number}': band})
+
+    candidates = AdSignature.objects.select_related('ad').filter(
+        same_band, ad__is_active=True
+    )
+    if user_id is not None:
+        candidates = candidates.filter(ad__user_id=user_id)
+    if exclude_id is not None:
+        candidates = candidates.exclude(ad_id=exclude_id)
+
+    return [
+        signature.ad for signature in candidates
+        if hamming_distance(signature.simhash, value)
+        <= settings.DUPLICATE_AD_MAX_DISTANCE
+    ]
@@ -0,0 +1,151 @@
+"""
+События о предложениях обмена для SSE-потока пользователя.
+
+Представления публикуют событие после фиксации транзакции: в PostgreSQL
+через NOTIFY на канале CHANNEL, в других базах — напрямую в брокер
+текущего процесса. Каждый ASGI-процесс держит одно соединение с LISTEN
+и раздает полученные события очередям подписанных пользователей.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from functools import partial
+
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'proposal_events'
+
+CREATED = 'created'
+STATUS_CHANGED = 'status_changed'
+
+# Пауза перед повторным подключением LISTEN после ошибки
+RECONNECT_DELAY = 5
+
+
+class EventBroker:
+    """Очереди событий подписчиков текущего процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._listener = None
+
+    def subscribe(self, user_id):
+        """Очередь событий пользователя; вызывается из цикла событий"""
+        queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers[user_id].add((loop, queue))
+        if connection.vendor == 'postgresql':
+            self._ensure_listener(loop)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            self._subscribers[user_id] = {
+                subscriber for subscriber in self._subscribers[user_id]
+                if subscriber[1] is not queue
+            }
+            if not self._subscribers[user_id]:
+                del self._subscribers[user_id]
+
+    def publish(self, event):
+        """Раздает событие подписчикам из event['user_ids'] из любого потока"""
+        with self._lock:
+            subscribers = [
+                subscriber
+                for user_id in event['user_ids']
+                for subscriber in self._subscribers.get(user_id, ())
+            ]
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def _ensure_listener(self, loop):
+        if self._listener is None or self._listener.done():
+            self._listener = loop.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                await self._listen_postgresql()
+            except Exception:  # noqa: BLE001
+                logger.exception('Соединение LISTEN %s прервано', CHANNEL)
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def _publish_notifies(self, conn):
+        """Раздает события из полученных соединением LISTEN уведомлений"""
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            self.publish(json.loads(notify.payload))
+
+    async def _listen_postgresql(self):
+        import psycopg2
+
+        params = connections['default'].get_connection_params()
+        conn = psycopg2.connect(**params)
+        conn.autocommit = True
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            loop.add_reader(conn.fileno(), ready.set)
+            while True:
+                await ready.wait()
+                ready.clear()
+                conn.poll()
+                self._publish_notifies(conn)
+        finally:
+            loop.remove_reader(conn.fileno())
+            conn.close()
+
+
+broker = EventBroker()
+
+
+def _send(events):
+    if connection.vendor != 'postgresql':
+        for event in events:
+            broker.publish(event)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+            [CHANNEL, [json.dumps(event) for event in events]]
+        )
+
+
+def publish_events(events):
+    """Публикует события после фиксации текущей транзакции"""
+    if events:
+        transaction.on_commit(partial(_send, events))
+
+
+def proposal_created(proposal):
+    """Получатель узнает о новом предложении"""
+    publish_events([{
+        'type': CREATED,
+        'proposal_id': proposal.id,
+        'status': proposal.status,
+        'user_ids': [proposal.ad_receiver.user_id],
+    }])
+
+
+def proposal_status_changed(proposals):
+    """
+    Обе стороны узнают о новом статусе. proposals — итерируемое из
+    (id, статус, id пользователя-отправителя, id пользователя-получателя).
+    """
+    publish_events([
+        {
+            'type': STATUS_CHANGED,
+            'proposal_id': proposal_id,
+            'status': status,
+            'user_ids': [sender_user_id, receiver_user_id],
+        }
+        for proposal_id, status, sender_user_id, receiver_user_id in proposals
+    ])
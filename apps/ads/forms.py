@@ -1,20 +1,80 @@
 from django import forms
+from django.conf import settings
+
+from .duplicates import find_near_duplicates
 from .models import Ad, ExchangeProposal
+from .widgets import AdLookupWidget
 
 
 class AdForm(forms.ModelForm):
     class Meta:
         model = Ad
-        fields = ['title', 'description', 'image_url', 'category', 'condition']
+        fields = [
+            'title', 'description', 'image_url', 'category', 'condition',
+            'latitude', 'longitude'
+        ]
         widgets = {
             'description': forms.Textarea(attrs={'rows': 4}),
+            'latitude': forms.NumberInput(attrs={'step': 'any'}),
+            'longitude': forms.NumberInput(attrs={'step': 'any'}),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        title = cleaned_data.get('title')
+        description = cleaned_data.get('description')
+
+        coordinates_valid = not (
+            self.has_error('latitude') or self.has_error('longitude')
+        )
+        if coordinates_valid and (cleaned_data.get('latitude') is None) != (
+            cleaned_data.get('longitude') is None
+        ):
+            raise forms.ValidationError(
+                'Укажите и широту, и долготу или оставьте оба поля пустыми'
+            )
+
+        if title and description:
+            duplicates = find_near_duplicates(
+                title,
+                description,
+                user_id=(
+                    self.instance.user_id
+                    if settings.DUPLICATE_AD_SCOPE == 'user' else None
+                ),
+                exclude_id=self.instance.pk
+            )
+            if duplicates:
+                raise forms.ValidationError(
+                    'Похожее объявление уже опубликовано: «{}»'.format(
+                        duplicates[0].title
+                    )
+                )
+
+        return cleaned_data
+
 
 class ExchangeProposalForm(forms.ModelForm):
     class Meta:
         model = ExchangeProposal
         fields = ['ad_sender', 'ad_receiver', 'comment']
+        widgets = {
+            'ad_sender': AdLookupWidget('sender'),
+            'ad_receiver': AdLookupWidget('receiver'),
+        }
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if user is not None:
+            self.fields['ad_sender'].queryset = Ad.objects.filter(
+                user=user,
+                is_active=True
+            )
+            self.fields['ad_receiver'].queryset = (
+                Ad.objects
+                .filter(is_active=True)
+                .exclude(user=user)
+            )
 
     def clean(self):
         cleaned_data = super().clean()
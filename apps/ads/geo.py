@@ -0,0 +1,140 @@
+"""
+Поиск объявлений в радиусе без PostGIS.
+
+Координаты объявления кодируются в geohash: у близких точек общий
+префикс, поэтому кандидатов можно выбрать запросами LIKE 'префикс%'
+по индексу с varchar_pattern_ops. Для радиуса выбирается точность,
+при которой ячейка не меньше радиуса: тогда круг целиком покрывают
+ячейка с центром поиска и восемь соседних. Точное расстояние по
+формуле гаверсинуса считается уже только для кандидатов.
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Точность geohash, которая хранится в Ad.geohash (около 5 м)
+PRECISION = 9
+# Радиусы поиска, которые можно выбрать в списке объявлений, км
+RADIUS_CHOICES = (1, 5, 10, 25, 50, 100)
+DEFAULT_RADIUS_KM = 10
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    result = []
+    bits = 0
+    value = 0
+    even = True
+    while len(result) < precision:
+        if even:
+            value_range, coordinate = lon_range, longitude
+        else:
+            value_range, coordinate = lat_range, latitude
+        middle = (value_range[0] + value_range[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            result.append(BASE32[value])
+            bits = value = 0
+    return ''.join(result)
+
+
+def cell_size(precision):
+    """(высота, ширина) ячейки в градусах"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Ячейки, покрывающие круг радиуса radius_km, или None, если
+    радиус больше ячейки самой грубой точности.
+    """
+    # Ширина ячейки в километрах уменьшается к полюсам
+    lon_scale = max(math.cos(math.radians(latitude)), 0.01)
+    for precision in range(PRECISION, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        if (lat_step * KM_PER_DEGREE >= radius_km and
+                lon_step * KM_PER_DEGREE * lon_scale >= radius_km):
+            break
+    else:
+        return None
+
+    cells = set()
+    for lat_offset in (-1, 0, 1):
+        cell_latitude = latitude + lat_offset * lat_step
+        if not -90 <= cell_latitude <= 90:
+            continue
+        for lon_offset in (-1, 0, 1):
+            cell_longitude = (longitude + lon_offset * lon_step + 180) % 360 - 180
+            cells.add(encode(cell_latitude, cell_longitude, precision))
+    return sorted(cells)
+
+
+def distance_km(latitude, longitude):
+    """Выражение расстояния от точки до объявления в километрах"""
+    lat = Radians(F('latitude'))
+    lon = Radians(F('longitude'))
+    origin_lat = math.radians(latitude)
+    origin_lon = math.radians(longitude)
+    haversine = (
+        Power(Sin((lat - Value(origin_lat)) / 2), 2) +
+        Cos(lat) * Value(math.cos(origin_lat)) *
+        Power(Sin((lon - Value(origin_lon)) / 2), 2)
+    )
+    return ASin(
+        Least(Sqrt(haversine), Value(1.0)),
+        output_field=FloatField()
+    ) * Value(2 * EARTH_RADIUS_KM)
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """
+    Объявления не дальше radius_km от точки с аннотацией distance.
+    """
+    cells = covering_cells(latitude, longitude, radius_km)
+    if cells is None:
+        queryset = queryset.exclude(geohash='')
+    else:
+        prefixes = Q()
+        for cell in cells:
+            prefixes |= Q(geohash__startswith=cell)
+        queryset = queryset.filter(prefixes)
+
+    return (
+        queryset
+        .annotate(distance=distance_km(latitude, longitude))
+        .filter(distance__lte=radius_km)
+    )
+
+
+def parse_location(params):
+    """
+    Точка и радиус поиска из параметров lat, lon и radius
+    или None, если они не заданы или некорректны.
+    """
+    try:
+        latitude = float(params['lat'])
+        longitude = float(params['lon'])
+        radius_km = int(params.get('radius') or DEFAULT_RADIUS_KM)
+    except (KeyError, ValueError):
+        return None
+
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    if radius_km not in RADIUS_CHOICES:
+        return None
+    return latitude, longitude, radius_km
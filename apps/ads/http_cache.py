@@ -0,0 +1,118 @@
+"""
+Заголовки и сброс микрокэша nginx (см. nginx/servers/site.conf).
+
+Ответы анонимным пользователям nginx кэширует на MICROCACHE_SECONDS
+секунд, а запросы с cookie сессии или сообщений идут мимо кэша.
+После изменения объявления Django запрашивает его страницу и первую
+страницу списка через служебный сервер nginx, который обходит кэш
+и сохраняет свежий ответ. Остальные страницы списка устаревают сами.
+
+Запросы к nginx отправляет один фоновый поток процесса: пути после
+коммита добавляются в общий набор, а поток забирает все накопившиеся
+пути разом и запрашивает каждую страницу один раз. Поэтому массовые
+изменения не создают по потоку на сохранение и не повторяют запросы
+к первой странице списка.
+"""
+import logging
+from functools import partial, wraps
+from threading import Event, Lock, Thread
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+
+logger = logging.getLogger(__name__)
+
+PURGE_TIMEOUT = 2
+
+
+def public_cache(surrogate_keys):
+    """
+    Разрешает общий кэш для ответов анонимным пользователям.
+
+    surrogate_keys(request, *args, **kwargs) возвращает ключи, которые
+    попадут в заголовок Surrogate-Key. Ответы авторизованным
+    пользователям помечаются как private.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True)
+            elif request.method in ('GET', 'HEAD') and response.status_code == 200:
+                patch_cache_control(
+                    response,
+                    public=True,
+                    max_age=0,
+                    s_maxage=settings.MICROCACHE_SECONDS
+                )
+                response['Surrogate-Key'] = ' '.join(
+                    surrogate_keys(request, *args, **kwargs)
+                )
+            return response
+        return wrapper
+
+    return decorator
+
+
+def _purge(paths):
+    for path in paths:
+        request = Request(settings.NGINX_PURGE_URL + path)
+        try:
+            with urlopen(request, timeout=PURGE_TIMEOUT) as response:
+                response.read()
+        except OSError as error:
+            logger.warning('Не удалось обновить кэш nginx для %s: %s', path, error)
+
+
+class PurgeWorker:
+    """Фоновый поток, который обновляет в кэше nginx накопившиеся пути"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._pending = set()
+        self._wakeup = Event()
+        self._thread = None
+
+    def submit(self, paths):
+        with self._lock:
+            self._pending.update(paths)
+            # После fork поток родителя в дочернем процессе не работает
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(
+                    target=self._run, name='nginx-purge', daemon=True
+                )
+                self._thread.start()
+        self._wakeup.set()
+
+    def purge_pending(self):
+        """Обновляет все накопившиеся пути, каждый по одному разу"""
+        with self._lock:
+            paths, self._pending = self._pending, set()
+            self._wakeup.clear()
+        _purge(sorted(paths))
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self.purge_pending()
+
+
+purge_worker = PurgeWorker()
+
+
+def _submit(paths):
+    purge_worker.submit(paths)
+
+
+def purge_ads(ad_ids):
+    """Обновляет в кэше nginx страницы объявлений после фиксации транзакции"""
+    if not settings.NGINX_PURGE_URL:
+        return
+    paths = [reverse('ad_detail', kwargs={'ad_id': ad_id}) for ad_id in ad_ids]
+    paths.append(reverse('ad_list'))
+    transaction.on_commit(partial(_submit, paths))
@@ -0,0 +1,73 @@
+"""
+Версии индексов поиска и подсказок в общем кэше.
+
+Индексы живут в памяти каждого процесса, а сигналы и activation
+обновляют их только в процессе, который изменил данные. Изменения
+из других воркеров, команд archive_ads и purge_proposals до него
+не доходят. Поэтому каждое изменение после коммита увеличивает
+версию индекса в общем кэше, а процесс, заметивший при обращении
+к индексу, что его версия отстала, перестраивает индекс из базы.
+Версия проверяется не чаще раза в SEARCH_INDEX_REFRESH_INTERVAL
+секунд, так что при частых изменениях индекс перестраивается
+не чаще этого интервала.
+"""
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'index_version:{}'
+
+
+def shared_version(index):
+    """Версия индекса в общем кэше"""
+    key = VERSION_KEY.format(index.name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 0, None)
+        version = cache.get(key, 0)
+    return version
+
+
+def _bump(index):
+    key = VERSION_KEY.format(index.name)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        version = cache.incr(key)
+    # Свои изменения процесс уже внес в индекс, перестраивать его
+    # нужно, только если между ними были изменения других процессов
+    if index.version == version - 1:
+        index.version = version
+
+
+def bump_version(index):
+    """Отмечает изменение индекса для остальных процессов после коммита"""
+    transaction.on_commit(partial(_bump, index))
+
+
+def rebuild(index, build):
+    """
+    Строит индекс функцией build и запоминает общую версию. Версия
+    читается до загрузки данных, поэтому изменения во время
+    построения вызовут еще одно.
+    """
+    version = shared_version(index)
+    build()
+    index.version = version
+    index.checked_at = time.monotonic()
+
+
+def refresh_if_stale(index, build):
+    """Перестраивает индекс, если он не построен или отстал от общей версии"""
+    if index.is_built:
+        now = time.monotonic()
+        if now - index.checked_at < settings.SEARCH_INDEX_REFRESH_INTERVAL:
+            return
+        index.checked_at = now
+        if index.version == shared_version(index):
+            return
+    rebuild(index, build)
@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.ads.archive import archive_batch
+
+
+class Command(BaseCommand):
+    help = 'Переносит давно неактивные объявления и их предложения в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=settings.AD_ARCHIVE_AFTER_DAYS,
+            help='Сколько дней объявление должно быть неактивным',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Размер пачки объявлений',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Пауза между пачками в секундах',
+        )
+        parser.add_argument(
+            '--after-id',
+            type=int,
+            default=0,
+            help='Продолжить с объявлений с id больше указанного',
+        )
+
+    def handle(self, *args, **options):
+        last_id = options['after_id']
+        total_ads = total_proposals = 0
+
+        while True:
+            batch_last_id, ads, proposals = archive_batch(
+                options['older_than_days'],
+                after_id=last_id,
+                batch_size=options['batch_size']
+            )
+            if batch_last_id is None:
+                break
+
+            last_id = batch_last_id
+            total_ads += ads
+            total_proposals += proposals
+            self.stdout.write(
+                f'Архивировано объявлений: {total_ads}, '
+                f'предложений: {total_proposals}, последний id: {last_id}'
+            )
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Объявлений: {total_ads}, предложений: {total_proposals}'
+        ))
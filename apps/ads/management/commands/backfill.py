@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ads.backfills import jobs, run_backfill
+
+
+class Command(BaseCommand):
+    help = 'Заполняет данные в больших таблицах пачками по диапазонам id'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'job',
+            nargs='?',
+            help='Имя задачи заполнения (без него выводится список задач)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер диапазона id в одной пачке',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Пауза между пачками в секундах',
+        )
+        parser.add_argument(
+            '--rows-per-second',
+            type=float,
+            default=None,
+            help='Не заполнять больше строк в секунду',
+        )
+        parser.add_argument(
+            '--max-replication-lag',
+            type=float,
+            default=None,
+            help='Ждать между пачками, пока отставание реплик больше (секунд)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать сначала, не продолжая с контрольной точки',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только проверить, сколько строк осталось заполнить',
+        )
+
+    def handle(self, *args, **options):
+        if not options['job']:
+            for name, job in sorted(jobs.items()):
+                self.stdout.write(f'{name}: {job.description}')
+            return
+
+        job = jobs.get(options['job'])
+        if job is None:
+            raise CommandError(f'Неизвестная задача заполнения: {options["job"]}')
+
+        if not options['verify']:
+            run_backfill(
+                job,
+                batch_size=options['batch_size'],
+                sleep=options['sleep'],
+                rows_per_second=options['rows_per_second'],
+                max_replication_lag=options['max_replication_lag'],
+                restart=options['restart'],
+                on_progress=self._report
+            )
+
+        remaining = job.verify()
+        if remaining:
+            raise CommandError(f'Осталось незаполненных строк: {remaining}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{job.name}: незаполненных строк не осталось'
+        ))
+
+    def _report(self, progress):
+        self.stdout.write(
+            f'{progress.percent:5.1f}% id {progress.position} из '
+            f'{progress.last_id}, заполнено: {progress.processed}, '
+            f'{progress.rate:.0f} строк/с'
+        )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.ads.partitions import PartitioningNotSupported, create_partitions
+
+
+class Command(BaseCommand):
+    help = 'Создает помесячные секции таблицы предложений обмена'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=3,
+            help='На сколько месяцев вперед, включая текущий, создать секции',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            created = create_partitions(
+                timezone.now().date(),
+                options['months']
+            )
+        except PartitioningNotSupported as error:
+            raise CommandError(error)
+
+        for name in created:
+            self.stdout.write(f'Создана секция {name}')
+        self.stdout.write(self.style.SUCCESS(f'Создано секций: {len(created)}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from apps.ads.trending import decay_since_last_run
+
+
+class Command(BaseCommand):
+    help = 'Уменьшает рейтинги популярности объявлений со временем'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=float,
+            help=(
+                'На сколько часов уменьшить рейтинги; по умолчанию — '
+                'время, прошедшее с прошлого запуска'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        hours, decayed, removed = decay_since_last_run(options['hours'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Затухание за {hours:.2f} ч. '
+            f'Обновлено рейтингов: {decayed}, удалено: {removed}'
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.ads.partitions import (
+    PartitioningNotSupported, add_months, detach_partitions
+)
+
+
+class Command(BaseCommand):
+    help = 'Отсоединяет старые секции таблицы предложений обмена'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-months',
+            type=int,
+            default=12,
+            help='Отсоединить секции старше указанного числа месяцев',
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Удалить отсоединенные секции',
+        )
+
+    def handle(self, *args, **options):
+        current_month = timezone.now().date().replace(day=1)
+        before = add_months(current_month, -options['older_than_months'])
+        try:
+            detached = detach_partitions(before, drop=options['drop'])
+        except PartitioningNotSupported as error:
+            raise CommandError(error)
+
+        for name in detached:
+            self.stdout.write(f'Отсоединена секция {name}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Отсоединено секций: {len(detached)}')
+        )
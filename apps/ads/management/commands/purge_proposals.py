@@ -0,0 +1,119 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ads.batching import pause
+from apps.ads.retention import (
+    purge_batch, purge_checkpoint, purge_statistics, purgeable_proposals,
+    retention_policy
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет отклоненные и давно ожидающие ответа предложения обмена '
+        'по политике хранения PROPOSAL_RETENTION_DAYS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--status',
+            help='Очистить только предложения с указанным статусом',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Размер пачки предложений',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Пауза между пачками в секундах',
+        )
+        parser.add_argument(
+            '--max-replication-lag',
+            type=float,
+            default=None,
+            help='Ждать между пачками, пока отставание реплик больше (секунд)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать сначала, не продолжая с контрольной точки',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько предложений будет удалено',
+        )
+
+    def handle(self, *args, **options):
+        policy = retention_policy()
+        if options['status']:
+            if options['status'] not in policy:
+                raise CommandError(
+                    f'Для статуса {options["status"]} нет политики хранения'
+                )
+            policy = {options['status']: policy[options['status']]}
+
+        if options['dry_run']:
+            self._print_statistics(policy, options['batch_size'])
+            return
+
+        total = 0
+        for status, days in policy.items():
+            total += self._purge(status, days, options)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Удалено предложений: {total}'
+        ))
+
+    def _purge(self, status, days, options):
+        checkpoint = purge_checkpoint(status, restart=options['restart'])
+        if checkpoint.last_id:
+            self.stdout.write(
+                f'[{status}] продолжение после id {checkpoint.last_id}'
+            )
+
+        queryset = purgeable_proposals(status, days)
+        deleted_total = 0
+        while True:
+            last_id, deleted = purge_batch(
+                queryset,
+                after_id=checkpoint.last_id,
+                batch_size=options['batch_size']
+            )
+            if last_id is None:
+                break
+
+            checkpoint.advance(last_id, deleted)
+            deleted_total += deleted
+            self.stdout.write(
+                f'[{status}] удалено: {checkpoint.processed}, '
+                f'последний id: {last_id}'
+            )
+            pause(options['sleep'], options['max_replication_lag'])
+
+        checkpoint.finish()
+        return deleted_total
+
+    def _print_statistics(self, policy, batch_size):
+        for row in purge_statistics(batch_size):
+            if row['status'] not in policy:
+                continue
+            self.stdout.write(
+                f'[{row["status"]}] старше {row["days"]} дней: {row["count"]}, '
+                f'пачек: {row["batches"]}'
+            )
+            if row['count']:
+                self.stdout.write(
+                    f'  изменены с {row["oldest"]:%d.%m.%Y} '
+                    f'по {row["newest"]:%d.%m.%Y}, '
+                    f'id с {row["min_id"]} по {row["max_id"]}'
+                )
+            if row['resume_after_id']:
+                self.stdout.write(
+                    f'  прерванная очистка продолжится после id '
+                    f'{row["resume_after_id"]}'
+                )
+        self.stdout.write(self.style.WARNING('Пробный запуск, ничего не удалено'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from apps.ads.similarity import rebuild_similar_ads
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает таблицу похожих объявлений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--category',
+            type=int,
+            action='append',
+            dest='categories',
+            help='ID категории (можно указать несколько раз)',
+        )
+
+    def handle(self, *args, **options):
+        created = rebuild_similar_ads(options['categories'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Записано пар похожих объявлений: {created}')
+        )
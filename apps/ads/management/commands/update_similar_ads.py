@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from apps.ads.similarity import process_similar_ads_queue
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает соседей новых и измененных объявлений из очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько объявлений пересчитывать за один проход',
+        )
+
+    def handle(self, *args, **options):
+        processed, created = process_similar_ads_queue(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано объявлений: {processed}, '
+            f'записано пар похожих объявлений: {created}'
+        ))
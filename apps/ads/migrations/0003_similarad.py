@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0002_alter_exchangeproposal_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarAd',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Схожесть')),
+                ('ad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_entries', to='ads.ad', verbose_name='Объявление')),
+                ('similar_ad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ads.ad', verbose_name='Похожее объявление')),
+            ],
+            options={
+                'verbose_name': 'Похожее объявление',
+                'verbose_name_plural': 'Похожие объявления',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['ad', '-score'], name='ads_similar_ad_id_b23fa4_idx')],
+                'unique_together': {('ad', 'similar_ad')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0004_ad_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdSignature',
+            fields=[
+                ('ad', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='ads.ad', verbose_name='Объявление')),
+                ('simhash', models.BigIntegerField(verbose_name='SimHash')),
+                ('band_0', models.IntegerField(db_index=True, verbose_name='Полоса 0')),
+                ('band_1', models.IntegerField(db_index=True, verbose_name='Полоса 1')),
+                ('band_2', models.IntegerField(db_index=True, verbose_name='Полоса 2')),
+                ('band_3', models.IntegerField(db_index=True, verbose_name='Полоса 3')),
+            ],
+            options={
+                'verbose_name': 'Сигнатура объявления',
+                'verbose_name_plural': 'Сигнатуры объявлений',
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0005_adsignature'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAd',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200, verbose_name='Заголовок')),
+                ('description', models.TextField(verbose_name='Описание')),
+                ('image_url', models.URLField(blank=True, default=None, null=True, verbose_name='Ссылка на изображение')),
+                ('condition', models.CharField(choices=[('new', 'Новое'), ('like_new', 'Как новое'), ('used_good', 'Б/У - Хорошее состояние'), ('used_fair', 'Б/У - Удовлетворительное состояние'), ('used_poor', 'Б/У - Плохое состояние')], max_length=50, verbose_name='Состояние товара')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата изменения')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')),
+            ],
+            options={
+                'verbose_name': 'Архивное объявление',
+                'verbose_name_plural': 'Архивные объявления',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedExchangeProposal',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('ad_sender_id', models.BigIntegerField(db_index=True, verbose_name='ID предлагаемого объявления')),
+                ('ad_receiver_id', models.BigIntegerField(db_index=True, verbose_name='ID целевого объявления')),
+                ('comment', models.TextField(blank=True, default=None, null=True, verbose_name='Комментарий')),
+                ('status', models.CharField(choices=[('waiting', 'Ожидает'), ('accepted', 'Принята'), ('rejected', 'Отклонена')], max_length=20, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата изменения')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')),
+            ],
+            options={
+                'verbose_name': 'Архивное предложение обмена',
+                'verbose_name_plural': 'Архивные предложения обмена',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AddField(
+            model_name='exchangeproposal',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AddField(
+            model_name='archivedad',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_ads', to='ads.category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='archivedad',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_ads', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+    ]
@@ -0,0 +1,206 @@
+"""
+Перевод таблицы предложений обмена на помесячные секции.
+
+Миграция выполняется только в окно обслуживания: таблица
+переименовывается и копируется в секционированную одним INSERT
+в транзакции миграции, и до ее окончания чтение и запись
+предложений заблокированы. Перед применением остановите веб-воркеры
+и фоновые команды, оцените время по числу строк в
+ads_exchangeproposal (на каждую строку срабатывает триггер таблицы
+пар) и сделайте резервную копию.
+"""
+from datetime import date
+
+from django.db import migrations
+
+TABLE = 'ads_exchangeproposal'
+LEGACY_TABLE = 'ads_exchangeproposal_legacy'
+PAIR_TABLE = 'ads_exchangeproposal_pair'
+# Имя отличается от последовательности identity-столбца старой таблицы
+SEQUENCE = 'ads_exchangeproposal_partitioned_id_seq'
+COLUMNS = (
+    'id, created_at, updated_at, comment, status, ad_receiver_id, ad_sender_id'
+)
+# Сколько месяцев вперед создавать секции
+MONTHS_AHEAD = 3
+PAIR_FIELDS = {('ad_sender', 'ad_receiver')}
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_monthly_partitions(schema_editor, first_month, last_month):
+    month = first_month
+    while month <= last_month:
+        schema_editor.execute(
+            f'CREATE TABLE {TABLE}_p{month:%Y%m} PARTITION OF {TABLE} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [f'{month} 00:00:00+00', f'{_add_months(month, 1)} 00:00:00+00']
+        )
+        month = _add_months(month, 1)
+
+
+def _pair_unique_together(apps, schema_editor, old, new):
+    schema_editor.alter_unique_together(
+        apps.get_model('ads', 'ExchangeProposal'), old, new
+    )
+
+
+def partition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        _pair_unique_together(apps, schema_editor, PAIR_FIELDS, set())
+        return
+
+    schema_editor.execute(f'ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}')
+    schema_editor.execute(f'CREATE SEQUENCE {SEQUENCE}')
+    schema_editor.execute(
+        f"SELECT setval('{SEQUENCE}', COALESCE(MAX(id), 0) + 1, false) "
+        f'FROM {LEGACY_TABLE}'
+    )
+    # Первичный ключ секционированной таблицы обязан включать ключ
+    # секционирования, поэтому он составной.
+    schema_editor.execute(f'''
+        CREATE TABLE {TABLE} (
+            id bigint NOT NULL DEFAULT nextval('{SEQUENCE}'),
+            created_at timestamp with time zone NOT NULL,
+            updated_at timestamp with time zone NOT NULL,
+            comment text NULL,
+            status varchar(20) NOT NULL,
+            ad_receiver_id bigint NOT NULL
+                REFERENCES ads_ad (id) DEFERRABLE INITIALLY DEFERRED,
+            ad_sender_id bigint NOT NULL
+                REFERENCES ads_ad (id) DEFERRABLE INITIALLY DEFERRED,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    ''')
+    schema_editor.execute(f'ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+    for column in ('ad_receiver_id', 'ad_sender_id', 'status'):
+        schema_editor.execute(
+            f'CREATE INDEX {TABLE}_{column}_idx ON {TABLE} ({column})'
+        )
+
+    # Уникальный индекс по (ad_sender_id, ad_receiver_id) на секционированной
+    # таблице невозможен без created_at, поэтому пары хранятся отдельно.
+    schema_editor.execute(f'''
+        CREATE TABLE {PAIR_TABLE} (
+            ad_sender_id bigint NOT NULL,
+            ad_receiver_id bigint NOT NULL,
+            PRIMARY KEY (ad_sender_id, ad_receiver_id)
+        )
+    ''')
+    schema_editor.execute(f'''
+        CREATE FUNCTION {PAIR_TABLE}_sync() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {PAIR_TABLE}
+                WHERE ad_sender_id = OLD.ad_sender_id
+                  AND ad_receiver_id = OLD.ad_receiver_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {PAIR_TABLE} (ad_sender_id, ad_receiver_id)
+                VALUES (NEW.ad_sender_id, NEW.ad_receiver_id);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    schema_editor.execute(f'''
+        CREATE TRIGGER {PAIR_TABLE}_insert_delete
+        AFTER INSERT OR DELETE ON {TABLE}
+        FOR EACH ROW EXECUTE FUNCTION {PAIR_TABLE}_sync()
+    ''')
+    schema_editor.execute(f'''
+        CREATE TRIGGER {PAIR_TABLE}_update
+        AFTER UPDATE ON {TABLE}
+        FOR EACH ROW
+        WHEN (
+            OLD.ad_sender_id IS DISTINCT FROM NEW.ad_sender_id
+            OR OLD.ad_receiver_id IS DISTINCT FROM NEW.ad_receiver_id
+        )
+        EXECUTE FUNCTION {PAIR_TABLE}_sync()
+    ''')
+
+    schema_editor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN(created_at) FROM {LEGACY_TABLE}')
+        oldest, = cursor.fetchone()
+    current_month = date.today().replace(day=1)
+    first_month = oldest.date().replace(day=1) if oldest else current_month
+    _create_monthly_partitions(
+        schema_editor,
+        first_month,
+        _add_months(current_month, MONTHS_AHEAD)
+    )
+
+    schema_editor.execute(
+        f'INSERT INTO {TABLE} ({COLUMNS}) '
+        f'SELECT {COLUMNS} FROM {LEGACY_TABLE}'
+    )
+    schema_editor.execute(f'DROP TABLE {LEGACY_TABLE}')
+
+
+def unpartition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        _pair_unique_together(apps, schema_editor, set(), PAIR_FIELDS)
+        return
+
+    schema_editor.execute(f'ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}')
+    schema_editor.execute(f'''
+        CREATE TABLE {TABLE} (
+            id bigint NOT NULL PRIMARY KEY
+                GENERATED BY DEFAULT AS IDENTITY,
+            created_at timestamp with time zone NOT NULL,
+            updated_at timestamp with time zone NOT NULL,
+            comment text NULL,
+            status varchar(20) NOT NULL,
+            ad_receiver_id bigint NOT NULL
+                REFERENCES ads_ad (id) DEFERRABLE INITIALLY DEFERRED,
+            ad_sender_id bigint NOT NULL
+                REFERENCES ads_ad (id) DEFERRABLE INITIALLY DEFERRED,
+            UNIQUE (ad_sender_id, ad_receiver_id)
+        )
+    ''')
+    schema_editor.execute(
+        f'INSERT INTO {TABLE} ({COLUMNS}) '
+        f'SELECT {COLUMNS} FROM {LEGACY_TABLE}'
+    )
+    schema_editor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+        f'COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}'
+    )
+    schema_editor.execute(f'DROP TABLE {LEGACY_TABLE} CASCADE')
+    schema_editor.execute(f'DROP TABLE {PAIR_TABLE}')
+    schema_editor.execute(f'DROP FUNCTION {PAIR_TABLE}_sync()')
+    # Индексы создаются после удаления секционированной таблицы,
+    # у которой были индексы с теми же именами.
+    for column in ('ad_receiver_id', 'ad_sender_id'):
+        schema_editor.execute(
+            f'CREATE INDEX {TABLE}_{column}_idx ON {TABLE} ({column})'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0006_archive'),
+    ]
+
+    operations = [
+        # Уникальность пары объявлений обеспечивает таблица пар, а не
+        # ограничение таблицы предложений, поэтому unique_together
+        # убирается из состояния моделей: иначе будущий AlterUniqueTogether
+        # попытается изменить ограничение, которого нет.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(partition_table, unpartition_table),
+            ],
+            state_operations=[
+                migrations.AlterUniqueTogether(
+                    name='exchangeproposal',
+                    unique_together=set(),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:33
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс строится без блокировки записи в таблицу объявлений
+    atomic = False
+
+    dependencies = [
+        ('ads', '0007_partition_exchangeproposal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ad',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='ads_ad_user_created_idx'),
+        ),
+    ]
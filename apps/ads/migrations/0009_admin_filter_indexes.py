@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:33
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+PROPOSAL_TABLE = 'ads_exchangeproposal'
+PROPOSAL_INDEX = 'ads_proposal_status_idx'
+
+
+def _proposal_index():
+    return models.Index(fields=['status', '-created_at'], name=PROPOSAL_INDEX)
+
+
+def _proposal_partitions(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            '''
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            ''',
+            [PROPOSAL_TABLE]
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def create_proposal_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.add_index(
+            apps.get_model('ads', 'ExchangeProposal'), _proposal_index()
+        )
+        return
+
+    # CREATE INDEX CONCURRENTLY на секционированной таблице невозможен:
+    # индекс создается только на родителе (без данных), затем строится
+    # без блокировки в каждой секции и присоединяется к индексу родителя.
+    columns = '(status, created_at DESC)'
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {PROPOSAL_INDEX} '
+        f'ON ONLY {PROPOSAL_TABLE} {columns}'
+    )
+    for partition in _proposal_partitions(schema_editor):
+        name = f'{partition}_status_created_idx'
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+            f'ON {partition} {columns}'
+        )
+        schema_editor.execute(
+            f'ALTER INDEX {PROPOSAL_INDEX} ATTACH PARTITION {name}'
+        )
+
+
+def drop_proposal_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.remove_index(
+            apps.get_model('ads', 'ExchangeProposal'), _proposal_index()
+        )
+        return
+    # Индексы секций удаляются вместе с индексом родителя
+    schema_editor.execute(f'DROP INDEX IF EXISTS {PROPOSAL_INDEX}')
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся без блокировки записи в таблицы
+    atomic = False
+
+    dependencies = [
+        ('ads', '0008_ad_user_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ad',
+            index=models.Index(fields=['is_active', '-created_at'], name='ads_ad_active_created_idx'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='exchangeproposal',
+                    index=_proposal_index(),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(create_proposal_index, drop_proposal_index),
+            ],
+        ),
+    ]
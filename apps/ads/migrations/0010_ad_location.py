@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:55
+
+import django.core.validators
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс строится без блокировки записи в таблицу объявлений. Столбцы
+    # допускают NULL или имеют постоянное значение по умолчанию, поэтому
+    # их добавление не переписывает таблицу и без общей транзакции.
+    atomic = False
+
+    dependencies = [
+        ('ads', '0009_admin_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12, verbose_name='Geohash'),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)], verbose_name='Широта'),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)], verbose_name='Долгота'),
+        ),
+        AddIndexConcurrently(
+            model_name='ad',
+            index=models.Index(fields=['geohash'], name='ads_ad_geohash_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
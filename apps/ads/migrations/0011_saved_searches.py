@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0010_ad_location'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('query', models.CharField(blank=True, max_length=200, verbose_name='Запрос')),
+                ('condition', models.CharField(blank=True, choices=[('new', 'Новое'), ('like_new', 'Как новое'), ('used_good', 'Б/У - Хорошее состояние'), ('used_fair', 'Б/У - Удовлетворительное состояние'), ('used_poor', 'Б/У - Плохое состояние')], max_length=50, verbose_name='Состояние товара')),
+                ('term_count', models.PositiveSmallIntegerField(verbose_name='Число термов')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ads.category', verbose_name='Категория')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Сохраненный поиск',
+                'verbose_name_plural': 'Сохраненные поиски',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SavedSearchMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('ad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ads.ad', verbose_name='Объявление')),
+                ('search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='ads.savedsearch', verbose_name='Сохраненный поиск')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Совпадение сохраненного поиска',
+                'verbose_name_plural': 'Совпадения сохраненных поисков',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at', '-id'], name='ads_savedsearchmatch_feed_idx')],
+                'unique_together': {('search', 'ad')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SavedSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, verbose_name='Терм')),
+                ('search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='ads.savedsearch', verbose_name='Сохраненный поиск')),
+            ],
+            options={
+                'verbose_name': 'Терм сохраненного поиска',
+                'verbose_name_plural': 'Термы сохраненных поисков',
+                'indexes': [models.Index(fields=['term', 'search'], name='ads_savedsearchterm_term_idx')],
+                'unique_together': {('search', 'term')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0011_saved_searches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Просмотры'),
+        ),
+    ]
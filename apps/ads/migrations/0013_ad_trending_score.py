@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0012_ad_view_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdTrendingScore',
+            fields=[
+                ('ad', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending_score', serialize=False, to='ads.ad', verbose_name='Объявление')),
+                ('score', models.FloatField(verbose_name='Рейтинг')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг популярности',
+                'verbose_name_plural': 'Рейтинги популярности',
+                'indexes': [models.Index(fields=['-score', '-ad'], name='ads_trending_score_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0013_ad_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchJobCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Задача')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Последний обработанный id')),
+                ('processed', models.BigIntegerField(default=0, verbose_name='Обработано строк')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+            ],
+            options={
+                'verbose_name': 'Контрольная точка пакетной задачи',
+                'verbose_name_plural': 'Контрольные точки пакетных задач',
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0014_batch_job_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingSimilarAd',
+            fields=[
+                ('ad', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='ads.ad', verbose_name='Объявление')),
+                ('queued_at', models.DateTimeField(verbose_name='Дата постановки в очередь')),
+            ],
+            options={
+                'verbose_name': 'Объявление в очереди похожих',
+                'verbose_name_plural': 'Очередь похожих объявлений',
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:10
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс строится без блокировки записи в таблицу объявлений
+    atomic = False
+
+    dependencies = [
+        ('ads', '0015_pending_similar_ad'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['updated_at'], name='ads_ad_inactive_updated_idx'),
+        ),
+    ]
@@ -1,14 +1,19 @@
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from db.model_mixins import CreatedAtMixin
+from db.model_mixins import CreatedAtMixin, UpdatedAtMixin
+
+from .geo import encode
 
 User = get_user_model()
 
 
-class Ad(CreatedAtMixin):
+class Ad(CreatedAtMixin, UpdatedAtMixin):
     """Модель объявления"""
 
     class Condition:
@@ -56,17 +61,84 @@ class Ad(CreatedAtMixin):
         choices=Condition.CHOICES
     )
     is_active = models.BooleanField(_('Активно'), default=True)
+    latitude = models.FloatField(
+        _('Широта'),
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        _('Долгота'),
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    geohash = models.CharField(
+        _('Geohash'),
+        max_length=12,
+        blank=True,
+        editable=False
+    )
+    # Пишется пачками из view_counter, а не сохранением модели
+    view_count = models.PositiveIntegerField(
+        _('Просмотры'),
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding:
+            # Иначе устаревший view_count загруженного объекта затрет
+            # просмотры, записанные после его загрузки. Отложенные поля
+            # (only/defer) не сохраняются, как и в обычном save().
+            skipped = {'view_count', *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        elif update_fields is not None and (
+            {'latitude', 'longitude'} & set(update_fields)
+        ):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = _('Объявление')
         verbose_name_plural = _('Объявления')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['updated_at'],
+                condition=models.Q(is_active=False),
+                name='ads_ad_inactive_updated_idx'
+            ),
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                name='ads_ad_user_created_idx'
+            ),
+            models.Index(
+                fields=['is_active', '-created_at'],
+                name='ads_ad_active_created_idx'
+            ),
+            # Поиск по префиксу geohash (LIKE 'префикс%')
+            models.Index(
+                fields=['geohash'],
+                name='ads_ad_geohash_idx',
+                opclasses=['varchar_pattern_ops']
+            ),
+        ]
 
 
-class ExchangeProposal(CreatedAtMixin):
+class ExchangeProposal(CreatedAtMixin, UpdatedAtMixin):
     """Модель предложения обмена"""
 
     class Status:
@@ -108,11 +180,30 @@ class ExchangeProposal(CreatedAtMixin):
     def __str__(self):
         return _("Предложение обмена №{}").format(self.id)
 
+    def clean(self):
+        # Уникальность пары в базе обеспечивает таблица
+        # ads_exchangeproposal_pair (см. миграцию 0007), а не
+        # unique_together, поэтому форма проверяет ее здесь
+        if self.ad_sender_id and self.ad_receiver_id and (
+            ExchangeProposal.objects
+            .filter(ad_sender_id=self.ad_sender_id, ad_receiver_id=self.ad_receiver_id)
+            .exclude(pk=self.pk)
+            .exists()
+        ):
+            raise ValidationError(
+                _('Предложение обмена этими объявлениями уже существует')
+            )
+
     class Meta:
         verbose_name = _('Предложение обмена')
         verbose_name_plural = _('Предложения обмена')
         ordering = ['-created_at']
-        unique_together = ['ad_sender', 'ad_receiver']
+        indexes = [
+            models.Index(
+                fields=['status', '-created_at'],
+                name='ads_proposal_status_idx'
+            ),
+        ]
 
 
 class Category(models.Model):
@@ -129,4 +220,320 @@ class Category(models.Model):
         verbose_name_plural = _('Категории')
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class SimilarAd(models.Model):
+    """Модель похожего объявления"""
+
+    ad = models.ForeignKey(
+        'ads.Ad',
+        on_delete=models.CASCADE,
+        related_name='similar_entries',
+        verbose_name=_('Объявление')
+    )
+    similar_ad = models.ForeignKey(
+        'ads.Ad',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('Похожее объявление')
+    )
+    score = models.FloatField(_('Схожесть'))
+
+    class Meta:
+        verbose_name = _('Похожее объявление')
+        verbose_name_plural = _('Похожие объявления')
+        ordering = ['-score']
+        unique_together = ['ad', 'similar_ad']
+        indexes = [
+            models.Index(fields=['ad', '-score']),
+        ]
+
+
+class PendingSimilarAd(models.Model):
+    """Объявление, соседей которого нужно пересчитать"""
+
+    ad = models.OneToOneField(
+        'ads.Ad',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name=_('Объявление')
+    )
+    queued_at = models.DateTimeField(_('Дата постановки в очередь'))
+
+    class Meta:
+        verbose_name = _('Объявление в очереди похожих')
+        verbose_name_plural = _('Очередь похожих объявлений')
+
+
+class AdSignature(models.Model):
+    """Модель сигнатуры объявления для поиска дубликатов"""
+
+    ad = models.OneToOneField(
+        'ads.Ad',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name=_('Объявление')
+    )
+    simhash = models.BigIntegerField(_('SimHash'))
+    band_0 = models.IntegerField(_('Полоса 0'), db_index=True)
+    band_1 = models.IntegerField(_('Полоса 1'), db_index=True)
+    band_2 = models.IntegerField(_('Полоса 2'), db_index=True)
+    band_3 = models.IntegerField(_('Полоса 3'), db_index=True)
+
+    class Meta:
+        verbose_name = _('Сигнатура объявления')
+        verbose_name_plural = _('Сигнатуры объявлений')
+
+
+
+class ArchivedAd(models.Model):
+    """Модель архивного объявления"""
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_ads',
+        verbose_name=_('Пользователь')
+    )
+    title = models.CharField(
+        _('Заголовок'),
+        max_length=200
+    )
+    description = models.TextField(_('Описание'))
+    image_url = models.URLField(
+        _('Ссылка на изображение'),
+        blank=True,
+        null=True,
+        default=None
+    )
+    category = models.ForeignKey(
+        'ads.Category',
+        related_name='archived_ads',
+        verbose_name=_('Категория'),
+        on_delete=models.SET_NULL,
+        null=True,
+    )
+    condition = models.CharField(
+        _('Состояние товара'),
+        max_length=50,
+        choices=Ad.Condition.CHOICES
+    )
+    created_at = models.DateTimeField(_('Дата создания'))
+    updated_at = models.DateTimeField(_('Дата изменения'))
+    archived_at = models.DateTimeField(_('Дата архивации'), auto_now_add=True)
+
+    is_active = False
+    is_archived = True
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        verbose_name = _('Архивное объявление')
+        verbose_name_plural = _('Архивные объявления')
+        ordering = ['-created_at']
+
+
+class ArchivedExchangeProposal(models.Model):
+    """Модель архивного предложения обмена"""
+
+    id = models.BigIntegerField(primary_key=True)
+    ad_sender_id = models.BigIntegerField(
+        _('ID предлагаемого объявления'),
+        db_index=True
+    )
+    ad_receiver_id = models.BigIntegerField(
+        _('ID целевого объявления'),
+        db_index=True
+    )
+    comment = models.TextField(
+        _('Комментарий'),
+        blank=True,
+        null=True,
+        default=None
+    )
+    status = models.CharField(
+        _('Статус'),
+        max_length=20,
+        choices=ExchangeProposal.Status.CHOICES
+    )
+    created_at = models.DateTimeField(_('Дата создания'))
+    updated_at = models.DateTimeField(_('Дата изменения'))
+    archived_at = models.DateTimeField(_('Дата архивации'), auto_now_add=True)
+
+    def __str__(self):
+        return _("Предложение обмена №{}").format(self.id)
+
+    class Meta:
+        verbose_name = _('Архивное предложение обмена')
+        verbose_name_plural = _('Архивные предложения обмена')
+        ordering = ['-created_at']
+
+
+class SavedSearch(CreatedAtMixin):
+    """Модель сохраненного поиска"""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='saved_searches',
+        verbose_name=_('Пользователь')
+    )
+    query = models.CharField(_('Запрос'), max_length=200, blank=True)
+    category = models.ForeignKey(
+        'ads.Category',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('Категория'),
+        blank=True,
+        null=True
+    )
+    condition = models.CharField(
+        _('Состояние товара'),
+        max_length=50,
+        choices=Ad.Condition.CHOICES,
+        blank=True
+    )
+    term_count = models.PositiveSmallIntegerField(_('Число термов'))
+
+    def __str__(self):
+        parts = [f'«{self.query}»' if self.query else '']
+        if self.category_id:
+            parts.append(str(self.category))
+        if self.condition:
+            parts.append(str(self.get_condition_display()))
+        return ', '.join(part for part in parts if part)
+
+    class Meta:
+        verbose_name = _('Сохраненный поиск')
+        verbose_name_plural = _('Сохраненные поиски')
+        ordering = ['-created_at']
+
+
+class SavedSearchTerm(models.Model):
+    """
+    Терм сохраненного поиска: слово запроса или фильтр.
+    Таблица служит инвертированным индексом поисков по термам.
+    """
+
+    search = models.ForeignKey(
+        'ads.SavedSearch',
+        on_delete=models.CASCADE,
+        related_name='terms',
+        verbose_name=_('Сохраненный поиск')
+    )
+    term = models.CharField(_('Терм'), max_length=100)
+
+    class Meta:
+        verbose_name = _('Терм сохраненного поиска')
+        verbose_name_plural = _('Термы сохраненных поисков')
+        unique_together = ['search', 'term']
+        indexes = [
+            models.Index(
+                fields=['term', 'search'],
+                name='ads_savedsearchterm_term_idx'
+            ),
+        ]
+
+
+class SavedSearchMatch(CreatedAtMixin):
+    """Модель объявления, подошедшего под сохраненный поиск"""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('Пользователь')
+    )
+    search = models.ForeignKey(
+        'ads.SavedSearch',
+        on_delete=models.CASCADE,
+        related_name='matches',
+        verbose_name=_('Сохраненный поиск')
+    )
+    ad = models.ForeignKey(
+        'ads.Ad',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('Объявление')
+    )
+
+    class Meta:
+        verbose_name = _('Совпадение сохраненного поиска')
+        verbose_name_plural = _('Совпадения сохраненных поисков')
+        ordering = ['-created_at']
+        unique_together = ['search', 'ad']
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                name='ads_savedsearchmatch_feed_idx'
+            ),
+        ]
+
+
+class AdTrendingScore(models.Model):
+    """
+    Рейтинг популярности объявления. Пополняется просмотрами
+    и предложениями обмена и периодически затухает (см. trending.py).
+    """
+
+    ad = models.OneToOneField(
+        'ads.Ad',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending_score',
+        verbose_name=_('Объявление')
+    )
+    score = models.FloatField(_('Рейтинг'))
+
+    class Meta:
+        verbose_name = _('Рейтинг популярности')
+        verbose_name_plural = _('Рейтинги популярности')
+        indexes = [
+            models.Index(
+                fields=['-score', '-ad'],
+                name='ads_trending_score_idx'
+            ),
+        ]
+
+
+class BatchJobCheckpoint(UpdatedAtMixin):
+    """
+    Контрольная точка пакетной задачи: последний обработанный ключ.
+    Прерванная задача продолжается с него, а не с начала таблицы.
+    """
+
+    name = models.CharField(_('Задача'), max_length=100, unique=True)
+    last_id = models.BigIntegerField(_('Последний обработанный id'), default=0)
+    processed = models.BigIntegerField(_('Обработано строк'), default=0)
+    finished_at = models.DateTimeField(
+        _('Дата завершения'),
+        blank=True,
+        null=True
+    )
+
+    def __str__(self):
+        return self.name
+
+    def advance(self, last_id, processed):
+        self.last_id = last_id
+        self.processed += processed
+        self.finished_at = None
+        self.save(update_fields=['last_id', 'processed', 'finished_at', 'updated_at'])
+
+    def finish(self):
+        self.finished_at = timezone.now()
+        self.save(update_fields=['finished_at', 'updated_at'])
+
+    def reset(self):
+        self.last_id = 0
+        self.processed = 0
+        self.finished_at = None
+        self.save(update_fields=['last_id', 'processed', 'finished_at', 'updated_at'])
+
+    class Meta:
+        verbose_name = _('Контрольная точка пакетной задачи')
+        verbose_name_plural = _('Контрольные точки пакетных задач')
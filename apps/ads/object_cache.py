@@ -0,0 +1,134 @@
+"""
+Кэш объектов для страниц объявления и предложения обмена.
+
+Объявление хранится вместе с автором и категорией. Объявления
+предложения при чтении подставляются из кэша объявлений, поэтому
+изменение объявления достаточно сбросить в одном месте.
+Записи сбрасываются сигналами post_save и post_delete, а после
+массовых UPDATE — явным вызовом invalidate_ads и invalidate_proposals.
+"""
+import time
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Ad, ExchangeProposal
+
+AD_KEY = 'object:ad:{}'
+PROPOSAL_KEY = 'object:proposal:{}'
+
+# Сколько секунд держать блокировку загрузки и сколько ждать ее снятия
+LOCK_TIMEOUT = 10
+WAIT_INTERVAL = 0.05
+WAIT_ATTEMPTS = 20
+
+_MISSING = object()
+
+# Попадания и промахи в текущем процессе: {'ad:hit': ..., 'ad:miss': ...}
+stats = Counter()
+
+
+def _get_or_load(kind, key, loader):
+    """
+    Возвращает объект из кэша или загружает его из базы.
+
+    При промахе загружать объект разрешено только процессу, который
+    захватил блокировку через cache.add; остальные ждут, пока
+    значение появится в кэше, и лишь по истечении ожидания идут
+    в базу сами. Отсутствующий объект кэшируется как None.
+    """
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        stats[f'{kind}:hit'] += 1
+        return value
+    stats[f'{kind}:miss'] += 1
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        for _ in range(WAIT_ATTEMPTS):
+            time.sleep(WAIT_INTERVAL)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        return loader()
+
+    try:
+        value = loader()
+        cache.set(key, value, settings.OBJECT_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+def get_ad(ad_id):
+    """Объявление с автором и категорией или None"""
+    return _get_or_load(
+        'ad',
+        AD_KEY.format(ad_id),
+        lambda: (
+            Ad.objects
+            .select_related('user', 'category')
+            .filter(id=ad_id)
+            .first()
+        )
+    )
+
+
+def _load_proposal(proposal_id):
+    # Объявления загружаются тем же запросом и сразу кладутся в кэш
+    # объявлений, откуда их потом берет get_proposal.
+    proposal = (
+        ExchangeProposal.objects
+        .select_related(
+            'ad_sender__user',
+            'ad_sender__category',
+            'ad_receiver__user',
+            'ad_receiver__category'
+        )
+        .filter(id=proposal_id)
+        .first()
+    )
+    if proposal is not None:
+        cache.set_many(
+            {
+                AD_KEY.format(ad.id): ad
+                for ad in (proposal.ad_sender, proposal.ad_receiver)
+            },
+            settings.OBJECT_CACHE_TIMEOUT
+        )
+    return proposal
+
+
+def get_proposal(proposal_id):
+    """Предложение обмена с объявлениями и их авторами или None"""
+    proposal = _get_or_load(
+        'proposal',
+        PROPOSAL_KEY.format(proposal_id),
+        partial(_load_proposal, proposal_id)
+    )
+    if proposal is None:
+        return None
+
+    for field in ('ad_sender', 'ad_receiver'):
+        ad = get_ad(getattr(proposal, f'{field}_id'))
+        if ad is not None:
+            setattr(proposal, field, ad)
+    return proposal
+
+
+def _delete(keys):
+    # Ключи удаляются сразу и повторно после фиксации транзакции:
+    # иначе параллельный запрос успел бы закэшировать старые данные.
+    cache.delete_many(keys)
+    transaction.on_commit(partial(cache.delete_many, keys))
+
+
+def invalidate_ads(ad_ids):
+    _delete([AD_KEY.format(ad_id) for ad_id in ad_ids])
+
+
+def invalidate_proposals(proposal_ids):
+    _delete([PROPOSAL_KEY.format(proposal_id) for proposal_id in proposal_ids])
@@ -0,0 +1,148 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def estimated_table_rows(table):
+    """
+    Оценка числа строк таблицы по статистике PostgreSQL.
+    Для секционированной таблицы суммируются оценки ее секций.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '''
+            SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0)::bigint
+            FROM pg_class
+            WHERE oid = %s::regclass
+               OR oid IN (
+                   SELECT inhrelid FROM pg_inherits
+                   WHERE inhparent = %s::regclass
+               )
+            ''',
+            [table, table]
+        )
+        return cursor.fetchone()[0]
+
+
+def estimated_query_rows(queryset):
+    """Оценка числа строк запроса по плану EXPLAIN в PostgreSQL"""
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор, который для больших выборок не выполняет COUNT(*),
+    а берет число строк из статистики планировщика.
+
+    Оценка используется только для полной выборки: без фильтров берется
+    оценка размера таблицы, с одним базовым фильтром base_filter
+    (например, {'is_active': True}) — оценка из плана запроса. Оценки
+    планировщика для пользовательских фильтров могут ошибаться на
+    порядки, и ссылка на последнюю страницу вела бы на пустую страницу,
+    поэтому с ними, как и при оценке меньше ESTIMATE_THRESHOLD или
+    на базе не PostgreSQL, считается точное количество.
+    """
+
+    ESTIMATE_THRESHOLD = 10000
+
+    is_estimated = False
+
+    def __init__(self, object_list, per_page, *args, base_filter=None, **kwargs):
+        super().__init__(object_list, per_page, *args, **kwargs)
+        self.base_filter = base_filter
+
+    def _is_base_filter(self, queryset):
+        if self.base_filter is None:
+            return False
+        base_query = queryset.model._default_manager.filter(**self.base_filter).query
+        return queryset.query.where == base_query.where
+
+    def _estimate(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return estimated_table_rows(queryset.model._meta.db_table)
+        if self._is_base_filter(queryset):
+            return estimated_query_rows(queryset)
+        return None
+
+    @cached_property
+    def count(self):
+        if connection.vendor == 'postgresql':
+            estimate = self._estimate()
+            if estimate is not None and estimate >= self.ESTIMATE_THRESHOLD:
+                self.is_estimated = True
+                return estimate
+        return super().count
+
+
+class CursorPage:
+    """Страница курсорной пагинации"""
+
+    def __init__(self, object_list, next_cursor, is_first):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginator:
+    """
+    Курсорная пагинация по (created_at, id) в порядке убывания.
+
+    Курсор хранит ключ последней записи страницы, поэтому следующая
+    страница выбирается условием по индексу, без OFFSET и COUNT(*).
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset.order_by('-created_at', '-id')
+        self.per_page = per_page
+
+    @staticmethod
+    def encode_cursor(obj):
+        value = f'{obj.created_at.isoformat()}|{obj.id}'
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Возвращает (created_at, id) или None для некорректного курсора"""
+        try:
+            value = base64.urlsafe_b64decode(cursor.encode()).decode()
+            created_at, obj_id = value.split('|')
+            return datetime.fromisoformat(created_at), int(obj_id)
+        except (binascii.Error, UnicodeError, ValueError):
+            return None
+
+    def get_page(self, cursor):
+        position = self.decode_cursor(cursor) if cursor else None
+
+        queryset = self.queryset
+        if position is not None:
+            created_at, obj_id = position
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) |
+                Q(created_at=created_at, id__lt=obj_id)
+            )
+
+        object_list = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            next_cursor = self.encode_cursor(object_list[-1])
+
+        return CursorPage(object_list, next_cursor, is_first=position is None)
@@ -0,0 +1,165 @@
+"""
+Помесячные секции таблицы предложений обмена в PostgreSQL.
+
+Таблица ads_exchangeproposal секционирована по created_at
+(см. миграцию 0007). Секции называются ads_exchangeproposal_pYYYYMM,
+строки вне существующих секций попадают в секцию по умолчанию.
+Уникальность пары объявлений обеспечивает таблица
+ads_exchangeproposal_pair, которую заполняют триггеры.
+"""
+import re
+from datetime import date
+
+from django.db import connection, transaction
+
+from .models import ExchangeProposal
+
+TABLE = 'ads_exchangeproposal'
+PAIR_TABLE = 'ads_exchangeproposal_pair'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+_PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+class PartitioningNotSupported(Exception):
+    pass
+
+
+def add_months(month, count):
+    """Первое число месяца, отстоящего от month на count месяцев"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def partition_month(name):
+    """Месяц секции по ее имени или None для чужих таблиц"""
+    match = _PARTITION_RE.match(name)
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def _check_vendor():
+    if connection.vendor != 'postgresql':
+        raise PartitioningNotSupported(
+            'Секционирование поддерживается только в PostgreSQL'
+        )
+
+
+def existing_partitions():
+    """Имена секций таблицы предложений"""
+    _check_vendor()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '''
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            ORDER BY child.relname
+            ''',
+            [TABLE]
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def _move_from_default(cursor, name, bounds):
+    """
+    Создает секцию name из строк секции по умолчанию, попадающих в ее
+    диапазон. PostgreSQL не присоединяет секцию, если такие строки
+    остались в секции по умолчанию, поэтому они переносятся в новую
+    таблицу, которая затем присоединяется к секционированной.
+    """
+    # Иначе между переносом и присоединением в секцию по умолчанию
+    # могут попасть новые строки того же месяца
+    cursor.execute(f'LOCK TABLE {DEFAULT_PARTITION} IN SHARE ROW EXCLUSIVE MODE')
+    cursor.execute(
+        f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    )
+    columns = ', '.join(
+        field.column for field in ExchangeProposal._meta.concrete_fields
+    )
+    cursor.execute(
+        f'WITH moved AS ('
+        f'DELETE FROM {DEFAULT_PARTITION} '
+        f'WHERE created_at >= %s AND created_at < %s RETURNING {columns}'
+        f') INSERT INTO {name} ({columns}) SELECT {columns} FROM moved',
+        bounds
+    )
+    cursor.execute(
+        f'ALTER TABLE {TABLE} ATTACH PARTITION {name} '
+        f'FOR VALUES FROM (%s) TO (%s)',
+        bounds
+    )
+    # Триггер удаления из секции по умолчанию убрал пары перенесенных строк
+    cursor.execute(
+        f'INSERT INTO {PAIR_TABLE} (ad_sender_id, ad_receiver_id) '
+        f'SELECT ad_sender_id, ad_receiver_id FROM {name} '
+        f'ON CONFLICT DO NOTHING'
+    )
+
+
+def create_partitions(start, months):
+    """
+    Создает недостающие секции на months месяцев начиная с месяца start.
+    Строки этих месяцев, уже попавшие в секцию по умолчанию, переносятся
+    в новую секцию в той же транзакции. Возвращает имена созданных секций.
+    """
+    existing = set(existing_partitions())
+    created = []
+    for offset in range(months):
+        month = add_months(start.replace(day=1), offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+
+        bounds = [f'{month} 00:00:00+00', f'{add_months(month, 1)} 00:00:00+00']
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} '
+                f'WHERE created_at >= %s AND created_at < %s)',
+                bounds
+            )
+            has_default_rows, = cursor.fetchone()
+            if has_default_rows:
+                _move_from_default(cursor, name, bounds)
+            else:
+                cursor.execute(
+                    f'CREATE TABLE {name} PARTITION OF {TABLE} '
+                    f'FOR VALUES FROM (%s) TO (%s)',
+                    bounds
+                )
+        created.append(name)
+    return created
+
+
+def detach_partitions(before, drop=False):
+    """
+    Отсоединяет секции за месяцы раньше before.
+
+    Пары объявлений из отсоединяемой секции удаляются из таблицы
+    уникальности, иначе по ним нельзя было бы снова предложить обмен.
+    Возвращает имена отсоединенных секций.
+    """
+    detached = []
+    for name in existing_partitions():
+        month = partition_month(name)
+        if month is None or add_months(month, 1) > before:
+            continue
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {PAIR_TABLE} pair USING {name} proposal '
+                f'WHERE pair.ad_sender_id = proposal.ad_sender_id '
+                f'AND pair.ad_receiver_id = proposal.ad_receiver_id'
+            )
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            if drop:
+                cursor.execute(f'DROP TABLE {name}')
+        detached.append(name)
+    return detached
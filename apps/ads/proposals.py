@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models.functions import Now
+
+from .activation import deactivate_ads
+from .events import proposal_status_changed
+from .models import Ad, ExchangeProposal
+from .object_cache import invalidate_proposals
+
+
+def accept_proposals(proposals):
+    """
+    Принимает ожидающие предложения из queryset proposals.
+
+    Объявление может участвовать только в одном принятом обмене,
+    поэтому из предложений с общим объявлением принимается самое
+    раннее, а остальные остаются ожидающими. Объявления принятых
+    предложений деактивируются. Все изменения выполняются двумя
+    UPDATE в одной транзакции. Возвращает id принятых предложений.
+    """
+    with transaction.atomic():
+        candidates = list(
+            proposals
+            .filter(status=ExchangeProposal.Status.WAITING)
+            .select_for_update(of=('self',))
+            .order_by('created_at', 'id')
+            .values_list(
+                'id', 'ad_sender_id', 'ad_receiver_id',
+                'ad_sender__user_id', 'ad_receiver__user_id'
+            )
+        )
+        ad_ids = {
+            ad_id for _, sender_id, receiver_id, *_ in candidates
+            for ad_id in (sender_id, receiver_id)
+        }
+        available = set(
+            Ad.objects
+            .select_for_update()
+            .filter(id__in=ad_ids, is_active=True)
+            .values_list('id', flat=True)
+        )
+
+        accepted = []
+        traded_ad_ids = []
+        for proposal_id, sender_id, receiver_id, *user_ids in candidates:
+            if sender_id in available and receiver_id in available:
+                available -= {sender_id, receiver_id}
+                accepted.append((
+                    proposal_id, ExchangeProposal.Status.ACCEPTED, *user_ids
+                ))
+                traded_ad_ids += [sender_id, receiver_id]
+        accepted_ids = [proposal_id for proposal_id, *_ in accepted]
+
+        ExchangeProposal.objects.filter(id__in=accepted_ids).update(
+            status=ExchangeProposal.Status.ACCEPTED,
+            updated_at=Now()
+        )
+        deactivate_ads(traded_ad_ids)
+        invalidate_proposals(accepted_ids)
+        proposal_status_changed(accepted)
+
+    return accepted_ids
+
+
+def reject_proposals(proposals):
+    """Отклоняет ожидающие предложения из proposals, возвращает их id"""
+    with transaction.atomic():
+        rejected = [
+            (proposal_id, ExchangeProposal.Status.REJECTED, *user_ids)
+            for proposal_id, *user_ids in (
+                proposals
+                .filter(status=ExchangeProposal.Status.WAITING)
+                .select_for_update(of=('self',))
+                .values_list(
+                    'id', 'ad_sender__user_id', 'ad_receiver__user_id'
+                )
+            )
+        ]
+        rejected_ids = [proposal_id for proposal_id, *_ in rejected]
+        ExchangeProposal.objects.filter(id__in=rejected_ids).update(
+            status=ExchangeProposal.Status.REJECTED,
+            updated_at=Now()
+        )
+        invalidate_proposals(rejected_ids)
+        proposal_status_changed(rejected)
+
+    return rejected_ids
@@ -0,0 +1,97 @@
+"""
+Политика хранения предложений обмена.
+
+Отклоненные и давно ожидающие ответа предложения удаляются через
+PROPOSAL_RETENTION_DAYS дней после последнего изменения. Принятые
+предложения хранятся всегда. Удаление идет пачками по возрастанию id
+в отдельных транзакциях, поэтому не блокирует таблицу надолго
+и не создает большого отставания реплик.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .models import BatchJobCheckpoint, ExchangeProposal
+
+CHECKPOINT_NAME = 'purge_proposals:{}'
+
+
+def retention_policy():
+    """{статус: сколько дней хранить} из PROPOSAL_RETENTION_DAYS"""
+    return {
+        status: days
+        for status, days in settings.PROPOSAL_RETENTION_DAYS.items()
+        if status != ExchangeProposal.Status.ACCEPTED
+    }
+
+
+def purgeable_proposals(status, days):
+    cutoff = timezone.now() - timedelta(days=days)
+    return (
+        ExchangeProposal.objects
+        .filter(status=status, updated_at__lt=cutoff)
+        .order_by('id')
+    )
+
+
+def purge_batch(queryset, after_id=0, batch_size=500):
+    """
+    Удаляет следующую пачку предложений queryset с id > after_id.
+    Возвращает (последний id в пачке, число удаленных); id равен None,
+    если удалять больше нечего.
+    """
+    with transaction.atomic():
+        proposal_ids = list(
+            queryset
+            .filter(id__gt=after_id)
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)
+            [:batch_size]
+        )
+        if not proposal_ids:
+            return None, 0
+
+        ExchangeProposal.objects.filter(id__in=proposal_ids).delete()
+
+    return proposal_ids[-1], len(proposal_ids)
+
+
+def purge_statistics(batch_size=500):
+    """Что удалила бы очистка: по строке статистики на каждый статус"""
+    rows = []
+    for status, days in retention_policy().items():
+        stats = purgeable_proposals(status, days).aggregate(
+            count=Count('id'),
+            oldest=Min('updated_at'),
+            newest=Max('updated_at'),
+            min_id=Min('id'),
+            max_id=Max('id'),
+        )
+        checkpoint = BatchJobCheckpoint.objects.filter(
+            name=CHECKPOINT_NAME.format(status),
+            finished_at__isnull=True
+        ).first()
+        rows.append({
+            'status': status,
+            'days': days,
+            'batches': -(-stats['count'] // batch_size),
+            'resume_after_id': checkpoint.last_id if checkpoint else 0,
+            **stats,
+        })
+    return rows
+
+
+def purge_checkpoint(status, restart=False):
+    """
+    Контрольная точка очистки статуса. Завершенная очистка в следующий
+    раз начинается сначала, прерванная продолжается с последнего id.
+    """
+    checkpoint, _ = BatchJobCheckpoint.objects.get_or_create(
+        name=CHECKPOINT_NAME.format(status)
+    )
+    if restart or checkpoint.finished_at is not None:
+        checkpoint.reset()
+    return checkpoint
@@ -0,0 +1,101 @@
+"""
+Сохраненные поиски и сопоставление с ними новых объявлений.
+
+Поиск хранится как набор термов: слов запроса и фильтров категории
+и состояния. Объявление подходит под поиск, если содержит все его
+термы. Вместо выполнения каждого сохраненного запроса для объявления
+одним запросом по индексу термов считается, сколько термов каждого
+поиска совпало, и выбираются поиски, у которых совпали все.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Ad, SavedSearch, SavedSearchMatch, SavedSearchTerm
+from .text import tokenize, transliterate
+
+CATEGORY_TERM = 'category:{}'
+CONDITION_TERM = 'condition:{}'
+TERM_MAX_LENGTH = 100
+
+
+def _word_terms(text):
+    # Транслитерация сводит кириллические и латинские написания к одному
+    return {transliterate(word)[:TERM_MAX_LENGTH] for word in tokenize(text)}
+
+
+def search_terms(query, category_id=None, condition=''):
+    terms = _word_terms(query)
+    if category_id:
+        terms.add(CATEGORY_TERM.format(category_id))
+    if condition:
+        terms.add(CONDITION_TERM.format(condition))
+    return terms
+
+
+def ad_terms(ad):
+    terms = _word_terms(f'{ad.title} {ad.description}')
+    if ad.category_id:
+        terms.add(CATEGORY_TERM.format(ad.category_id))
+    terms.add(CONDITION_TERM.format(ad.condition))
+    return terms
+
+
+def save_search(user, query='', category=None, condition=''):
+    """
+    Сохраняет поиск пользователя или возвращает такой же сохраненный.
+    Возвращает None, если в поиске нет ни одного терма.
+    """
+    query = query.strip()
+    terms = search_terms(query, category.id if category else None, condition)
+    if not terms:
+        return None
+
+    with transaction.atomic():
+        search, created = SavedSearch.objects.get_or_create(
+            user=user,
+            query=query,
+            category=category,
+            condition=condition,
+            defaults={'term_count': len(terms)}
+        )
+        if created:
+            SavedSearchTerm.objects.bulk_create(
+                SavedSearchTerm(search=search, term=term) for term in terms
+            )
+    return search
+
+
+def matching_searches(ad):
+    """
+    [(id поиска, id пользователя), ...] сохраненных поисков
+    других пользователей, под которые подходит объявление.
+    """
+    return list(
+        SavedSearchTerm.objects
+        .filter(term__in=ad_terms(ad))
+        .exclude(search__user_id=ad.user_id)
+        .values('search_id', 'search__user_id', 'search__term_count')
+        .annotate(matched=Count('id'))
+        .filter(matched=F('search__term_count'))
+        .values_list('search_id', 'search__user_id')
+    )
+
+
+def match_saved_searches(ad_id):
+    """
+    Добавляет объявление в ленты поисков, под которые оно подходит.
+    Уже добавленные совпадения не дублируются, поэтому функцию можно
+    вызывать после каждого изменения объявления.
+    """
+    ad = Ad.objects.filter(id=ad_id, is_active=True).first()
+    if ad is None:
+        return 0
+
+    matches = SavedSearchMatch.objects.bulk_create(
+        [
+            SavedSearchMatch(search_id=search_id, user_id=user_id, ad=ad)
+            for search_id, user_id in matching_searches(ad)
+        ],
+        ignore_conflicts=True
+    )
+    return len(matches)
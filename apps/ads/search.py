@@ -0,0 +1,187 @@
+import heapq
+import threading
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .index_versions import refresh_if_stale
+from .models import Ad
+from .text import to_cyrillic, transliterate, trigrams
+
+
+class TrigramIndex:
+    """
+    Инвертированный триграммный индекс заголовков активных объявлений.
+
+    Используется вместо pg_trgm, когда база данных не PostgreSQL.
+    Заголовки и запросы переводятся в латиницу, поэтому запрос
+    в транслите находит кириллические заголовки и наоборот.
+    """
+
+    name = 'trigram'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(set)
+        self._documents = {}
+        self.is_built = False
+        # Общая версия, с которой построен индекс, и время ее проверки
+        self.version = None
+        self.checked_at = 0.0
+
+    def build(self, documents):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            for doc_id, text in documents:
+                self._add(doc_id, text)
+            self.is_built = True
+
+    def add(self, doc_id, text):
+        with self._lock:
+            self._remove(doc_id)
+            self._add(doc_id, text)
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def search(self, query, threshold, limit):
+        """
+        Возвращает [(id, схожесть), ...] по убыванию схожести.
+
+        Схожесть - доля триграмм запроса, найденных в заголовке,
+        аналог word_similarity из pg_trgm.
+        """
+        query_trigrams = trigrams(transliterate(query))
+        if not query_trigrams:
+            return []
+
+        with self._lock:
+            shared = Counter()
+            for trigram in query_trigrams:
+                shared.update(self._postings.get(trigram, ()))
+
+        scores = (
+            (doc_id, count / len(query_trigrams))
+            for doc_id, count in shared.items()
+        )
+        return heapq.nlargest(
+            limit,
+            (item for item in scores if item[1] >= threshold),
+            key=itemgetter(1)
+        )
+
+    def _add(self, doc_id, text):
+        document_trigrams = trigrams(transliterate(text))
+        self._documents[doc_id] = document_trigrams
+        for trigram in document_trigrams:
+            self._postings[trigram].add(doc_id)
+
+    def _remove(self, doc_id):
+        for trigram in self._documents.pop(doc_id, ()):
+            postings = self._postings[trigram]
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[trigram]
+
+
+trigram_index = TrigramIndex()
+
+
+def _build_trigram_index():
+    trigram_index.build(
+        Ad.objects.filter(is_active=True)
+        .values_list('id', 'title')
+        .iterator()
+    )
+
+
+def get_trigram_index():
+    """
+    Возвращает индекс, заполняя его из базы при первом обращении
+    и после изменений в других процессах
+    """
+    refresh_if_stale(trigram_index, _build_trigram_index)
+    return trigram_index
+
+
+def search_variants(query):
+    """Варианты запроса в кириллице и латинице"""
+    return list(dict.fromkeys(
+        variant for variant in (query, transliterate(query), to_cyrillic(query))
+        if variant
+    ))
+
+
+def _rank_with_pg_trgm(queryset, query):
+    variants = search_variants(query)
+
+    # Операторы pg_trgm используют порог pg_trgm.word_similarity_threshold,
+    # который задается при подключении (см. DATABASES в настройках).
+    condition = Q(title__icontains=query) | Q(description__icontains=query)
+    for variant in variants:
+        condition |= Q(title__trigram_word_similar=variant)
+
+    similarities = [
+        TrigramWordSimilarity(variant, 'title') for variant in variants
+    ]
+    similarity = (
+        Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+    )
+
+    return list(
+        queryset.filter(condition)
+        .annotate(similarity=similarity)
+        .order_by('-similarity', '-created_at')
+        .values_list('id', flat=True)
+        [:settings.FUZZY_SEARCH_LIMIT]
+    )
+
+
+def _rank_with_trigram_index(queryset, query):
+    scores = dict(get_trigram_index().search(
+        query,
+        settings.FUZZY_SEARCH_THRESHOLD,
+        settings.FUZZY_SEARCH_LIMIT
+    ))
+    candidates = queryset.filter(
+        Q(id__in=list(scores)) |
+        Q(title__icontains=query) |
+        Q(description__icontains=query)
+    ).values_list('id', flat=True)[:settings.FUZZY_SEARCH_LIMIT]
+
+    return sorted(
+        candidates,
+        key=lambda ad_id: scores.get(ad_id, 0),
+        reverse=True
+    )
+
+
+def search_ads(queryset, query):
+    """
+    Фильтрует объявления по запросу с учетом опечаток и транслитерации
+    и сортирует их по схожести заголовка с запросом.
+
+    Число ранжируемых объявлений ограничено FUZZY_SEARCH_LIMIT,
+    поэтому время поиска не растет вместе с таблицей.
+    """
+    if connection.vendor == 'postgresql':
+        ad_ids = _rank_with_pg_trgm(queryset, query)
+    else:
+        ad_ids = _rank_with_trigram_index(queryset, query)
+
+    if not ad_ids:
+        return queryset.none()
+
+    ranking = Case(
+        *[When(id=ad_id, then=Value(position))
+          for position, ad_id in enumerate(ad_ids)],
+        output_field=IntegerField()
+    )
+    return queryset.filter(id__in=ad_ids).order_by(ranking)
@@ -0,0 +1,87 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import autocomplete
+from .activation import add_to_ad_indexes, remove_from_ad_indexes as unindex_ads
+from .autocomplete import prefix_index
+from .duplicates import save_signature
+from .http_cache import purge_ads
+from .index_versions import bump_version
+from .models import Ad, Category, ExchangeProposal
+from .object_cache import invalidate_ads, invalidate_proposals
+from .saved_searches import match_saved_searches
+from .similarity import queue_similar_ads
+from .trending import record_proposal
+
+
+@receiver(post_save, sender=Ad)
+def queue_ad_for_similar_ads(sender, instance, update_fields=None, **kwargs):
+    similarity_fields = {'title', 'description', 'category', 'is_active'}
+    if update_fields is None or similarity_fields & set(update_fields):
+        queue_similar_ads([instance.id])
+
+
+@receiver(post_save, sender=Ad)
+def update_ad_signature(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'title', 'description'} & set(update_fields):
+        save_signature(instance)
+
+
+@receiver(post_save, sender=Ad)
+def match_ad_to_saved_searches(sender, instance, update_fields=None, **kwargs):
+    matched_fields = {'title', 'description', 'category', 'condition', 'is_active'}
+    if instance.is_active and (
+        update_fields is None or matched_fields & set(update_fields)
+    ):
+        transaction.on_commit(partial(match_saved_searches, instance.id))
+
+
+@receiver(post_save, sender=Ad)
+def update_ad_indexes(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'title', 'is_active'} & set(update_fields):
+        return
+    if instance.is_active:
+        add_to_ad_indexes([(instance.id, instance.title)])
+    else:
+        unindex_ads([instance.id])
+
+
+@receiver(post_delete, sender=Ad)
+def remove_from_ad_indexes(sender, instance, **kwargs):
+    unindex_ads([instance.id])
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestion(sender, instance, **kwargs):
+    if prefix_index.is_built:
+        prefix_index.add(autocomplete.CATEGORY, instance.id, instance.name)
+    bump_version(prefix_index)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestion(sender, instance, **kwargs):
+    if prefix_index.is_built:
+        prefix_index.remove(autocomplete.CATEGORY, instance.id)
+    bump_version(prefix_index)
+
+
+@receiver(post_save, sender=Ad)
+@receiver(post_delete, sender=Ad)
+def invalidate_cached_ad(sender, instance, **kwargs):
+    invalidate_ads([instance.id])
+    purge_ads([instance.id])
+
+
+@receiver(post_save, sender=ExchangeProposal)
+def add_proposal_to_trending(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(record_proposal, instance.ad_receiver_id))
+
+
+@receiver(post_save, sender=ExchangeProposal)
+@receiver(post_delete, sender=ExchangeProposal)
+def invalidate_cached_proposal(sender, instance, **kwargs):
+    invalidate_proposals([instance.id])
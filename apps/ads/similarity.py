@@ -0,0 +1,256 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Ad, PendingSimilarAd, SimilarAd
+from .text import tokenize
+
+
+def _stored_neighbours_count():
+    # Храним с запасом, чтобы после деактивации части соседей
+    # на странице объявления оставалось что показать.
+    return settings.SIMILAR_ADS_COUNT * 2
+
+
+def _document_text(title, description):
+    # Заголовок повторяется, чтобы его слова весили больше описания.
+    return f'{title} {title} {description}'
+
+
+def _filter_by_category(queryset, category_id, prefix=''):
+    if category_id is None:
+        return queryset.filter(**{f'{prefix}category__isnull': True})
+    return queryset.filter(**{f'{prefix}category_id': category_id})
+
+
+def _load_documents(category_id):
+    ads = _filter_by_category(Ad.objects.filter(is_active=True), category_id)
+    return {
+        ad_id: _document_text(title, description)
+        for ad_id, title, description
+        in ads.values_list('id', 'title', 'description').iterator()
+    }
+
+
+def build_vectors(documents):
+    """
+    Строит L2-нормированные TF-IDF векторы.
+
+    Векторы разреженные: словарь {термин: вес} для каждого документа.
+    """
+    term_counts = {
+        doc_id: Counter(tokenize(text))
+        for doc_id, text in documents.items()
+    }
+    document_frequency = Counter()
+    for counts in term_counts.values():
+        document_frequency.update(counts.keys())
+
+    total = len(term_counts)
+    vectors = {}
+    for doc_id, counts in term_counts.items():
+        vector = {
+            term: (1 + math.log(count)) * (
+                math.log((1 + total) / (1 + document_frequency[term])) + 1
+            )
+            for term, count in counts.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        if norm:
+            vectors[doc_id] = {
+                term: weight / norm for term, weight in vector.items()
+            }
+    return vectors
+
+
+def top_neighbours(vectors, doc_ids, limit):
+    """
+    Возвращает {id: [(id соседа, схожесть), ...]} для документов doc_ids.
+
+    Косинусная схожесть считается через инвертированный индекс,
+    поэтому сравниваются только документы с общими терминами.
+    """
+    postings = defaultdict(list)
+    for doc_id, vector in vectors.items():
+        for term, weight in vector.items():
+            postings[term].append((doc_id, weight))
+
+    result = {}
+    for doc_id in doc_ids:
+        scores = defaultdict(float)
+        for term, weight in vectors.get(doc_id, {}).items():
+            for other_id, other_weight in postings[term]:
+                if other_id != doc_id:
+                    scores[other_id] += weight * other_weight
+        result[doc_id] = heapq.nlargest(
+            limit, scores.items(), key=itemgetter(1)
+        )
+    return result
+
+
+def rebuild_similar_ads(category_ids=None):
+    """
+    Пересчитывает таблицу похожих объявлений для указанных категорий
+    (по умолчанию для всех). Возвращает количество записанных пар.
+    """
+    if category_ids is None:
+        # Полный пересчет заменяет все, что стояло в очереди до него
+        PendingSimilarAd.objects.filter(queued_at__lte=timezone.now()).delete()
+        category_ids = (
+            Ad.objects.filter(is_active=True)
+            .order_by()
+            .values_list('category_id', flat=True)
+            .distinct()
+        )
+        SimilarAd.objects.filter(ad__is_active=False).delete()
+
+    limit = _stored_neighbours_count()
+    created = 0
+    for category_id in list(category_ids):
+        vectors = build_vectors(_load_documents(category_id))
+        neighbours = top_neighbours(vectors, vectors.keys(), limit)
+        rows = [
+            SimilarAd(ad_id=ad_id, similar_ad_id=similar_id, score=score)
+            for ad_id, similar in neighbours.items()
+            for similar_id, score in similar
+        ]
+
+        with transaction.atomic():
+            _filter_by_category(
+                SimilarAd.objects.all(), category_id, prefix='ad__'
+            ).delete()
+            SimilarAd.objects.bulk_create(rows, batch_size=1000)
+        created += len(rows)
+
+    return created
+
+
+def queue_similar_ads(ad_ids):
+    """
+    Ставит объявления в очередь пересчета соседей. Очередь разбирает
+    команда update_similar_ads, поэтому запрос, сохранивший объявление,
+    не пересчитывает векторы всей категории.
+    """
+    now = timezone.now()
+    PendingSimilarAd.objects.bulk_create(
+        [PendingSimilarAd(ad_id=ad_id, queued_at=now) for ad_id in ad_ids],
+        update_conflicts=True,
+        unique_fields=['ad'],
+        update_fields=['queued_at']
+    )
+
+
+def _link_category(category_id, ad_ids):
+    """
+    Пересчитывает соседей объявлений ad_ids одной категории и добавляет
+    их в списки соседей остальных объявлений, не пересчитывая эти
+    списки целиком. Векторы категории строятся один раз на все ad_ids.
+    """
+    limit = _stored_neighbours_count()
+    vectors = build_vectors(_load_documents(category_id))
+    neighbours = top_neighbours(vectors, ad_ids, limit)
+
+    with transaction.atomic():
+        # Старые связи могли остаться от прежнего текста или категории
+        SimilarAd.objects.filter(
+            Q(ad_id__in=ad_ids) | Q(similar_ad_id__in=ad_ids)
+        ).delete()
+
+        targets = {
+            similar_id
+            for similar in neighbours.values()
+            for similar_id, _ in similar
+        } - set(ad_ids)
+        # {объявление: {id записи или id нового соседа: схожесть}}
+        entries = defaultdict(dict)
+        for entry_id, target_id, score in SimilarAd.objects.filter(
+            ad_id__in=targets
+        ).values_list('id', 'ad_id', 'score'):
+            entries[target_id][entry_id] = score
+
+        rows = []
+        added = {}
+        displaced = []
+        for ad_id, similar in neighbours.items():
+            for similar_id, score in similar:
+                rows.append(
+                    SimilarAd(ad_id=ad_id, similar_ad_id=similar_id, score=score)
+                )
+                if similar_id not in targets:
+                    continue
+                target_entries = entries[similar_id]
+                if len(target_entries) >= limit:
+                    weakest = min(target_entries, key=target_entries.get)
+                    if target_entries[weakest] >= score:
+                        continue
+                    del target_entries[weakest]
+                    if isinstance(weakest, tuple):
+                        del added[(similar_id, weakest[1])]
+                    else:
+                        displaced.append(weakest)
+                target_entries[('new', ad_id)] = score
+                added[(similar_id, ad_id)] = score
+
+        rows += [
+            SimilarAd(ad_id=target_id, similar_ad_id=ad_id, score=score)
+            for (target_id, ad_id), score in added.items()
+        ]
+        SimilarAd.objects.filter(id__in=displaced).delete()
+        SimilarAd.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def update_similar_ads(ad_ids):
+    """
+    Пересчитывает соседей объявлений ad_ids. Неактивные объявления
+    удаляются из таблицы похожих. Возвращает число записанных пар.
+    """
+    by_category = defaultdict(list)
+    for ad_id, category_id in Ad.objects.filter(
+        id__in=ad_ids, is_active=True
+    ).values_list('id', 'category_id'):
+        by_category[category_id].append(ad_id)
+
+    inactive_ids = set(ad_ids) - {
+        ad_id for category_ads in by_category.values() for ad_id in category_ads
+    }
+    SimilarAd.objects.filter(
+        Q(ad_id__in=inactive_ids) | Q(similar_ad_id__in=inactive_ids)
+    ).delete()
+
+    return sum(
+        _link_category(category_id, category_ads)
+        for category_id, category_ads in by_category.items()
+    )
+
+
+def process_similar_ads_queue(batch_size=500):
+    """
+    Разбирает очередь пересчета пачками по batch_size объявлений.
+    Возвращает (число обработанных объявлений, число записанных пар).
+    """
+    processed = created = 0
+    while True:
+        started = timezone.now()
+        ad_ids = list(
+            PendingSimilarAd.objects
+            .filter(queued_at__lte=started)
+            .order_by('queued_at', 'ad_id')
+            .values_list('ad_id', flat=True)
+            [:batch_size]
+        )
+        if not ad_ids:
+            return processed, created
+
+        created += update_similar_ads(ad_ids)
+        # Объявление, измененное во время пересчета, остается в очереди
+        PendingSimilarAd.objects.filter(
+            ad_id__in=ad_ids, queued_at__lte=started
+        ).delete()
+        processed += len(ad_ids)
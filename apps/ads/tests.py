@@ -1,17 +1,58 @@
+import asyncio
+import json
+import math
+from datetime import date, timedelta
+from io import StringIO
+from types import SimpleNamespace
 from unittest.mock import patch
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
 from django.core.paginator import Page
-from django.db import transaction
-from django.test import TestCase, Client
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template.loader import get_template, render_to_string
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
-from apps.ads.models import Ad, Category, ExchangeProposal
+from apps.ads.duplicates import (
+    hamming_distance, signature_fields, simhash, to_signed
+)
+from apps.ads.archive import archive_batch
+from apps.ads.models import (
+    Ad, AdSignature, AdTrendingScore, ArchivedAd, ArchivedExchangeProposal,
+    BatchJobCheckpoint, Category, ExchangeProposal, PendingSimilarAd,
+    SavedSearch, SavedSearchMatch, SimilarAd
+)
 from apps.ads.forms import AdForm, ExchangeProposalForm
+from apps.ads import (
+    backfills, batching, events, geo, http_cache, index_versions,
+    object_cache, trending
+)
+from apps.ads.activation import deactivate_ads
+from apps.ads.autocomplete import build_prefix_index, get_prefix_index
+from apps.ads.backfills import run_backfill
+from apps.ads.pagination import EstimatedCountPaginator
+from apps.ads.partitions import add_months, partition_month, partition_name
+from apps.ads.saved_searches import match_saved_searches, save_search
+from apps.ads.search import get_trigram_index
+from apps.ads.similarity import (
+    process_similar_ads_queue, queue_similar_ads, rebuild_similar_ads,
+    update_similar_ads
+)
+from apps.ads import view_counter as view_counter_module
+from apps.ads.view_counter import ViewCounter, view_counter
+from apps.metrics.nplusone import (
+    NPlusOneClient, NPlusOneDetector, NPlusOneError
+)
 
 
 class AdViewTestCase(TestCase):
     def setUp(self):
-        self.client = Client()
+        cache.clear()
+        self.client = NPlusOneClient()
         self.test_user_data = {
             'username': 'testuser',
             'password': 'testpass123'
@@ -391,7 +432,7 @@ class DeleteAdViewTest(AdViewTestCase):
 class CreateProposalViewTest(AdViewTestCase):
     def setUp(self):
         super().setUp()
-        self.client = Client()
+        self.client = NPlusOneClient()
         self.other_user = User.objects.create_user(
             username='otheruser',
             password='testpass123'
@@ -465,6 +506,23 @@ class CreateProposalViewTest(AdViewTestCase):
         form = response.context['form']
 
         self.assertNotIn(self.inactive_ad, form.fields['ad_receiver'].queryset)
+
+    def test_duplicate_proposal_rejected_by_form(self):
+        """Тест запрета повторного предложения обмена теми же объявлениями"""
+        ExchangeProposal.objects.create(
+            ad_sender=self.ad_sender,
+            ad_receiver=self.ad_receiver
+        )
+        form = ExchangeProposalForm(
+            data={'ad_sender': self.ad_sender.id, 'ad_receiver': self.ad_receiver.id},
+            user=self.test_user
+        )
+
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.non_field_errors(),
+            ['Предложение обмена этими объявлениями уже существует']
+        )
         self.assertNotIn(self.ad_sender, form.fields['ad_receiver'].queryset)
 
     def test_successful_proposal_creation(self):
@@ -534,7 +592,7 @@ class CreateProposalViewTest(AdViewTestCase):
 
 class ExchangeProposalListViewTest(TestCase):
     def setUp(self):
-        self.client = Client()
+        self.client = NPlusOneClient()
         self.user1 = User.objects.create_user(
             username='user1',
             password='testpass123'
@@ -735,9 +793,38 @@ class ExchangeProposalListViewTest(TestCase):
         self.assertEqual(len(proposals), 0)
 
 
+    def test_exchange_proposal_list_cursor_pages(self):
+        """Тест курсорной пагинации предложений без COUNT(*)"""
+        for number in range(10):
+            ad = Ad.objects.create(
+                title=f'Ad {number}',
+                user=self.user2,
+                category=self.category,
+                is_active=True
+            )
+            ExchangeProposal.objects.create(ad_sender=self.ad1, ad_receiver=ad)
+        self.client.login(username='user1', password='testpass123')
+
+        with CaptureQueriesContext(connection) as queries:
+            first_page = self.client.get(self.url).context['proposals']
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries.captured_queries
+        ))
+        self.assertEqual(len(first_page), 10)
+        self.assertTrue(first_page.has_next)
+
+        response = self.client.get(self.url, {'cursor': first_page.next_cursor})
+        second_page = response.context['proposals']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next)
+        self.assertFalse(
+            {proposal.id for proposal in first_page} &
+            {proposal.id for proposal in second_page}
+        )
+
 class ProposalDetailViewTest(TestCase):
     def setUp(self):
-        self.client = Client()
+        self.client = NPlusOneClient()
 
         # Создаем пользователей
         self.sender = User.objects.create_user(
@@ -905,7 +992,7 @@ class ProposalDetailViewTest(TestCase):
 
 class UpdateProposalViewTest(TestCase):
     def setUp(self):
-        self.client = Client()
+        self.client = NPlusOneClient()
 
         self.sender = User.objects.create_user(
             username='sender',
@@ -1026,6 +1113,21 @@ class UpdateProposalViewTest(TestCase):
         self.assertFalse(updated_sender_ad.is_active)
         self.assertFalse(updated_receiver_ad.is_active)
 
+    def test_update_proposal_accept_removes_ads_from_indexes(self):
+        """Тест удаления объявлений принятого обмена из индексов поиска"""
+        build_prefix_index()
+        trigram_index = get_trigram_index()
+        trigram_index.add(self.sender_ad.id, self.sender_ad.title)
+        self.assertEqual(get_prefix_index().suggest('sender'), ['Sender Ad'])
+
+        self.client.login(username='receiver', password='testpass123')
+        self.client.post(self.url, {'status': ExchangeProposal.Status.ACCEPTED})
+
+        self.assertEqual(get_prefix_index().suggest('sender'), [])
+        self.assertEqual(get_prefix_index().suggest('receiver'), [])
+        found_ids = {ad_id for ad_id, _ in trigram_index.search('sender ad', 0.3, 10)}
+        self.assertFalse({self.sender_ad.id, self.receiver_ad.id} & found_ids)
+
     def test_update_proposal_atomic_transaction(self):
         """Тест атомарности транзакции"""
         self.client.login(username='receiver', password='testpass123')
@@ -1064,4 +1166,2292 @@ class UpdateProposalViewTest(TestCase):
         self.assertRedirects(
             response,
             reverse('proposal_detail', kwargs={'proposal_id': self.proposal.id})
-        )
\ No newline at end of file
+        )
+
+class SimilarAdsTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_category = Category.objects.create(name='Другая категория')
+        self.phone_ad = Ad.objects.create(
+            title='Смартфон Samsung Galaxy',
+            description='Смартфон в отличном состоянии',
+            user=self.test_user,
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+        self.similar_phone_ad = Ad.objects.create(
+            title='Смартфон Samsung Note',
+            description='Смартфон с чехлом',
+            user=self.test_user,
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+        self.book_ad = Ad.objects.create(
+            title='Книга о кулинарии',
+            description='Рецепты на каждый день',
+            user=self.test_user,
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+        self.other_category_ad = Ad.objects.create(
+            title='Смартфон Samsung Galaxy',
+            description='Смартфон в отличном состоянии',
+            user=self.test_user,
+            category=self.other_category,
+            condition=Ad.Condition.NEW
+        )
+
+    def similar_ids(self, ad):
+        return list(
+            SimilarAd.objects.filter(ad=ad).values_list('similar_ad_id', flat=True)
+        )
+
+    def test_rebuild_links_ads_within_category(self):
+        """Тест пересчета похожих объявлений в пределах категории"""
+        rebuild_similar_ads()
+
+        self.assertEqual(self.similar_ids(self.phone_ad), [self.similar_phone_ad.id])
+        self.assertNotIn(self.other_category_ad.id, self.similar_ids(self.phone_ad))
+        self.assertEqual(self.similar_ids(self.book_ad), [])
+
+    def test_update_adds_new_ad_to_neighbours(self):
+        """Тест инкрементального добавления нового объявления"""
+        rebuild_similar_ads()
+        new_ad = Ad.objects.create(
+            title='Смартфон Samsung Galaxy S',
+            description='Смартфон новый',
+            user=self.test_user,
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+
+        update_similar_ads([new_ad.id])
+
+        self.assertEqual(self.similar_ids(new_ad)[0], self.phone_ad.id)
+        self.assertIn(new_ad.id, self.similar_ids(self.phone_ad))
+        self.assertIn(new_ad.id, self.similar_ids(self.similar_phone_ad))
+
+    def test_new_ad_is_queued_not_computed_in_request(self):
+        """Тест постановки нового объявления в очередь без пересчета в запросе"""
+        self.client.login(**self.test_user_data)
+        self.test_ad_data['title'] = 'Смартфон Samsung'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('ad_create'), data=self.test_ad_data)
+
+        new_ad = Ad.objects.get(title='Смартфон Samsung')
+        self.assertTrue(PendingSimilarAd.objects.filter(ad=new_ad).exists())
+        self.assertEqual(self.similar_ids(new_ad), [])
+
+        call_command('update_similar_ads', stdout=StringIO())
+
+        self.assertIn(self.phone_ad.id, self.similar_ids(new_ad))
+        self.assertFalse(PendingSimilarAd.objects.exists())
+
+    def test_edited_ad_is_relinked(self):
+        """Тест пересчета соседей после изменения текста объявления"""
+        rebuild_similar_ads()
+        self.assertEqual(self.similar_ids(self.book_ad), [])
+
+        self.book_ad.title = 'Смартфон Samsung Galaxy'
+        self.book_ad.description = 'Смартфон в отличном состоянии'
+        self.book_ad.save()
+        process_similar_ads_queue()
+
+        self.assertEqual(self.similar_ids(self.book_ad)[0], self.phone_ad.id)
+        self.assertIn(self.book_ad.id, self.similar_ids(self.phone_ad))
+
+        self.book_ad.title = 'Книга о кулинарии'
+        self.book_ad.description = 'Рецепты на каждый день'
+        self.book_ad.save()
+        process_similar_ads_queue()
+
+        self.assertEqual(self.similar_ids(self.book_ad), [])
+        self.assertNotIn(self.book_ad.id, self.similar_ids(self.phone_ad))
+
+    def test_queue_keeps_ads_changed_during_processing(self):
+        """Тест, что объявление, измененное во время пересчета, остается в очереди"""
+        queue_similar_ads([self.phone_ad.id])
+
+        def update_and_requeue(ad_ids):
+            PendingSimilarAd.objects.filter(ad_id__in=ad_ids).update(
+                queued_at=timezone.now() + timedelta(seconds=1)
+            )
+            return 0
+
+        with patch('apps.ads.similarity.update_similar_ads', update_and_requeue):
+            process_similar_ads_queue()
+        self.assertTrue(
+            PendingSimilarAd.objects.filter(ad=self.phone_ad).exists()
+        )
+
+    def test_ad_detail_shows_only_active_similar_ads(self):
+        """Тест отображения похожих объявлений на странице объявления"""
+        rebuild_similar_ads()
+        url = reverse('ad_detail', kwargs={'ad_id': self.phone_ad.id})
+
+        response = self.client.get(url)
+        self.assertEqual(response.context['similar_ads'], [self.similar_phone_ad])
+        self.assertContains(response, 'Похожие объявления')
+
+        self.similar_phone_ad.is_active = False
+        self.similar_phone_ad.save()
+        response = self.client.get(url)
+        self.assertEqual(response.context['similar_ads'], [])
+
+
+class FuzzySearchTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('ad_list')
+        self.phone_ad = Ad.objects.create(
+            title='Айфон 12',
+            description='Телефон',
+            user=self.test_user,
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+        self.laptop_ad = Ad.objects.create(
+            title='Ноутбук Lenovo',
+            description='Ноутбук для работы',
+            user=self.test_user,
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+
+    def search(self, query):
+        response = self.client.get(self.url, {'q': query})
+        return list(response.context['page_obj'].object_list)
+
+    def test_search_with_typo(self):
+        """Тест поиска с опечаткой в запросе"""
+        self.assertEqual(self.search('ноутбк'), [self.laptop_ad])
+
+    def test_search_with_transliteration(self):
+        """Тест поиска кириллического заголовка запросом в транслите"""
+        self.assertEqual(self.search('ajfon'), [self.phone_ad])
+
+    def test_search_ranks_by_similarity(self):
+        """Тест сортировки результатов по схожести"""
+        closer_ad = Ad.objects.create(
+            title='Айфон',
+            description='Телефон',
+            user=self.test_user,
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+        farther_ad = Ad.objects.create(
+            title='Чехол для айфона',
+            description='Чехол',
+            user=self.test_user,
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+        results = self.search('айфон 12')
+        self.assertEqual(results[0], self.phone_ad)
+        self.assertEqual(set(results), {self.phone_ad, closer_ad, farther_ad})
+
+    def test_search_without_matches(self):
+        """Тест запроса, не похожего ни на одно объявление"""
+        self.assertEqual(self.search('холодильник'), [])
+
+    def test_deactivated_ad_removed_from_index(self):
+        """Тест удаления деактивированного объявления из индекса"""
+        index = get_trigram_index()
+        self.laptop_ad.is_active = False
+        self.laptop_ad.save()
+
+        found_ids = [ad_id for ad_id, _ in index.search('ноутбук', 0.3, 10)]
+        self.assertNotIn(self.laptop_ad.id, found_ids)
+
+
+class AutocompleteViewTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('ad_autocomplete')
+        self.test_ad_data['category'] = self.test_category
+        self.test_ad_data['user'] = self.test_user
+        self.test_ad_data['title'] = 'Велосипед горный'
+        self.test_ad = Ad.objects.create(**self.test_ad_data)
+        build_prefix_index()
+
+    def suggest(self, query):
+        response = self.client.get(self.url, {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['suggestions']
+
+    def test_suggests_ad_titles_and_categories(self):
+        """Тест подсказок по заголовкам объявлений и категориям"""
+        self.assertEqual(self.suggest('вело'), ['Велосипед горный'])
+        self.assertEqual(self.suggest('тест'), [self.test_category.name])
+
+    def test_suggestions_without_database_queries(self):
+        """Тест ответа из индекса в памяти без запросов к базе"""
+        with self.assertNumQueries(0):
+            self.suggest('вело')
+
+    def test_index_follows_ad_changes(self):
+        """Тест обновления индекса при изменении и деактивации объявления"""
+        self.test_ad.title = 'Самокат'
+        self.test_ad.save()
+        self.assertEqual(self.suggest('вело'), [])
+        self.assertEqual(self.suggest('сам'), ['Самокат'])
+
+        self.test_ad.is_active = False
+        self.test_ad.save()
+        self.assertEqual(self.suggest('сам'), [])
+
+    @override_settings(SEARCH_INDEX_REFRESH_INTERVAL=0)
+    def test_index_rebuilt_after_change_in_other_process(self):
+        """Тест перестроения индекса после изменения в другом процессе"""
+        # UPDATE без сигналов и увеличение общей версии - так индекс
+        # видит изменение, сделанное другим воркером
+        Ad.objects.filter(id=self.test_ad.id).update(title='Самокат')
+        cache.incr(index_versions.VERSION_KEY.format('prefix'))
+
+        self.assertEqual(self.suggest('сам'), ['Самокат'])
+        self.assertEqual(self.suggest('вело'), [])
+
+    @override_settings(SEARCH_INDEX_REFRESH_INTERVAL=0)
+    def test_own_changes_do_not_rebuild_index(self):
+        """Тест того, что свои изменения не вызывают перестроения индекса"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_ad.title = 'Самокат'
+            self.test_ad.save()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('сам'), ['Самокат'])
+
+    def test_short_or_empty_query(self):
+        """Тест пустого запроса"""
+        self.assertEqual(self.suggest(''), [])
+
+    def test_duplicate_titles_suggested_once(self):
+        """Тест уникальности подсказок"""
+        Ad.objects.create(**self.test_ad_data)
+        self.assertEqual(self.suggest('велосипед'), ['Велосипед горный'])
+
+
+@override_settings(THROTTLE_RATES={
+    'ad_create': {'user': (2, 60), 'ip': (3, 60)},
+})
+class ThrottleTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('ad_create')
+
+    def ad_data(self, title, description):
+        return dict(self.test_ad_data, title=title, description=description)
+
+    def test_user_limit(self):
+        """Тест ограничения частоты создания объявлений пользователем"""
+        self.client.login(**self.test_user_data)
+        for title, description in [
+            ('Велосипед', 'Горный велосипед'),
+            ('Гитара', 'Акустическая гитара'),
+        ]:
+            response = self.client.post(
+                self.url, data=self.ad_data(title, description)
+            )
+            self.assertEqual(response.status_code, 302)
+
+        response = self.client.post(
+            self.url, data=self.ad_data('Самокат', 'Детский самокат')
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(Ad.objects.count(), 2)
+
+    def test_ip_limit_applies_before_login_check(self):
+        """Тест ограничения по IP до проверки авторизации"""
+        for _ in range(3):
+            response = self.client.post(self.url, data=self.test_ad_data)
+            self.assertEqual(response.status_code, 302)
+
+        response = self.client.post(
+            self.url, data=self.test_ad_data, REMOTE_ADDR='127.0.0.1'
+        )
+        self.assertEqual(response.status_code, 429)
+
+        response = self.client.post(
+            self.url, data=self.test_ad_data, HTTP_X_REAL_IP='10.0.0.2'
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_rejected_request_skips_database(self):
+        """Тест отказа без запросов к базе, кроме чтения сессии"""
+        self.client.login(**self.test_user_data)
+        for _ in range(2):
+            self.client.post(self.url, data=self.test_ad_data)
+
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, data=self.test_ad_data)
+        self.assertEqual(response.status_code, 429)
+
+    def test_ip_rejection_skips_session(self):
+        """Тест отказа по IP без чтения сессии"""
+        for _ in range(3):
+            self.client.post(self.url, data=self.test_ad_data)
+        self.client.login(**self.test_user_data)
+
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, data=self.test_ad_data)
+        self.assertEqual(response.status_code, 429)
+
+    def test_get_requests_not_limited(self):
+        """Тест, что GET-запросы не ограничиваются"""
+        self.client.login(**self.test_user_data)
+        for _ in range(5):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+
+
+class NearDuplicateAdTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            password='testpass123'
+        )
+        self.test_ad_data.update(
+            title='Продам горный велосипед Stels',
+            description='Горный велосипед Stels, рама 18 дюймов, 21 скорость, '
+                        'дисковые тормоза, куплен в прошлом году'
+        )
+        self.client.login(**self.test_user_data)
+        self.client.post(reverse('ad_create'), data=self.test_ad_data)
+        self.original_ad = Ad.objects.get()
+
+    def test_signature_saved_for_new_ad(self):
+        """Тест сохранения сигнатуры нового объявления"""
+        signature = AdSignature.objects.get(ad=self.original_ad)
+        self.assertEqual(
+            signature.simhash,
+            to_signed(simhash(self.original_ad.title, self.original_ad.description))
+        )
+
+    def test_repost_by_same_user_rejected(self):
+        """Тест отклонения повторной публикации того же объявления"""
+        repost_data = dict(
+            self.test_ad_data,
+            description=self.test_ad_data['description'] + ', торг'
+        )
+        response = self.client.post(reverse('ad_create'), data=repost_data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Похожее объявление', str(response.context['form'].errors))
+        self.assertEqual(Ad.objects.count(), 1)
+
+    def test_different_ad_accepted(self):
+        """Тест публикации непохожего объявления"""
+        self.test_ad_data.update(
+            title='Гитара Yamaha',
+            description='Акустическая гитара с чехлом'
+        )
+        response = self.client.post(reverse('ad_create'), data=self.test_ad_data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_editing_ad_does_not_match_itself(self):
+        """Тест редактирования объявления без изменения текста"""
+        url = reverse('ad_edit', kwargs={'ad_id': self.original_ad.id})
+        response = self.client.post(url, data=self.test_ad_data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_other_users_ads_depend_on_scope(self):
+        """Тест поиска дубликатов среди объявлений других пользователей"""
+        self.client.login(username='otheruser', password='testpass123')
+        response = self.client.post(reverse('ad_create'), data=self.test_ad_data)
+        self.assertEqual(response.status_code, 302)
+
+        with self.settings(DUPLICATE_AD_SCOPE='all'):
+            response = self.client.post(
+                reverse('ad_create'), data=self.test_ad_data
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_hamming_distance_between_similar_texts(self):
+        """Тест близости SimHash для почти одинаковых текстов"""
+        original = simhash('Продам iPhone 12', 'Телефон в идеальном состоянии, 128 ГБ')
+        similar = simhash('Продам iPhone 12', 'Телефон в идеальном состоянии, 128 ГБ, чехол')
+        different = simhash('Книга', 'Роман в мягкой обложке')
+
+        self.assertLess(
+            hamming_distance(original, similar),
+            hamming_distance(original, different)
+        )
+
+
+class ArchiveAdsTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            password='testpass123'
+        )
+        self.test_ad_data['category'] = self.test_category
+        self.test_ad_data['user'] = self.test_user
+        self.old_ad = Ad.objects.create(**self.test_ad_data, is_active=False)
+        self.recent_ad = Ad.objects.create(**self.test_ad_data, is_active=False)
+        self.active_ad = Ad.objects.create(**self.test_ad_data)
+        self.partner_ad = Ad.objects.create(
+            title='Partner Ad',
+            description='description',
+            user=self.other_user,
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+        self.resolved_proposal = ExchangeProposal.objects.create(
+            ad_sender=self.old_ad,
+            ad_receiver=self.partner_ad,
+            status=ExchangeProposal.Status.REJECTED
+        )
+        Ad.objects.filter(id=self.old_ad.id).update(
+            updated_at=timezone.now() - timedelta(days=365)
+        )
+
+    def archive(self):
+        call_command('archive_ads', older_than_days=180, sleep=0, stdout=StringIO())
+
+    def test_old_inactive_ads_moved_to_archive(self):
+        """Тест переноса давно неактивных объявлений и их предложений"""
+        self.archive()
+
+        self.assertFalse(Ad.objects.filter(id=self.old_ad.id).exists())
+        self.assertTrue(ArchivedAd.objects.filter(id=self.old_ad.id).exists())
+        self.assertFalse(
+            ExchangeProposal.objects.filter(id=self.resolved_proposal.id).exists()
+        )
+        archived_proposal = ArchivedExchangeProposal.objects.get(
+            id=self.resolved_proposal.id
+        )
+        self.assertEqual(archived_proposal.ad_sender_id, self.old_ad.id)
+        self.assertEqual(archived_proposal.status, ExchangeProposal.Status.REJECTED)
+
+    def test_recent_and_active_ads_stay_hot(self):
+        """Тест, что недавние и активные объявления не архивируются"""
+        self.archive()
+
+        self.assertTrue(Ad.objects.filter(id=self.recent_ad.id).exists())
+        self.assertTrue(Ad.objects.filter(id=self.active_ad.id).exists())
+        self.assertTrue(Ad.objects.filter(id=self.partner_ad.id).exists())
+        self.assertEqual(ArchivedAd.objects.count(), 1)
+
+    def test_ads_with_waiting_proposals_not_archived(self):
+        """Тест, что объявление с ожидающим предложением не архивируется"""
+        self.resolved_proposal.status = ExchangeProposal.Status.WAITING
+        self.resolved_proposal.save()
+
+        self.archive()
+
+        self.assertTrue(Ad.objects.filter(id=self.old_ad.id).exists())
+        self.assertFalse(ArchivedAd.objects.exists())
+
+    def test_batches_resume_after_id(self):
+        """Тест пакетной архивации с продолжением по id"""
+        another_old_ad = Ad.objects.create(**self.test_ad_data, is_active=False)
+        Ad.objects.filter(id=another_old_ad.id).update(
+            updated_at=timezone.now() - timedelta(days=365)
+        )
+
+        last_id, ads, proposals = archive_batch(180, batch_size=1)
+        self.assertEqual((last_id, ads, proposals), (self.old_ad.id, 1, 1))
+
+        last_id, ads, proposals = archive_batch(180, after_id=last_id, batch_size=1)
+        self.assertEqual((last_id, ads, proposals), (another_old_ad.id, 1, 0))
+
+        self.assertEqual(archive_batch(180, after_id=last_id), (None, 0, 0))
+
+    def test_archived_ad_detail(self):
+        """Тест просмотра архивного объявления"""
+        self.archive()
+
+        response = self.client.get(
+            reverse('ad_detail', kwargs={'ad_id': self.old_ad.id})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.old_ad.title)
+        self.assertContains(response, 'Объявление перенесено в архив')
+
+    def test_archived_ad_detail_without_exchange_link(self):
+        """Тест отсутствия предложения обмена на странице архивного объявления"""
+        self.archive()
+        self.client.login(username='otheruser', password='testpass123')
+
+        response = self.client.get(
+            reverse('ad_detail', kwargs={'ad_id': self.old_ad.id})
+        )
+        self.assertNotContains(response, 'Предложить обмен')
+
+
+class ProposalPartitionsTest(TestCase):
+    def test_partition_names_follow_months(self):
+        """Тест имен помесячных секций"""
+        month = date(2025, 12, 1)
+        self.assertEqual(partition_name(month), 'ads_exchangeproposal_p202512')
+        self.assertEqual(partition_month('ads_exchangeproposal_p202512'), month)
+        self.assertIsNone(partition_month('ads_exchangeproposal_default'))
+
+    def test_add_months_crosses_year(self):
+        """Тест перехода через границу года"""
+        self.assertEqual(add_months(date(2025, 11, 1), 3), date(2026, 2, 1))
+        self.assertEqual(add_months(date(2025, 1, 1), -1), date(2024, 12, 1))
+
+    def test_commands_require_postgresql(self):
+        """Тест отказа команд на базах, отличных от PostgreSQL"""
+        if connection.vendor == 'postgresql':
+            self.skipTest('Проверяется только вне PostgreSQL')
+
+        for command in ['create_proposal_partitions', 'detach_proposal_partitions']:
+            with self.assertRaises(CommandError):
+                call_command(command, stdout=StringIO())
+
+
+class MyAdsViewTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('my_ads')
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            password='testpass123'
+        )
+        self.other_ad = Ad.objects.create(
+            title='Other Ad',
+            description='description',
+            user=self.other_user,
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+        self.client.login(**self.test_user_data)
+
+    def create_ad_with_proposals(self, index, statuses):
+        ad = Ad.objects.create(
+            title=f'My Ad {index}',
+            description='description',
+            user=self.test_user,
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+        for number, status in enumerate(statuses):
+            sender_ad = Ad.objects.create(
+                title=f'Sender {index}-{number}',
+                description='description',
+                user=self.other_user,
+                category=self.test_category,
+                condition=Ad.Condition.NEW
+            )
+            ExchangeProposal.objects.create(
+                ad_sender=sender_ad,
+                ad_receiver=ad,
+                status=status
+            )
+        return ad
+
+    def test_requires_login(self):
+        """Тест проверки требования авторизации"""
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertRedirects(response, f'/accounts/login/?next={self.url}')
+
+    def test_proposal_counts_and_latest_proposal(self):
+        """Тест подсчета предложений по статусам и последнего предложения"""
+        Status = ExchangeProposal.Status
+        ad = self.create_ad_with_proposals(
+            1, [Status.WAITING, Status.WAITING, Status.ACCEPTED, Status.REJECTED]
+        )
+        latest = ExchangeProposal.objects.filter(ad_receiver=ad).latest('created_at')
+
+        response = self.client.get(self.url)
+        ads = list(response.context['page_obj'])
+
+        self.assertEqual(ads, [ad])
+        self.assertEqual(
+            (ads[0].waiting_count, ads[0].accepted_count, ads[0].rejected_count),
+            (2, 1, 1)
+        )
+        self.assertEqual(ads[0].latest_proposal, latest)
+
+    def test_constant_number_of_queries(self):
+        """Тест, что число запросов не зависит от числа объявлений"""
+        self.create_ad_with_proposals(0, [ExchangeProposal.Status.WAITING])
+        with CaptureQueriesContext(connection) as single_ad_queries:
+            self.client.get(self.url)
+
+        for index in range(1, 6):
+            self.create_ad_with_proposals(index, [ExchangeProposal.Status.WAITING] * 2)
+        with CaptureQueriesContext(connection) as many_ads_queries:
+            response = self.client.get(self.url)
+
+        self.assertEqual(len(response.context['page_obj']), 6)
+        self.assertEqual(len(single_ad_queries), len(many_ads_queries))
+
+    def test_cursor_pagination(self):
+        """Тест курсорной пагинации"""
+        ads = [self.create_ad_with_proposals(index, []) for index in range(12)]
+
+        response = self.client.get(self.url)
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertTrue(first_page.has_next)
+
+        response = self.client.get(self.url, {'cursor': first_page.next_cursor})
+        second_page = response.context['page_obj']
+        self.assertFalse(second_page.has_next)
+        self.assertCountEqual(
+            list(first_page) + list(second_page), ads
+        )
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Тест обработки некорректного курсора"""
+        self.create_ad_with_proposals(0, [])
+        response = self.client.get(self.url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['page_obj'].is_first)
+
+
+class AdminTest(TestCase):
+    client_class = NPlusOneClient
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin',
+            password='adminpass123'
+        )
+        self.sender = User.objects.create_user(username='sender', password='pass')
+        self.receiver = User.objects.create_user(username='receiver', password='pass')
+        self.category = Category.objects.create(name='Категория')
+        self.client.login(username='admin', password='adminpass123')
+
+    def create_proposal(self, index):
+        ad_sender = Ad.objects.create(
+            title=f'Sender {index}',
+            description='description',
+            user=self.sender,
+            category=self.category,
+            condition=Ad.Condition.NEW
+        )
+        ad_receiver = Ad.objects.create(
+            title=f'Receiver {index}',
+            description='description',
+            user=self.receiver,
+            category=self.category,
+            condition=Ad.Condition.NEW
+        )
+        return ExchangeProposal.objects.create(
+            ad_sender=ad_sender,
+            ad_receiver=ad_receiver
+        )
+
+    def test_changelists_without_n_plus_one(self):
+        """Тест, что число запросов списка не зависит от числа строк"""
+        for url_name in ['admin:ads_ad_changelist', 'admin:ads_exchangeproposal_changelist']:
+            with self.subTest(url_name=url_name):
+                self.create_proposal(f'{url_name}-0')
+                with CaptureQueriesContext(connection) as few_rows:
+                    self.client.get(reverse(url_name))
+
+                for index in range(1, 5):
+                    self.create_proposal(f'{url_name}-{index}')
+                with CaptureQueriesContext(connection) as many_rows:
+                    response = self.client.get(reverse(url_name))
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(few_rows), len(many_rows))
+
+    def test_proposal_change_form_does_not_list_all_ads(self):
+        """Тест, что форма предложения не выводит все объявления в select"""
+        proposal = self.create_proposal(0)
+        other_proposal = self.create_proposal(1)
+
+        response = self.client.get(
+            reverse('admin:ads_exchangeproposal_change', args=[proposal.id])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, other_proposal.ad_sender.title)
+
+    def test_accept_action_deactivates_ads(self):
+        """Тест массового принятия предложений"""
+        proposals = [self.create_proposal(index) for index in range(2)]
+
+        self.client.post(reverse('admin:ads_exchangeproposal_changelist'), {
+            'action': 'accept',
+            '_selected_action': [proposal.id for proposal in proposals],
+        })
+
+        self.assertEqual(
+            ExchangeProposal.objects.filter(status=ExchangeProposal.Status.ACCEPTED).count(),
+            2
+        )
+        self.assertFalse(Ad.objects.filter(is_active=True).exists())
+
+    def test_reject_action_skips_resolved_proposals(self):
+        """Тест массового отклонения только ожидающих предложений"""
+        waiting = self.create_proposal(0)
+        accepted = self.create_proposal(1)
+        accepted.status = ExchangeProposal.Status.ACCEPTED
+        accepted.save()
+
+        self.client.post(reverse('admin:ads_exchangeproposal_changelist'), {
+            'action': 'reject',
+            '_selected_action': [waiting.id, accepted.id],
+        })
+
+        waiting.refresh_from_db()
+        accepted.refresh_from_db()
+        self.assertEqual(waiting.status, ExchangeProposal.Status.REJECTED)
+        self.assertEqual(accepted.status, ExchangeProposal.Status.ACCEPTED)
+
+    def test_deactivate_ads_action(self):
+        """Тест массовой деактивации объявлений"""
+        proposal = self.create_proposal(0)
+
+        self.client.post(reverse('admin:ads_ad_changelist'), {
+            'action': 'deactivate',
+            '_selected_action': [proposal.ad_sender_id],
+        })
+
+        self.assertFalse(Ad.objects.get(id=proposal.ad_sender_id).is_active)
+
+    def test_activate_actions_update_indexes(self):
+        """Тест обновления подсказок при массовом включении и выключении"""
+        proposal = self.create_proposal(0)
+        build_prefix_index()
+        url = reverse('admin:ads_ad_changelist')
+
+        self.client.post(url, {
+            'action': 'deactivate',
+            '_selected_action': [proposal.ad_sender_id],
+        })
+        self.assertEqual(get_prefix_index().suggest('sender'), [])
+
+        self.client.post(url, {
+            'action': 'activate',
+            '_selected_action': [proposal.ad_sender_id],
+        })
+        self.assertEqual(get_prefix_index().suggest('sender'), ['Sender 0'])
+        self.assertTrue(Ad.objects.get(id=proposal.ad_receiver_id).is_active)
+
+
+class AdLookupTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            password='testpass123'
+        )
+        self.own_ad = Ad.objects.create(
+            title='Own Ad',
+            description='description',
+            user=self.test_user,
+            category=self.test_category
+        )
+        self.foreign_ads = [
+            Ad.objects.create(
+                title=f'Foreign Ad {i}',
+                description=f'description {i}',
+                user=self.other_user,
+                category=self.test_category
+            )
+            for i in range(25)
+        ]
+        self.url = reverse('ad_lookup')
+        self.client.login(**self.test_user_data)
+
+    def test_lookup_requires_login(self):
+        """Тест требования авторизации для поиска объявлений"""
+        self.client.logout()
+        response = self.client.get(self.url, {'scope': 'receiver'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_lookup_unknown_scope(self):
+        """Тест ответа на неизвестный scope"""
+        response = self.client.get(self.url, {'scope': 'all'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_lookup_sender_scope(self):
+        """Тест поиска среди собственных объявлений"""
+        response = self.client.get(self.url, {'scope': 'sender'})
+        self.assertEqual(
+            response.json()['results'],
+            [{'id': self.own_ad.id, 'text': 'Own Ad'}]
+        )
+
+    def test_lookup_receiver_pagination(self):
+        """Тест постраничной выдачи чужих объявлений"""
+        first = self.client.get(self.url, {'scope': 'receiver'}).json()
+        second = self.client.get(
+            self.url,
+            {'scope': 'receiver', 'cursor': first['next_cursor']}
+        ).json()
+
+        ids = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(len(first['results']), 20)
+        self.assertIsNone(second['next_cursor'])
+        self.assertCountEqual(ids, [ad.id for ad in self.foreign_ads])
+
+    def test_lookup_query(self):
+        """Тест фильтрации по названию"""
+        response = self.client.get(self.url, {'scope': 'receiver', 'q': 'ad 7'})
+        self.assertEqual(
+            [item['id'] for item in response.json()['results']],
+            [self.foreign_ads[7].id]
+        )
+
+    def test_form_renders_only_selected_ads(self):
+        """Тест, что форма не выводит все объявления в списке"""
+        response = self.client.get(
+            reverse('proposal_create'),
+            {'ad_receiver': self.foreign_ads[3].id}
+        )
+        content = response.content.decode()
+
+        self.assertIn('data-lookup-url', content)
+        self.assertIn('Foreign Ad 3', content)
+        self.assertNotIn('Foreign Ad 4', content)
+
+    def test_foreign_sender_rejected(self):
+        """Тест отклонения чужого объявления в качестве отправителя"""
+        response = self.client.post(reverse('proposal_create'), {
+            'ad_sender': self.foreign_ads[0].id,
+            'ad_receiver': self.foreign_ads[1].id,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ad_sender', response.context['form'].errors)
+        self.assertFalse(ExchangeProposal.objects.exists())
+
+
+class EstimatedCountPaginatorTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            Ad.objects.create(
+                title=f'Ad {i}',
+                description='description',
+                user=self.test_user,
+                category=self.test_category
+            )
+        self.ads = Ad.objects.filter(is_active=True).order_by('id')
+
+    def test_exact_count_outside_postgresql(self):
+        """Тест точного подсчета на базах, отличных от PostgreSQL"""
+        paginator = EstimatedCountPaginator(self.ads, 10)
+        self.assertEqual(paginator.count, 3)
+        self.assertFalse(paginator.is_estimated)
+
+    def test_large_estimate_used(self):
+        """Тест использования оценки для большой выборки"""
+        with patch('apps.ads.pagination.connection') as connection_mock, \
+                patch('apps.ads.pagination.estimated_query_rows',
+                      return_value=50000):
+            connection_mock.vendor = 'postgresql'
+            paginator = EstimatedCountPaginator(
+                self.ads, 10, base_filter={'is_active': True}
+            )
+
+            self.assertEqual(paginator.count, 50000)
+            self.assertTrue(paginator.is_estimated)
+            self.assertEqual(paginator.num_pages, 5000)
+
+    def test_user_filters_counted_exactly(self):
+        """Тест точного подсчета выборки с пользовательскими фильтрами"""
+        with patch('apps.ads.pagination.connection') as connection_mock, \
+                patch('apps.ads.pagination.estimated_query_rows',
+                      return_value=50000) as estimate_mock:
+            connection_mock.vendor = 'postgresql'
+            paginator = EstimatedCountPaginator(
+                self.ads.filter(category=self.test_category), 10,
+                base_filter={'is_active': True}
+            )
+
+            self.assertEqual(paginator.count, 3)
+            self.assertFalse(paginator.is_estimated)
+            estimate_mock.assert_not_called()
+
+    def test_small_estimate_falls_back_to_exact_count(self):
+        """Тест точного подсчета, когда фильтры сужают выборку"""
+        with patch('apps.ads.pagination.connection') as connection_mock, \
+                patch('apps.ads.pagination.estimated_query_rows',
+                      return_value=40):
+            connection_mock.vendor = 'postgresql'
+            paginator = EstimatedCountPaginator(
+                self.ads, 10, base_filter={'is_active': True}
+            )
+
+            self.assertEqual(paginator.count, 3)
+            self.assertFalse(paginator.is_estimated)
+
+    def test_ad_list_uses_estimated_paginator(self):
+        """Тест использования пагинатора в списке объявлений"""
+        response = self.client.get(reverse('ad_list'))
+        self.assertIsInstance(
+            response.context['page_obj'].paginator, EstimatedCountPaginator
+        )
+
+
+class ObjectCacheTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            password='testpass123'
+        )
+        self.ad = Ad.objects.create(
+            title='Cached Ad',
+            description='description',
+            user=self.test_user,
+            category=self.test_category
+        )
+        self.other_ad = Ad.objects.create(
+            title='Other Ad',
+            description='description',
+            user=self.other_user,
+            category=self.test_category
+        )
+        self.proposal = ExchangeProposal.objects.create(
+            ad_sender=self.other_ad,
+            ad_receiver=self.ad
+        )
+        object_cache.stats.clear()
+
+    def test_ad_read_through(self):
+        """Тест повторного чтения объявления из кэша"""
+        object_cache.get_ad(self.ad.id)
+        with self.assertNumQueries(0):
+            ad = object_cache.get_ad(self.ad.id)
+            self.assertEqual(ad.user.username, 'testuser')
+            self.assertEqual(ad.category, self.test_category)
+
+        self.assertEqual(object_cache.stats['ad:miss'], 1)
+        self.assertEqual(object_cache.stats['ad:hit'], 1)
+
+    def test_ad_invalidated_on_save_and_delete(self):
+        """Тест сброса объявления при сохранении и удалении"""
+        object_cache.get_ad(self.ad.id)
+        self.ad.title = 'New Title'
+        self.ad.save()
+        self.assertEqual(object_cache.get_ad(self.ad.id).title, 'New Title')
+
+        ad_id = self.ad.id
+        self.proposal.delete()
+        self.ad.delete()
+        self.assertIsNone(object_cache.get_ad(ad_id))
+
+    def test_proposal_read_through(self):
+        """Тест повторного чтения предложения из кэша"""
+        object_cache.get_proposal(self.proposal.id)
+        with self.assertNumQueries(0):
+            proposal = object_cache.get_proposal(self.proposal.id)
+            self.assertEqual(proposal.ad_sender.user, self.other_user)
+            self.assertEqual(proposal.ad_receiver.user, self.test_user)
+
+    def test_proposal_picks_up_changed_ad(self):
+        """Тест подстановки измененного объявления в предложение"""
+        object_cache.get_proposal(self.proposal.id)
+        self.other_ad.title = 'Renamed Ad'
+        self.other_ad.save()
+
+        proposal = object_cache.get_proposal(self.proposal.id)
+        self.assertEqual(proposal.ad_sender.title, 'Renamed Ad')
+
+    def test_accept_invalidates_ads(self):
+        """Тест сброса объявлений после принятия предложения"""
+        object_cache.get_proposal(self.proposal.id)
+        self.client.login(**self.test_user_data)
+        self.client.post(
+            reverse('proposal_update', kwargs={'proposal_id': self.proposal.id}),
+            {'status': ExchangeProposal.Status.ACCEPTED}
+        )
+
+        proposal = object_cache.get_proposal(self.proposal.id)
+        self.assertEqual(proposal.status, ExchangeProposal.Status.ACCEPTED)
+        self.assertFalse(proposal.ad_sender.is_active)
+        self.assertFalse(proposal.ad_receiver.is_active)
+
+    def test_waits_for_concurrent_load(self):
+        """Тест загрузки из базы, если чужая блокировка не снята"""
+        key = object_cache.AD_KEY.format(self.ad.id)
+        cache.add(f'{key}:lock', 1)
+        with patch.object(object_cache, 'WAIT_INTERVAL', 0), \
+                patch.object(object_cache, 'WAIT_ATTEMPTS', 2):
+            ad = object_cache.get_ad(self.ad.id)
+
+        self.assertEqual(ad, self.ad)
+        # Загрузивший без блокировки процесс не перезаписывает кэш
+        self.assertIsNone(cache.get(key))
+
+    def test_detail_views_use_cache(self):
+        """Тест чтения объявления и предложения из кэша в представлениях"""
+        self.client.login(**self.test_user_data)
+        self.client.get(reverse('ad_detail', kwargs={'ad_id': self.ad.id}))
+        self.client.get(
+            reverse('proposal_detail', kwargs={'proposal_id': self.proposal.id})
+        )
+
+        self.assertEqual(object_cache.stats['ad:miss'], 1)
+        self.assertEqual(object_cache.stats['proposal:miss'], 1)
+        self.assertGreaterEqual(object_cache.stats['ad:hit'], 2)
+
+
+class MicrocacheHeadersTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ad = Ad.objects.create(
+            title='Cached Ad',
+            description='description',
+            user=self.test_user,
+            category=self.test_category
+        )
+
+    def test_anonymous_list_is_public(self):
+        """Тест заголовков общего кэша для анонимного списка"""
+        response = self.client.get(reverse('ad_list'))
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=10', response['Cache-Control'])
+        self.assertEqual(response['Surrogate-Key'], 'ads')
+
+    def test_anonymous_detail_surrogate_key(self):
+        """Тест ключа объявления на странице объявления"""
+        response = self.client.get(
+            reverse('ad_detail', kwargs={'ad_id': self.ad.id})
+        )
+        self.assertEqual(response['Surrogate-Key'], f'ad-{self.ad.id}')
+
+    def test_authenticated_response_is_private(self):
+        """Тест запрета общего кэша для авторизованных пользователей"""
+        self.client.login(**self.test_user_data)
+        response = self.client.get(reverse('ad_list'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('Surrogate-Key', response)
+
+    def test_not_found_not_cached(self):
+        """Тест отсутствия заголовков кэша у ответа 404"""
+        response = self.client.get(reverse('ad_detail', kwargs={'ad_id': 9999}))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('Surrogate-Key', response)
+
+    def _patch_purge(self):
+        """Отдельный обработчик на тест; его поток не запускается"""
+        patches = {
+            'worker': patch.object(
+                http_cache, 'purge_worker', http_cache.PurgeWorker()
+            ),
+            'thread': patch('apps.ads.http_cache.Thread'),
+            'urlopen': patch('apps.ads.http_cache.urlopen'),
+        }
+        mocks = {name: patcher.start() for name, patcher in patches.items()}
+        for patcher in patches.values():
+            self.addCleanup(patcher.stop)
+        return mocks
+
+    @staticmethod
+    def _purged_urls(urlopen_mock):
+        return [call.args[0].full_url for call in urlopen_mock.call_args_list]
+
+    @override_settings(NGINX_PURGE_URL='http://nginx:8081')
+    def test_purge_on_ad_save(self):
+        """Тест обновления кэша nginx после сохранения объявления"""
+        mocks = self._patch_purge()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ad.title = 'New Title'
+            self.ad.save()
+        mocks['thread'].assert_called_once()
+        mocks['worker'].purge_pending()
+
+        self.assertCountEqual(
+            self._purged_urls(mocks['urlopen']),
+            [
+                'http://nginx:8081' + reverse('ad_detail', kwargs={'ad_id': self.ad.id}),
+                'http://nginx:8081' + reverse('ad_list'),
+            ]
+        )
+
+    @override_settings(NGINX_PURGE_URL='http://nginx:8081')
+    def test_bulk_changes_purged_by_one_worker(self):
+        """Тест обновления кэша после массовых изменений одним потоком"""
+        ads = [
+            Ad.objects.create(
+                title=f'Cached Ad {number}',
+                description='description',
+                user=self.test_user,
+                category=self.test_category
+            )
+            for number in range(3)
+        ]
+        mocks = self._patch_purge()
+        with self.captureOnCommitCallbacks(execute=True):
+            for ad in ads:
+                ad.save()
+            deactivate_ads([ad.id for ad in ads])
+        mocks['thread'].assert_called_once()
+        mocks['worker'].purge_pending()
+        mocks['worker'].purge_pending()
+
+        # Каждая страница запрашивается один раз
+        urls = self._purged_urls(mocks['urlopen'])
+        self.assertEqual(len(urls), len(ads) + 1)
+        self.assertEqual(len(set(urls)), len(urls))
+
+    def test_no_purge_without_url(self):
+        """Тест отсутствия запросов к nginx без NGINX_PURGE_URL"""
+        mocks = self._patch_purge()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ad.save()
+
+        mocks['thread'].assert_not_called()
+
+
+class BulkUpdateProposalsTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.buyer = User.objects.create_user(
+            username='buyer',
+            password='testpass123'
+        )
+        self.own_ads = [self._ad(self.test_user, f'Own Ad {i}') for i in range(3)]
+        self.buyer_ads = [self._ad(self.buyer, f'Buyer Ad {i}') for i in range(3)]
+        self.proposals = [
+            ExchangeProposal.objects.create(ad_sender=sender, ad_receiver=receiver)
+            for sender, receiver in zip(self.buyer_ads, self.own_ads)
+        ]
+        # Предложение, адресованное покупателю, а не продавцу
+        self.outgoing = ExchangeProposal.objects.create(
+            ad_sender=self.own_ads[0],
+            ad_receiver=self.buyer_ads[1]
+        )
+        self.url = reverse('proposal_bulk_update')
+        self.client.login(**self.test_user_data)
+
+    def _ad(self, user, title):
+        return Ad.objects.create(
+            title=title,
+            description='description',
+            user=user,
+            category=self.test_category
+        )
+
+    def _post(self, status, proposals):
+        return self.client.post(self.url, {
+            'status': status,
+            'proposal_ids': [proposal.id for proposal in proposals],
+        })
+
+    def test_bulk_accept(self):
+        """Тест массового принятия с деактивацией объявлений"""
+        response = self._post(ExchangeProposal.Status.ACCEPTED, self.proposals[:2])
+
+        self.assertRedirects(response, reverse('proposal_list'))
+        statuses = dict(ExchangeProposal.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[self.proposals[0].id], ExchangeProposal.Status.ACCEPTED)
+        self.assertEqual(statuses[self.proposals[1].id], ExchangeProposal.Status.ACCEPTED)
+        self.assertEqual(statuses[self.proposals[2].id], ExchangeProposal.Status.WAITING)
+        self.assertEqual(
+            set(Ad.objects.filter(is_active=False).values_list('id', flat=True)),
+            {ad.id for ad in self.own_ads[:2] + self.buyer_ads[:2]}
+        )
+
+    def test_bulk_accept_removes_ads_from_indexes(self):
+        """Тест удаления объявлений принятых обменов из подсказок"""
+        build_prefix_index()
+        self._post(ExchangeProposal.Status.ACCEPTED, self.proposals[:1])
+
+        self.assertEqual(
+            get_prefix_index().suggest('own ad'),
+            ['Own Ad 1', 'Own Ad 2']
+        )
+
+    def test_bulk_reject(self):
+        """Тест массового отклонения"""
+        self._post(ExchangeProposal.Status.REJECTED, self.proposals)
+
+        self.assertEqual(
+            ExchangeProposal.objects.filter(
+                status=ExchangeProposal.Status.REJECTED
+            ).count(),
+            3
+        )
+        self.assertFalse(Ad.objects.filter(is_active=False).exists())
+
+    def test_foreign_proposals_skipped(self):
+        """Тест пропуска предложений, адресованных другому пользователю"""
+        response = self._post(
+            ExchangeProposal.Status.ACCEPTED,
+            [self.proposals[0], self.outgoing]
+        )
+
+        self.outgoing.refresh_from_db()
+        self.assertEqual(self.outgoing.status, ExchangeProposal.Status.WAITING)
+        message, = [str(message) for message in response.wsgi_request._messages]
+        self.assertEqual(message, 'Принято предложений: 1, пропущено: 1')
+
+    def test_conflicting_proposals(self):
+        """Тест принятия только одного предложения на объявление"""
+        extra = ExchangeProposal.objects.create(
+            ad_sender=self.buyer_ads[2],
+            ad_receiver=self.own_ads[0]
+        )
+        self._post(ExchangeProposal.Status.ACCEPTED, [self.proposals[0], extra])
+
+        extra.refresh_from_db()
+        self.assertEqual(extra.status, ExchangeProposal.Status.WAITING)
+        self.assertTrue(Ad.objects.get(id=self.buyer_ads[2].id).is_active)
+
+    def test_constant_number_of_queries(self):
+        """Тест числа запросов, не зависящего от количества предложений"""
+        with CaptureQueriesContext(connection) as two:
+            self._post(ExchangeProposal.Status.REJECTED, self.proposals[:2])
+        with CaptureQueriesContext(connection) as one:
+            self._post(ExchangeProposal.Status.REJECTED, self.proposals[2:])
+
+        self.assertEqual(len(one), len(two))
+
+    def test_invalid_action(self):
+        """Тест запроса без действия"""
+        response = self._post('unknown', self.proposals)
+
+        self.assertRedirects(response, reverse('proposal_list'))
+        self.assertFalse(
+            ExchangeProposal.objects.exclude(
+                status=ExchangeProposal.Status.WAITING
+            ).exists()
+        )
+
+    def test_checkboxes_for_incoming_proposals(self):
+        """Тест флажков только у входящих ожидающих предложений"""
+        response = self.client.get(reverse('proposal_list'))
+        content = response.content.decode()
+
+        for proposal in self.proposals:
+            self.assertIn(f'name="proposal_ids" value="{proposal.id}"', content)
+        self.assertNotIn(f'name="proposal_ids" value="{self.outgoing.id}"', content)
+
+
+class ProposalEventsTest(AdViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.buyer = User.objects.create_user(
+            username='buyer',
+            password='testpass123'
+        )
+        self.own_ad = Ad.objects.create(
+            title='Own Ad',
+            description='description',
+            user=self.test_user,
+            category=self.test_category
+        )
+        self.buyer_ad = Ad.objects.create(
+            title='Buyer Ad',
+            description='description',
+            user=self.buyer,
+            category=self.test_category
+        )
+
+    def _published(self, action):
+        # _send отправляет события через NOTIFY или напрямую в брокер
+        # в зависимости от базы, поэтому проверяются переданные ему события
+        with patch('apps.ads.events._send') as send, \
+                self.captureOnCommitCallbacks(execute=True):
+            action()
+        return [event for call in send.call_args_list for event in call.args[0]]
+
+    def test_created_event(self):
+        """Тест события о новом предложении для получателя"""
+        self.client.login(username='buyer', password='testpass123')
+        published = self._published(lambda: self.client.post(
+            reverse('proposal_create'),
+            {'ad_sender': self.buyer_ad.id, 'ad_receiver': self.own_ad.id}
+        ))
+
+        proposal = ExchangeProposal.objects.get()
+        self.assertEqual(published, [{
+            'type': events.CREATED,
+            'proposal_id': proposal.id,
+            'status': ExchangeProposal.Status.WAITING,
+            'user_ids': [self.test_user.id],
+        }])
+
+    def test_status_changed_event(self):
+        """Тест события об изменении статуса для обеих сторон"""
+        proposal = ExchangeProposal.objects.create(
+            ad_sender=self.buyer_ad,
+            ad_receiver=self.own_ad
+        )
+        self.client.login(**self.test_user_data)
+        published = self._published(lambda: self.client.post(
+            reverse('proposal_update', kwargs={'proposal_id': proposal.id}),
+            {'status': ExchangeProposal.Status.REJECTED}
+        ))
+
+        event, = published
+        self.assertEqual(event['type'], events.STATUS_CHANGED)
+        self.assertEqual(event['status'], ExchangeProposal.Status.REJECTED)
+        self.assertEqual(event['user_ids'], [self.buyer.id, self.test_user.id])
+
+    def test_bulk_update_events(self):
+        """Тест событий при массовом принятии"""
+        proposal = ExchangeProposal.objects.create(
+            ad_sender=self.buyer_ad,
+            ad_receiver=self.own_ad
+        )
+        self.client.login(**self.test_user_data)
+        published = self._published(lambda: self.client.post(
+            reverse('proposal_bulk_update'),
+            {'status': 'accepted', 'proposal_ids': [proposal.id]}
+        ))
+
+        self.assertEqual(
+            [(event['proposal_id'], event['status']) for event in published],
+            [(proposal.id, ExchangeProposal.Status.ACCEPTED)]
+        )
+
+    def test_send_events(self):
+        """Тест отправки событий: NOTIFY в PostgreSQL, иначе прямо в брокер"""
+        sent = [
+            {'type': events.CREATED, 'proposal_id': 1, 'user_ids': [1]},
+            {'type': events.CREATED, 'proposal_id': 2, 'user_ids': [2]},
+        ]
+        with patch.object(events.broker, 'publish') as publish, \
+                CaptureQueriesContext(connection) as queries:
+            events._send(sent)
+
+        if connection.vendor == 'postgresql':
+            publish.assert_not_called()
+            query, = queries.captured_queries
+            self.assertIn('pg_notify', query['sql'])
+            for event in sent:
+                self.assertIn(json.dumps(event), query['sql'])
+        else:
+            self.assertEqual(
+                [call.args[0] for call in publish.call_args_list], sent
+            )
+
+    def test_listener_publishes_notifies(self):
+        """Тест раздачи брокером событий, полученных через LISTEN"""
+        event = {'type': events.CREATED, 'proposal_id': 1, 'user_ids': [1]}
+        conn = SimpleNamespace(notifies=[
+            SimpleNamespace(channel=events.CHANNEL, payload=json.dumps(event)),
+        ])
+        broker = events.EventBroker()
+        with patch.object(broker, 'publish') as publish:
+            broker._publish_notifies(conn)
+
+        publish.assert_called_once_with(event)
+        self.assertEqual(conn.notifies, [])
+
+    def test_broker_routes_events_to_users(self):
+        """Тест доставки событий только адресатам"""
+        async def scenario():
+            broker = events.EventBroker()
+            queue = broker.subscribe(1)
+            other_queue = broker.subscribe(2)
+            broker.publish({'type': events.CREATED, 'user_ids': [1]})
+            event = await asyncio.wait_for(queue.get(), 1)
+            broker.unsubscribe(1, queue)
+            broker.unsubscribe(2, other_queue)
+            return event, other_queue.empty()
+
+        event, other_empty = asyncio.run(scenario())
+        self.assertEqual(event['type'], events.CREATED)
+        self.assertTrue(other_empty)
+
+    async def test_stream_requires_login(self):
+        """Тест запрета потока событий без авторизации"""
+        response = await self.async_client.get(reverse('proposal_events'))
+        self.assertEqual(response.status_code, 403)
+
+    async def test_stream_delivers_event(self):
+        """Тест передачи события в поток SSE"""
+        await self.async_client.aforce_login(self.test_user)
+        response = await self.async_client.get(reverse('proposal_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        chunks = aiter(response.streaming_content)
+        self.assertIn(b'retry:', await anext(chunks))
+
+        next_chunk = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        events.broker.publish({
+            'type': events.STATUS_CHANGED,
+            'proposal_id': 7,
+            'status': 'accepted',
+            'user_ids': [self.test_user.id],
+        })
+        chunk = (await asyncio.wait_for(next_chunk, 1)).decode()
+        await chunks.aclose()
+
+        self.assertTrue(chunk.startswith('event: status_changed\n'))
+        self.assertIn('"proposal_id": 7', chunk)
+        self.assertNotIn('user_ids', chunk)
+
+
+class GeoSearchTest(AdViewTestCase):
+    """Тесты поиска объявлений в радиусе"""
+
+    # Красная площадь
+    CENTER = (55.7539, 37.6208)
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('ad_list')
+        self.near_ad = self._create_ad('Рядом', 55.7580, 37.6200)
+        self.city_ad = self._create_ad('В городе', 55.8000, 37.7000)
+        self.far_ad = self._create_ad('Петербург', 59.9386, 30.3141)
+        self.no_location_ad = self._create_ad('Без координат', None, None)
+
+    def _create_ad(self, title, latitude, longitude):
+        return Ad.objects.create(
+            user=self.test_user,
+            title=title,
+            description='Описание',
+            category=self.test_category,
+            condition=Ad.Condition.NEW,
+            latitude=latitude,
+            longitude=longitude
+        )
+
+    def _search(self, radius, **params):
+        return self.client.get(self.url, {
+            'lat': self.CENTER[0],
+            'lon': self.CENTER[1],
+            'radius': radius,
+            **params
+        })
+
+    def test_encode_known_point(self):
+        """Тест кодирования координат в geohash"""
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_geohash_updated_on_save(self):
+        """Тест пересчета geohash при изменении координат"""
+        self.assertEqual(self.near_ad.geohash, geo.encode(55.7580, 37.6200))
+        self.assertEqual(self.no_location_ad.geohash, '')
+
+        self.near_ad.latitude = self.near_ad.longitude = None
+        self.near_ad.save(update_fields=['latitude', 'longitude'])
+        self.near_ad.refresh_from_db()
+        self.assertEqual(self.near_ad.geohash, '')
+
+    def test_covering_cells_contain_circle(self):
+        """Тест того, что ячейки покрывают точки на границе радиуса"""
+        latitude, longitude = self.CENTER
+        for radius_km in (1, 10, 100):
+            cells = geo.covering_cells(latitude, longitude, radius_km)
+            offset = radius_km / geo.KM_PER_DEGREE
+            lon_offset = offset / math.cos(math.radians(latitude))
+            for point in (
+                (latitude + offset, longitude),
+                (latitude - offset, longitude),
+                (latitude, longitude + lon_offset),
+                (latitude, longitude - lon_offset),
+            ):
+                self.assertTrue(
+                    any(geo.encode(*point).startswith(cell) for cell in cells)
+                )
+
+    def test_covering_cells_for_huge_radius(self):
+        """Тест отказа от ячеек для радиуса больше самой крупной ячейки"""
+        self.assertIsNone(geo.covering_cells(0, 0, 10000))
+
+    def test_within_radius(self):
+        """Тест отбора объявлений по расстоянию"""
+        ads = geo.within_radius(Ad.objects.all(), *self.CENTER, 10)
+        distances = {ad.id: ad.distance for ad in ads}
+
+        self.assertEqual(set(distances), {self.near_ad.id, self.city_ad.id})
+        self.assertAlmostEqual(distances[self.near_ad.id], 0.46, places=1)
+
+    def test_ad_list_filters_and_orders_by_distance(self):
+        """Тест фильтра «в радиусе» в списке объявлений"""
+        response = self._search(10)
+
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [self.near_ad, self.city_ad]
+        )
+        self.assertContains(response, 'Расстояние: 0,5 км')
+
+        response = self._search(1)
+        self.assertEqual(list(response.context['page_obj']), [self.near_ad])
+
+    def test_ad_list_ignores_invalid_location(self):
+        """Тест того, что некорректные координаты не фильтруют список"""
+        for params in (
+            {'lat': 'abc', 'lon': '37'},
+            {'lat': '100', 'lon': '37'},
+            {'lat': '55', 'lon': '37', 'radius': '7'},
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.context['location'])
+            self.assertEqual(len(response.context['page_obj']), 4)
+
+    def test_ad_form_requires_both_coordinates(self):
+        """Тест проверки того, что координаты задаются парой"""
+        form = AdForm(data={**self.test_ad_data, 'latitude': 55.75})
+        self.assertFalse(form.is_valid())
+
+        form = AdForm(data={
+            **self.test_ad_data, 'latitude': 55.75, 'longitude': 37.62
+        })
+        self.assertTrue(form.is_valid())
+
+
+class SavedSearchTest(AdViewTestCase):
+    """Тесты сохраненных поисков"""
+
+    def setUp(self):
+        super().setUp()
+        self.seller = User.objects.create_user(
+            username='seller',
+            password='sellerpass123'
+        )
+        self.client.login(**self.test_user_data)
+
+    def _create_ad(self, title, **kwargs):
+        fields = {
+            'user': self.seller,
+            'title': title,
+            'description': 'Описание',
+            'category': self.test_category,
+            'condition': Ad.Condition.NEW,
+            **kwargs
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            return Ad.objects.create(**fields)
+
+    def _feed(self):
+        return SavedSearchMatch.objects.filter(user=self.test_user)
+
+    def test_save_search_from_ad_list(self):
+        """Тест сохранения поиска со страницы объявлений"""
+        response = self.client.post(reverse('saved_search_create'), {
+            'q': 'Велосипед горный',
+            'category': self.test_category.id,
+            'condition': 'unknown'
+        })
+
+        self.assertRedirects(response, reverse('saved_search_list'))
+        search = SavedSearch.objects.get(user=self.test_user)
+        self.assertEqual(search.condition, '')
+        self.assertEqual(search.term_count, 3)
+        self.assertEqual(
+            set(search.terms.values_list('term', flat=True)),
+            {'velosiped', 'gornii', f'category:{self.test_category.id}'}
+        )
+
+    def test_empty_search_is_not_saved(self):
+        """Тест отказа сохранять поиск без запроса и фильтров"""
+        self.client.post(reverse('saved_search_create'), {'q': ' и '})
+        self.assertFalse(SavedSearch.objects.exists())
+
+    def test_same_search_saved_once(self):
+        """Тест того, что одинаковый поиск не дублируется"""
+        for _ in range(2):
+            self.client.post(reverse('saved_search_create'), {'q': 'велосипед'})
+        self.assertEqual(SavedSearch.objects.count(), 1)
+
+    @override_settings(SAVED_SEARCH_LIMIT=1)
+    def test_saved_search_limit(self):
+        """Тест ограничения числа сохраненных поисков"""
+        self.client.post(reverse('saved_search_create'), {'q': 'велосипед'})
+        self.client.post(reverse('saved_search_create'), {'q': 'самокат'})
+        self.assertEqual(SavedSearch.objects.count(), 1)
+
+    def test_new_ad_matches_all_terms(self):
+        """Тест того, что объявление попадает в ленту при совпадении всех термов"""
+        search = save_search(self.test_user, 'горный велосипед', self.test_category)
+        other_category = Category.objects.create(name='Другая')
+
+        matched = self._create_ad('Горный велосипед Stels')
+        transliterated = self._create_ad('Gornyi velosiped')
+        self._create_ad('Велосипед городской')
+        self._create_ad('Горный велосипед', category=other_category)
+
+        self.assertEqual(
+            set(self._feed().values_list('ad_id', flat=True)),
+            {matched.id, transliterated.id}
+        )
+        self.assertTrue(self._feed().filter(search=search).exists())
+
+    def test_own_and_inactive_ads_do_not_match(self):
+        """Тест того, что свои и неактивные объявления не попадают в ленту"""
+        save_search(self.test_user, 'велосипед')
+
+        self._create_ad('Велосипед', user=self.test_user)
+        self._create_ad('Велосипед', is_active=False)
+
+        self.assertFalse(self._feed().exists())
+
+    def test_edited_ad_matches_once(self):
+        """Тест сопоставления отредактированного объявления без дублей"""
+        save_search(self.test_user, 'велосипед')
+        ad = self._create_ad('Самокат')
+        self.assertFalse(self._feed().exists())
+
+        for title in ('Велосипед', 'Велосипед детский'):
+            ad.title = title
+            with self.captureOnCommitCallbacks(execute=True):
+                ad.save()
+
+        self.assertEqual(self._feed().count(), 1)
+
+    def test_matching_uses_single_query(self):
+        """Тест того, что сопоставление не выполняет запрос на каждый поиск"""
+        for word in ('велосипед', 'самокат', 'ролики', 'коньки'):
+            save_search(self.test_user, word)
+        ad = self._create_ad('Велосипед и самокат')
+        SavedSearchMatch.objects.all().delete()
+
+        # Загрузка объявления, подбор поисков и вставка совпадений
+        with self.assertNumQueries(3):
+            self.assertEqual(match_saved_searches(ad.id), 2)
+
+    def test_feed_page(self):
+        """Тест ленты и удаления сохраненного поиска"""
+        search = save_search(self.test_user, 'велосипед')
+        self._create_ad('Велосипед')
+
+        response = self.client.get(reverse('saved_search_list'))
+        self.assertContains(response, '«велосипед»')
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+        self.client.post(reverse('saved_search_delete', args=[search.id]))
+        self.assertFalse(SavedSearch.objects.exists())
+        self.assertFalse(self._feed().exists())
+
+
+class ViewCounterTest(AdViewTestCase):
+    """Тесты буферизованного счетчика просмотров"""
+
+    def setUp(self):
+        super().setUp()
+        self.ads = [
+            Ad.objects.create(
+                user=self.test_user,
+                title=f'Объявление {number}',
+                description='Описание',
+                category=self.test_category,
+                condition=Ad.Condition.NEW
+            )
+            for number in range(3)
+        ]
+        self.counter = ViewCounter()
+
+    def _view_counts(self):
+        return list(
+            Ad.objects.filter(id__in=[ad.id for ad in self.ads])
+            .order_by('id')
+            .values_list('view_count', flat=True)
+        )
+
+    def test_flush_writes_accumulated_views(self):
+        """Тест записи накопленных просмотров пачкой"""
+        for ad in (self.ads[0], self.ads[0], self.ads[1], self.ads[2]):
+            self.counter.record(ad.id)
+        self.assertEqual(self._view_counts(), [0, 0, 0])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.counter.flush(), 3)
+        updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE ads_ad SET view_count') or
+            query['sql'].startswith('UPDATE "ads_ad" SET "view_count"')
+        ]
+        if connection.vendor == 'postgresql':
+            # Все объявления обновляются одним UPDATE ... FROM (VALUES ...)
+            self.assertEqual(len(updates), 1)
+            self.assertIn('FROM (VALUES', updates[0])
+        else:
+            # Объявления с одинаковым приростом обновляются одним запросом
+            self.assertEqual(len(updates), 2)
+        self.assertEqual(self._view_counts(), [2, 1, 1])
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_values_update_in_batches(self):
+        """Тест UPDATE ... FROM (VALUES ...) пачками по FLUSH_BATCH_SIZE"""
+        counts = {self.ads[0].id: 3, self.ads[1].id: 1, self.ads[2].id: 2}
+        with patch('apps.ads.view_counter.FLUSH_BATCH_SIZE', 2), \
+                patch('apps.ads.view_counter.connection') as connection_mock:
+            view_counter_module._update_postgresql(counts)
+
+        cursor = connection_mock.cursor.return_value.__enter__.return_value
+        statements = cursor.execute.call_args_list
+        self.assertEqual(len(statements), 2)
+        sql, params = statements[0].args
+        self.assertIn('FROM (VALUES (%s::bigint, %s::integer), (%s::bigint, %s::integer))', sql)
+        self.assertIn('WHERE ads_ad.id = v.id', sql)
+        # Строки блокируются в порядке id
+        self.assertEqual(params, [self.ads[0].id, 3, self.ads[1].id, 1])
+        self.assertEqual(statements[1].args[1], [self.ads[2].id, 2])
+
+        if connection.vendor == 'postgresql':
+            view_counter_module._update_postgresql(counts)
+            self.assertEqual(self._view_counts(), [3, 1, 2])
+
+    @override_settings(VIEW_COUNT_MAX_PENDING=2)
+    def test_flush_when_buffer_is_full(self):
+        """Тест записи просмотров при заполнении буфера"""
+        self.counter.record(self.ads[0].id)
+        self.assertEqual(self._view_counts(), [0, 0, 0])
+        self.counter.record(self.ads[1].id)
+        self.assertEqual(self._view_counts(), [1, 1, 0])
+
+    @override_settings(VIEW_COUNT_FLUSH_INTERVAL=0)
+    def test_flush_after_interval(self):
+        """Тест записи просмотров по истечении интервала"""
+        self.counter.record(self.ads[0].id)
+        self.assertEqual(self._view_counts(), [1, 0, 0])
+
+    def test_failed_flush_keeps_views(self):
+        """Тест того, что просмотры не теряются при ошибке записи"""
+        self.counter.record(self.ads[0].id)
+        update = (
+            '_update_postgresql' if connection.vendor == 'postgresql'
+            else '_update_generic'
+        )
+        with patch(
+            f'apps.ads.view_counter.{update}',
+            side_effect=DatabaseError
+        ), self.assertLogs('apps.ads.view_counter', 'ERROR'):
+            self.assertEqual(self.counter.flush(), 0)
+
+        self.counter.record(self.ads[0].id)
+        self.counter.flush()
+        self.assertEqual(self._view_counts(), [2, 0, 0])
+
+    def test_model_save_keeps_flushed_views(self):
+        """Тест того, что сохранение загруженного объявления не затирает просмотры"""
+        ad = Ad.objects.get(id=self.ads[0].id)
+        self.counter.record(ad.id)
+        self.counter.flush()
+
+        ad.title = 'Новый заголовок'
+        ad.save()
+
+        ad.refresh_from_db()
+        self.assertEqual(ad.title, 'Новый заголовок')
+        self.assertEqual(ad.view_count, 1)
+
+    def test_record_view_endpoint(self):
+        """Тест отметки просмотра со страницы объявления"""
+        url = reverse('ad_view', args=[self.ads[0].id])
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 204)
+        view_counter.flush()
+        self.assertEqual(self._view_counts(), [1, 0, 0])
+
+    def test_record_view_ignores_inactive_and_missing_ads(self):
+        """Тест того, что просмотры неактивных и несуществующих объявлений не учитываются"""
+        Ad.objects.filter(id=self.ads[1].id).update(is_active=False)
+        for ad_id in (self.ads[1].id, 0):
+            response = self.client.post(reverse('ad_view', args=[ad_id]))
+            self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(view_counter.flush(), 0)
+
+    @override_settings(THROTTLE_RATES={'ad_view': {'ip': (2, 60)}})
+    def test_record_view_throttled_by_ip(self):
+        """Тест ограничения частоты отметок просмотра по IP"""
+        url = reverse('ad_view', args=[self.ads[0].id])
+        statuses = [self.client.post(url).status_code for _ in range(3)]
+
+        self.assertEqual(statuses, [204, 204, 429])
+        view_counter.flush()
+        self.assertEqual(self._view_counts(), [2, 0, 0])
+
+    def test_idle_counter_flushes_on_timer(self):
+        """Тест записи просмотров по таймеру, когда новых просмотров нет"""
+        with patch('apps.ads.view_counter.threading.Timer') as timer_mock:
+            self.counter.record(self.ads[0].id)
+            self.counter.record(self.ads[1].id)
+
+        timer_mock.assert_called_once()
+        interval, callback = timer_mock.call_args.args
+        self.assertEqual(interval, settings.VIEW_COUNT_FLUSH_INTERVAL)
+        with patch('apps.ads.view_counter.connection.close'):
+            callback()
+        self.assertEqual(self._view_counts(), [1, 1, 0])
+
+    def test_save_skips_deferred_fields(self):
+        """Тест того, что сохранение объявления из only() не перезаписывает отложенные поля"""
+        ad = Ad.objects.only('id', 'title').get(id=self.ads[0].id)
+        ad.title = 'Новый заголовок'
+        with CaptureQueriesContext(connection) as queries:
+            ad.save()
+
+        update, = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "ads_ad"')
+        ]
+        self.assertIn('"title"', update)
+        self.assertNotIn('"description"', update)
+
+    def test_views_shown_on_pages(self):
+        """Тест вывода числа просмотров в списке и на странице объявления"""
+        Ad.objects.filter(id=self.ads[0].id).update(view_count=42)
+
+        response = self.client.get(reverse('ad_list'))
+        self.assertContains(response, 'Просмотров: 42')
+
+        response = self.client.get(reverse('ad_detail', args=[self.ads[0].id]))
+        self.assertContains(response, 'Просмотров: 42')
+        self.assertContains(
+            response,
+            f'data-view-url="{reverse("ad_view", args=[self.ads[0].id])}"'
+        )
+
+
+@override_settings(
+    TRENDING_VIEW_WEIGHT=1.0,
+    TRENDING_PROPOSAL_WEIGHT=10.0,
+    TRENDING_HALF_LIFE_HOURS=24,
+    TRENDING_MIN_SCORE=0.5
+)
+class TrendingTest(AdViewTestCase):
+    """Тесты рейтинга популярности объявлений"""
+
+    def setUp(self):
+        super().setUp()
+        self.other_user = User.objects.create_user(
+            username='other',
+            password='otherpass123'
+        )
+        self.ads = [
+            Ad.objects.create(
+                user=self.test_user,
+                title=f'Объявление {number}',
+                description='Описание',
+                category=self.test_category,
+                condition=Ad.Condition.NEW
+            )
+            for number in range(3)
+        ]
+        self.other_ad = Ad.objects.create(
+            user=self.other_user,
+            title='Чужое объявление',
+            description='Описание',
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+
+    def _scores(self):
+        return dict(AdTrendingScore.objects.values_list('ad_id', 'score'))
+
+    def test_views_add_scores(self):
+        """Тест начисления очков за записанные просмотры"""
+        counter = ViewCounter()
+        for ad in (self.ads[0], self.ads[0], self.ads[1]):
+            counter.record(ad.id)
+        counter.flush()
+        counter.record(self.ads[0].id)
+        counter.flush()
+
+        self.assertEqual(
+            self._scores(),
+            {self.ads[0].id: 3.0, self.ads[1].id: 1.0}
+        )
+
+    def test_missing_and_inactive_ads_are_skipped(self):
+        """Тест того, что рейтинг не создается для несуществующих и неактивных"""
+        self.ads[2].is_active = False
+        self.ads[2].save()
+
+        trending.add_scores({self.ads[2].id: 5.0, 10 ** 9: 5.0})
+
+        self.assertEqual(self._scores(), {})
+
+    def test_received_proposal_adds_score(self):
+        """Тест начисления очков объявлению, на которое предложили обмен"""
+        with self.captureOnCommitCallbacks(execute=True):
+            ExchangeProposal.objects.create(
+                ad_sender=self.other_ad,
+                ad_receiver=self.ads[1]
+            )
+
+        self.assertEqual(self._scores(), {self.ads[1].id: 10.0})
+
+    def test_decay(self):
+        """Тест затухания и удаления малых рейтингов"""
+        trending.add_scores({
+            self.ads[0].id: 8.0, self.ads[1].id: 0.8, self.ads[2].id: 8.0
+        })
+        Ad.objects.filter(id=self.ads[2].id).update(is_active=False)
+
+        out = StringIO()
+        call_command('decay_trending_scores', '--hours', '24', stdout=out)
+
+        self.assertEqual(self._scores(), {self.ads[0].id: 4.0})
+        self.assertIn('удалено: 2', out.getvalue())
+
+    def test_decay_uses_time_since_last_run(self):
+        """Тест затухания на время, прошедшее с прошлого запуска"""
+        trending.add_scores({self.ads[0].id: 8.0})
+
+        # Первый запуск только запоминает время
+        hours, _, _ = trending.decay_since_last_run()
+        self.assertEqual(hours, 0)
+        self.assertEqual(self._scores(), {self.ads[0].id: 8.0})
+
+        # Пропущенные запуски: с прошлого прошло двое суток
+        BatchJobCheckpoint.objects.filter(
+            name=trending.CHECKPOINT_NAME
+        ).update(finished_at=timezone.now() - timedelta(hours=48))
+        hours, _, _ = trending.decay_since_last_run()
+
+        self.assertAlmostEqual(hours, 48, places=2)
+        self.assertAlmostEqual(self._scores()[self.ads[0].id], 2.0, places=3)
+
+    def test_ad_list_trending_sort(self):
+        """Тест сортировки «В тренде» в списке объявлений"""
+        trending.add_scores({self.ads[0].id: 1.0, self.ads[2].id: 5.0})
+
+        response = self.client.get(reverse('ad_list'), {
+            'sort': 'trending',
+            'category': self.test_category.id
+        })
+
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [self.ads[2], self.ads[0]]
+        )
+        self.assertEqual(response.context['current_sort'], 'trending')
+
+        response = self.client.get(reverse('ad_list'), {'sort': 'unknown'})
+        self.assertEqual(response.context['current_sort'], '')
+        self.assertEqual(len(response.context['page_obj']), 4)
+
+
+@override_settings(PROPOSAL_RETENTION_DAYS={'rejected': 90, 'waiting': 180})
+class PurgeProposalsTest(AdViewTestCase):
+    """Тесты очистки старых предложений обмена"""
+
+    def setUp(self):
+        super().setUp()
+        other_user = User.objects.create_user(
+            username='other',
+            password='otherpass123'
+        )
+        self.receiver_ad = Ad.objects.create(
+            user=other_user,
+            title='Целевое объявление',
+            description='Описание',
+            category=self.test_category,
+            condition=Ad.Condition.NEW
+        )
+        self.proposals = {}
+        for name, status, age_days in (
+            ('old_rejected_1', ExchangeProposal.Status.REJECTED, 100),
+            ('old_rejected_2', ExchangeProposal.Status.REJECTED, 100),
+            ('new_rejected', ExchangeProposal.Status.REJECTED, 10),
+            ('old_waiting', ExchangeProposal.Status.WAITING, 200),
+            ('new_waiting', ExchangeProposal.Status.WAITING, 100),
+            ('old_accepted', ExchangeProposal.Status.ACCEPTED, 1000),
+        ):
+            sender_ad = Ad.objects.create(
+                user=self.test_user,
+                title=name,
+                description='Описание',
+                category=self.test_category,
+                condition=Ad.Condition.NEW
+            )
+            proposal = ExchangeProposal.objects.create(
+                ad_sender=sender_ad,
+                ad_receiver=self.receiver_ad,
+                status=status
+            )
+            ExchangeProposal.objects.filter(id=proposal.id).update(
+                updated_at=timezone.now() - timedelta(days=age_days)
+            )
+            self.proposals[name] = proposal
+
+    def _remaining(self):
+        ids = set(ExchangeProposal.objects.values_list('id', flat=True))
+        return {name for name, proposal in self.proposals.items() if proposal.id in ids}
+
+    def _purge(self, *args):
+        out = StringIO()
+        call_command('purge_proposals', '--sleep', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_reports_statistics(self):
+        """Тест пробного запуска без удаления"""
+        output = self._purge('--dry-run', '--batch-size', '1')
+
+        self.assertIn('[rejected] старше 90 дней: 2, пачек: 2', output)
+        self.assertIn('[waiting] старше 180 дней: 1, пачек: 1', output)
+        self.assertEqual(len(self._remaining()), 6)
+
+    def test_purge_by_retention_policy(self):
+        """Тест удаления пачками по политике хранения"""
+        output = self._purge('--batch-size', '1')
+
+        self.assertEqual(
+            self._remaining(),
+            {'new_rejected', 'new_waiting', 'old_accepted'}
+        )
+        self.assertIn('Удалено предложений: 3', output)
+        checkpoint = BatchJobCheckpoint.objects.get(
+            name='purge_proposals:rejected'
+        )
+        self.assertEqual(checkpoint.processed, 2)
+        self.assertIsNotNone(checkpoint.finished_at)
+
+    def test_purge_resumes_from_checkpoint(self):
+        """Тест продолжения прерванной очистки с контрольной точки"""
+        BatchJobCheckpoint.objects.create(
+            name='purge_proposals:rejected',
+            last_id=self.proposals['old_rejected_1'].id,
+            processed=1
+        )
+
+        self._purge('--status', 'rejected')
+        self.assertIn('old_rejected_1', self._remaining())
+        self.assertNotIn('old_rejected_2', self._remaining())
+
+        # Завершенная очистка в следующий раз идет с начала
+        self._purge('--status', 'rejected')
+        self.assertNotIn('old_rejected_1', self._remaining())
+
+    def test_restart_ignores_checkpoint(self):
+        """Тест запуска очистки заново"""
+        BatchJobCheckpoint.objects.create(
+            name='purge_proposals:rejected',
+            last_id=self.proposals['old_rejected_2'].id
+        )
+        self._purge('--status', 'rejected', '--restart')
+        self.assertFalse({'old_rejected_1', 'old_rejected_2'} & self._remaining())
+
+    def test_accepted_status_is_never_purged(self):
+        """Тест отказа очищать статус без политики хранения"""
+        with self.assertRaises(CommandError):
+            self._purge('--status', 'accepted')
+
+    def test_pause_waits_for_replicas(self):
+        """Тест ожидания реплик между пачками"""
+        with patch('apps.ads.batching.time.sleep') as sleep, patch(
+            'apps.ads.batching.replication_lag',
+            side_effect=[10, 3, 0]
+        ):
+            batching.pause(0.1, max_replication_lag=1)
+
+        self.assertEqual(sleep.call_count, 3)
+
+
+class BackfillTest(AdViewTestCase):
+    """Тесты онлайн-заполнения данных"""
+
+    def setUp(self):
+        super().setUp()
+        self.ads = [
+            Ad.objects.create(
+                user=self.test_user,
+                title=f'Объявление {number}',
+                description='Описание',
+                category=self.test_category,
+                condition=Ad.Condition.NEW,
+                latitude=55.75,
+                longitude=37.62
+            )
+            for number in range(5)
+        ]
+        # Строки, добавленные до появления сигнатур и geohash
+        AdSignature.objects.all().delete()
+        Ad.objects.update(geohash='')
+
+    def _backfill(self, *args):
+        out = StringIO()
+        call_command('backfill', *args, '--sleep', '0', stdout=out)
+        return out.getvalue()
+
+    def test_list_jobs(self):
+        """Тест вывода списка задач"""
+        output = self._backfill()
+        self.assertIn('ad_signatures:', output)
+        self.assertIn('ad_geohash:', output)
+
+    def test_incomplete_job_fails_on_register(self):
+        """Тест ошибки регистрации задачи без обязательных методов"""
+        class IncompleteBackfill(backfills.BackfillJob):
+            name = 'incomplete'
+            model = Ad
+
+            def pending(self):
+                return Ad.objects.none()
+
+        with self.assertRaises(TypeError):
+            backfills.register(IncompleteBackfill)
+        self.assertNotIn('incomplete', backfills.jobs)
+
+    def test_backfill_in_batches(self):
+        """Тест заполнения диапазонами id с выводом прогресса"""
+        output = self._backfill('ad_signatures', '--batch-size', '2')
+
+        self.assertEqual(AdSignature.objects.count(), 5)
+        self.assertEqual(output.count('строк/с'), 3)
+        self.assertIn('100.0%', output)
+        self.assertIn('незаполненных строк не осталось', output)
+        signature = AdSignature.objects.get(ad=self.ads[0])
+        self.assertEqual(
+            signature.simhash,
+            signature_fields(self.ads[0].title, self.ads[0].description)['simhash']
+        )
+
+    def test_backfill_does_not_touch_updated_at(self):
+        """Тест того, что заполнение не меняет дату изменения объявлений"""
+        updated_at = Ad.objects.get(id=self.ads[0].id).updated_at
+
+        self._backfill('ad_geohash')
+
+        ad = Ad.objects.get(id=self.ads[0].id)
+        self.assertEqual(ad.geohash, geo.encode(55.75, 37.62))
+        self.assertEqual(ad.updated_at, updated_at)
+
+    def test_backfill_resumes_from_checkpoint(self):
+        """Тест продолжения прерванного заполнения"""
+        BatchJobCheckpoint.objects.create(
+            name='backfill:ad_signatures',
+            last_id=self.ads[2].id,
+            processed=3
+        )
+
+        with self.assertRaisesMessage(
+            CommandError, 'Осталось незаполненных строк: 3'
+        ):
+            self._backfill('ad_signatures')
+        self.assertEqual(
+            set(AdSignature.objects.values_list('ad_id', flat=True)),
+            {self.ads[3].id, self.ads[4].id}
+        )
+        checkpoint = BatchJobCheckpoint.objects.get(
+            name='backfill:ad_signatures'
+        )
+        self.assertEqual(checkpoint.processed, 5)
+
+        self._backfill('ad_signatures', '--restart')
+        self.assertEqual(AdSignature.objects.count(), 5)
+
+    def test_verify_only(self):
+        """Тест проверки без заполнения"""
+        with self.assertRaisesMessage(
+            CommandError, 'Осталось незаполненных строк: 5'
+        ):
+            self._backfill('ad_geohash', '--verify')
+        self.assertFalse(Ad.objects.exclude(geohash='').exists())
+
+    def test_rate_limit(self):
+        """Тест ограничения скорости заполнения"""
+        with patch('apps.ads.batching.time.sleep') as sleep:
+            run_backfill(
+                backfills.jobs['ad_signatures'],
+                batch_size=10,
+                sleep=0,
+                rows_per_second=5
+            )
+
+        self.assertAlmostEqual(sleep.call_args[0][0], 1, places=1)
+
+    def test_backfill_updated_at(self):
+        """Тест заполнения даты изменения строк, созданных до миграции"""
+        applied = timezone.now()
+        created_at = applied - timedelta(days=400)
+        # Строки до миграции: AddField проставил им время миграции,
+        # последнее объявление изменили уже после нее
+        Ad.objects.update(created_at=created_at, updated_at=applied)
+        Ad.objects.filter(id=self.ads[4].id).update(
+            updated_at=applied + timedelta(hours=1)
+        )
+        job = backfills.jobs['ad_updated_at']
+
+        with patch.object(job, 'migration_applied', return_value=applied):
+            self.assertEqual(job.verify(), 4)
+            self._backfill('ad_updated_at', '--batch-size', '2')
+            self.assertEqual(job.verify(), 0)
+
+        self.assertEqual(
+            Ad.objects.filter(updated_at=created_at).count(), 4
+        )
+        self.assertEqual(
+            Ad.objects.get(id=self.ads[4].id).updated_at,
+            applied + timedelta(hours=1)
+        )
+
+    def test_updated_at_not_pending_after_migration(self):
+        """Тест того, что строки, созданные после миграции, не заполняются"""
+        job = backfills.jobs['ad_updated_at']
+        self.assertIsNotNone(job.migration_applied())
+        self.assertEqual(job.verify(), 0)
+
+    def test_unknown_job(self):
+        """Тест ошибки для незарегистрированной задачи"""
+        with self.assertRaises(CommandError):
+            self._backfill('unknown')
+
+
+class NPlusOneDetectorTest(AdViewTestCase):
+    """Тесты обнаружения N+1 запросов"""
+
+    def setUp(self):
+        super().setUp()
+        for number in range(3):
+            category = Category.objects.create(name=f'Категория {number}')
+            Ad.objects.create(
+                user=self.test_user,
+                title=f'Объявление {number}',
+                description='Описание',
+                category=category,
+                condition=Ad.Condition.NEW
+            )
+
+    def _category_line(self):
+        template = get_template('ads/ad_list.html').template
+        for number, line in enumerate(template.source.splitlines(), 1):
+            if '{{ ad.category.name }}' in line:
+                return f'ads/ad_list.html:{number}'
+
+    def test_lazy_access_in_code(self):
+        """Тест обнаружения ленивой загрузки в цикле с местом в коде"""
+        with NPlusOneDetector() as detector:
+            names = [ad.category.name for ad in Ad.objects.all()]
+
+        self.assertEqual(len(names), 3)
+        self.assertEqual(len(detector.problems), 1)
+        problem = detector.problems[0]
+        self.assertEqual(problem.count, 3)
+        self.assertRegex(problem.location, r'^apps/ads/tests\.py:\d+$')
+        self.assertIn('ads_category', problem.sql)
+
+    def test_lazy_access_in_template(self):
+        """Тест обнаружения ленивой загрузки в шаблоне со строкой шаблона"""
+        with NPlusOneDetector() as detector:
+            render_to_string('ads/ad_list.html', {'page_obj': Ad.objects.all()})
+
+        locations = [problem.location for problem in detector.problems]
+        self.assertIn(self._category_line(), locations)
+
+    def test_select_related_passes(self):
+        """Тест отсутствия срабатывания при select_related"""
+        with NPlusOneDetector() as detector:
+            for ad in Ad.objects.select_related('category'):
+                ad.category.name
+
+        self.assertEqual(detector.problems, [])
+
+    def test_identical_queries_are_not_nplusone(self):
+        """Тест того, что повтор одного и того же запроса не считается N+1"""
+        with NPlusOneDetector() as detector:
+            for _ in range(3):
+                Category.objects.get(id=self.test_category.id)
+
+        self.assertEqual(detector.problems, [])
+
+    def test_client_fails_request_with_nplusone(self):
+        """Тест ошибки тестового клиента с указанием строки шаблона"""
+        with patch(
+            'apps.ads.views.Ad.objects.select_related',
+            lambda *fields: Ad.objects.all()
+        ):
+            with self.assertRaisesMessage(NPlusOneError, self._category_line()):
+                self.client.get(reverse('ad_list'))
+
+            self.client.detect_nplusone = False
+            self.assertEqual(self.client.get(reverse('ad_list')).status_code, 200)
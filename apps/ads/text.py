@@ -0,0 +1,80 @@
+import re
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_SPACES_RE = re.compile(r'\s+')
+
+STOP_WORDS = frozenset({
+    'и', 'в', 'во', 'на', 'с', 'со', 'по', 'для', 'от', 'до', 'из', 'за',
+    'не', 'но', 'а', 'или', 'к', 'у', 'о', 'об', 'это', 'как', 'так',
+    'the', 'and', 'or', 'for', 'of', 'in', 'on', 'to', 'with', 'a', 'an',
+})
+
+
+def normalize_text(text):
+    """Приводит текст к нижнему регистру и схлопывает пробелы"""
+    if not text:
+        return ''
+    text = text.lower().replace('ё', 'е')
+    return _SPACES_RE.sub(' ', text).strip()
+
+
+def tokenize(text):
+    """Разбивает текст на значимые слова"""
+    return [
+        word for word in _WORD_RE.findall(normalize_text(text))
+        if len(word) > 1 and word not in STOP_WORDS
+    ]
+
+
+_CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n',
+    'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f',
+    'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y',
+    'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+_LATIN_TO_CYRILLIC = [
+    ('sch', 'щ'), ('zh', 'ж'), ('kh', 'х'), ('ts', 'ц'), ('ch', 'ч'),
+    ('sh', 'ш'), ('yu', 'ю'), ('ya', 'я'), ('yo', 'е'), ('ph', 'ф'),
+    ('a', 'а'), ('b', 'б'), ('c', 'к'), ('d', 'д'), ('e', 'е'), ('f', 'ф'),
+    ('g', 'г'), ('h', 'х'), ('i', 'и'), ('j', 'й'), ('k', 'к'), ('l', 'л'),
+    ('m', 'м'), ('n', 'н'), ('o', 'о'), ('p', 'п'), ('q', 'к'), ('r', 'р'),
+    ('s', 'с'), ('t', 'т'), ('u', 'у'), ('v', 'в'), ('w', 'в'), ('x', 'кс'),
+    ('y', 'ы'), ('z', 'з'),
+]
+# Буквы, которые по-разному передаются при транслитерации
+_LATIN_FOLDING = [('ph', 'f'), ('j', 'i'), ('y', 'i'), ('w', 'v')]
+
+
+def transliterate(text):
+    """Переводит текст в латиницу и сглаживает вариативные буквы"""
+    text = ''.join(_CYRILLIC_TO_LATIN.get(char, char) for char in normalize_text(text))
+    for source, target in _LATIN_FOLDING:
+        text = text.replace(source, target)
+    return text
+
+
+def to_cyrillic(text):
+    """Приблизительно переводит латинский текст в кириллицу"""
+    text = normalize_text(text)
+    result = []
+    position = 0
+    while position < len(text):
+        for source, target in _LATIN_TO_CYRILLIC:
+            if text.startswith(source, position):
+                result.append(target)
+                position += len(source)
+                break
+        else:
+            result.append(text[position])
+            position += 1
+    return ''.join(result)
+
+
+def trigrams(text):
+    """Возвращает множество триграмм слов текста так же, как pg_trgm"""
+    result = set()
+    for word in _WORD_RE.findall(text):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
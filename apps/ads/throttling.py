@@ -0,0 +1,93 @@
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.http import HttpResponse
+
+
+def _client_ip(request):
+    return (
+        request.META.get(settings.THROTTLE_IP_HEADER)
+        or request.META.get('REMOTE_ADDR')
+    )
+
+
+def _user_id(request):
+    # Если пользователь уже загружен, сессию читать не нужно
+    user = getattr(request, '_cached_user', None)
+    if user is not None:
+        return user.id
+    # Иначе он определяется по сессии без обращения к таблице
+    # пользователей
+    return request.session.get(SESSION_KEY)
+
+
+# IP проверяется первым: отказ по нему не читает сессию
+_IDENTITIES = (
+    ('ip', _client_ip),
+    ('user', _user_id),
+)
+
+
+def check_throttle(scope, request):
+    """
+    Проверяет лимиты запросов для scope и учитывает текущий запрос.
+
+    Token bucket реализован как GCRA: для каждого ключа в кэше хранится
+    только теоретическое время следующего запроса. Возвращает число
+    секунд до следующей разрешенной попытки или None, если запрос
+    разрешен. Лимиты проверяются по очереди, и на первом превышенном
+    проверка заканчивается, поэтому отказ по IP не обращается к сессии.
+    Чтение и запись в кэш не атомарны, поэтому при одновременных
+    запросах лимит может быть превышен на несколько запросов.
+    """
+    rates = settings.THROTTLE_RATES.get(scope, {})
+    now = time.time()
+    updated = {}
+    timeout = 0
+    for kind, identity_of in _IDENTITIES:
+        if kind not in rates:
+            continue
+        identity = identity_of(request)
+        if not identity:
+            continue
+
+        key = f'throttle:{scope}:{kind}:{identity}'
+        limit, period = rates[kind]
+        arrival = max(cache.get(key, now), now) + period / limit
+        if arrival - now > period:
+            return arrival - now - period
+        updated[key] = arrival
+        timeout = max(timeout, period)
+
+    if updated:
+        cache.set_many(updated, timeout=math.ceil(timeout))
+    return None
+
+
+def throttle(scope):
+    """
+    Ограничивает частоту POST-запросов к view по пользователю и IP.
+
+    Декоратор должен стоять выше login_required и остальных проверок,
+    чтобы отклоненный запрос не доходил до форм и базы данных.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method == 'POST':
+                retry_after = check_throttle(scope, request)
+                if retry_after is not None:
+                    response = HttpResponse(
+                        'Слишком много запросов. Попробуйте позже.',
+                        status=429,
+                        content_type='text/plain; charset=utf-8'
+                    )
+                    response['Retry-After'] = math.ceil(retry_after)
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
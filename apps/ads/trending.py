@@ -0,0 +1,136 @@
+"""
+Рейтинг популярности объявлений для сортировки «в тренде».
+
+Рейтинг хранится в AdTrendingScore и не пересчитывается по истории:
+просмотры (при записи счетчика просмотров) и полученные предложения
+обмена прибавляют очки к строке объявления, а команда
+decay_trending_scores по расписанию умножает все рейтинги на
+коэффициент затухания и удаляет слишком маленькие. Время прошлого
+затухания хранится в BatchJobCheckpoint, поэтому пропущенный или
+лишний запуск не искажает рейтинги. Страница «в тренде» читает первые
+строки по индексу рейтинга.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Ad, AdTrendingScore, BatchJobCheckpoint
+
+CHECKPOINT_NAME = 'decay_trending_scores'
+
+
+def _add_postgresql(increments):
+    table = AdTrendingScore._meta.db_table
+    values = ', '.join(['(%s::bigint, %s::double precision)'] * len(increments))
+    with connection.cursor() as cursor:
+        # Соединение с объявлениями отбрасывает несуществующие и неактивные
+        cursor.execute(
+            f'INSERT INTO {table} (ad_id, score) '
+            f'SELECT ad.id, v.score FROM (VALUES {values}) AS v (id, score) '
+            f'JOIN {Ad._meta.db_table} ad ON ad.id = v.id AND ad.is_active '
+            f'ORDER BY ad.id '
+            f'ON CONFLICT (ad_id) DO UPDATE '
+            f'SET score = {table}.score + EXCLUDED.score',
+            [
+                value for ad_id in sorted(increments)
+                for value in (ad_id, increments[ad_id])
+            ]
+        )
+
+
+def _add_generic(increments):
+    existing = set(
+        AdTrendingScore.objects
+        .filter(ad_id__in=increments)
+        .values_list('ad_id', flat=True)
+    )
+    ids_by_score = defaultdict(list)
+    for ad_id in existing:
+        ids_by_score[increments[ad_id]].append(ad_id)
+    for score, ids in ids_by_score.items():
+        AdTrendingScore.objects.filter(ad_id__in=ids).update(
+            score=F('score') + score
+        )
+
+    new_ids = Ad.objects.filter(
+        id__in=set(increments) - existing,
+        is_active=True
+    ).values_list('id', flat=True)
+    AdTrendingScore.objects.bulk_create(
+        [AdTrendingScore(ad_id=ad_id, score=increments[ad_id]) for ad_id in new_ids],
+        ignore_conflicts=True
+    )
+
+
+def add_scores(increments):
+    """Прибавляет очки к рейтингам объявлений: {id объявления: очки}"""
+    increments = {ad_id: score for ad_id, score in increments.items() if score}
+    if not increments:
+        return
+
+    if connection.vendor == 'postgresql':
+        _add_postgresql(increments)
+    else:
+        _add_generic(increments)
+
+
+def record_views(counts):
+    add_scores({
+        ad_id: views * settings.TRENDING_VIEW_WEIGHT
+        for ad_id, views in counts.items()
+    })
+
+
+def record_proposal(ad_receiver_id):
+    add_scores({ad_receiver_id: settings.TRENDING_PROPOSAL_WEIGHT})
+
+
+def decay_scores(hours):
+    """
+    Уменьшает рейтинги так, как они затухли бы за hours часов,
+    и удаляет маленькие рейтинги и рейтинги неактивных объявлений.
+    Возвращает (число обновленных, число удаленных).
+    """
+    factor = 0.5 ** (hours / settings.TRENDING_HALF_LIFE_HOURS)
+    decayed = AdTrendingScore.objects.update(score=F('score') * factor)
+    removed, _ = AdTrendingScore.objects.filter(
+        Q(score__lt=settings.TRENDING_MIN_SCORE) | Q(ad__is_active=False)
+    ).delete()
+    return decayed, removed
+
+
+def decay_since_last_run(hours=None):
+    """
+    Уменьшает рейтинги на время, прошедшее с прошлого затухания,
+    или на hours часов, если оно указано явно. При первом запуске
+    прошлого затухания нет, и рейтинги только очищаются.
+    Возвращает (часы, число обновленных, число удаленных).
+    """
+    with transaction.atomic():
+        # Блокировка не дает двум запускам затухания учесть одно время дважды
+        checkpoint, _ = (
+            BatchJobCheckpoint.objects
+            .select_for_update()
+            .get_or_create(name=CHECKPOINT_NAME)
+        )
+        if hours is None:
+            last_run = checkpoint.finished_at
+            hours = (
+                (timezone.now() - last_run).total_seconds() / 3600
+                if last_run is not None else 0
+            )
+        decayed, removed = decay_scores(hours)
+        checkpoint.finish()
+    return hours, decayed, removed
+
+
+def trending_ads(queryset):
+    """Объявления queryset с рейтингом в порядке убывания рейтинга"""
+    return (
+        queryset
+        .filter(trending_score__isnull=False)
+        .order_by('-trending_score__score', '-id')
+    )
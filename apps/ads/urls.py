@@ -4,11 +4,20 @@ from . import views
 urlpatterns = [
     path('', views.ad_list, name='ad_list'),
     path('create/', views.create_ad, name='ad_create'),
+    path('autocomplete/', views.autocomplete, name='ad_autocomplete'),
+    path('my/', views.my_ads, name='my_ads'),
+    path('lookup/', views.ad_lookup, name='ad_lookup'),
+    path('searches/', views.saved_search_list, name='saved_search_list'),
+    path('searches/create/', views.create_saved_search, name='saved_search_create'),
+    path('searches/<int:search_id>/delete/', views.delete_saved_search, name='saved_search_delete'),
     path('<int:ad_id>/', views.ad_detail, name='ad_detail'),
+    path('<int:ad_id>/view/', views.record_ad_view, name='ad_view'),
     path('<int:ad_id>/edit/', views.edit_ad, name='ad_edit'),
     path('<int:ad_id>/delete/', views.delete_ad, name='ad_delete'),
     path('create_proposal/', views.create_proposal, name='proposal_create'),
     path('proposals/', views.exchange_proposal_list, name='proposal_list'),
+    path('proposals/bulk_update/', views.bulk_update_proposals, name='proposal_bulk_update'),
+    path('proposals/events/', views.proposal_events, name='proposal_events'),
     path('proposals/<int:proposal_id>/', views.proposal_detail, name='proposal_detail'),
     path('proposals/<int:proposal_id>/update/', views.update_proposal, name='proposal_update'),
 ]
\ No newline at end of file
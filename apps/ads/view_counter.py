@@ -0,0 +1,123 @@
+"""
+Буферизованный счетчик просмотров объявлений.
+
+Просмотры копятся в памяти процесса и раз в VIEW_COUNT_FLUSH_INTERVAL
+секунд (или при накоплении VIEW_COUNT_MAX_PENDING объявлений)
+записываются одним UPDATE ... FROM (VALUES ...) на пачку объявлений,
+а не отдельной записью на каждый просмотр. Первый просмотр после
+записи запускает таймер, поэтому просмотры записываются и тогда,
+когда новых запросов к воркеру больше нет. Если процесс завершится
+аварийно, теряются только просмотры за последний интервал.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+
+from .models import Ad
+from .trending import record_views
+
+logger = logging.getLogger(__name__)
+
+# Сколько объявлений обновлять одним запросом
+FLUSH_BATCH_SIZE = 500
+
+
+def _update_postgresql(counts):
+    table = Ad._meta.db_table
+    ids = sorted(counts)
+    with connection.cursor() as cursor:
+        # Строки блокируются в порядке id, чтобы воркеры не ждали друг друга
+        # по кругу
+        for start in range(0, len(ids), FLUSH_BATCH_SIZE):
+            batch = ids[start:start + FLUSH_BATCH_SIZE]
+            values = ', '.join(['(%s::bigint, %s::integer)'] * len(batch))
+            cursor.execute(
+                f'UPDATE {table} SET view_count = {table}.view_count + v.views '
+                f'FROM (VALUES {values}) AS v (id, views) '
+                f'WHERE {table}.id = v.id',
+                [value for ad_id in batch for value in (ad_id, counts[ad_id])]
+            )
+
+
+def _update_generic(counts):
+    # Без VALUES объявления с одинаковым приростом обновляются вместе
+    ids_by_views = defaultdict(list)
+    for ad_id, views in counts.items():
+        ids_by_views[views].append(ad_id)
+    for views, ids in ids_by_views.items():
+        Ad.objects.filter(id__in=ids).update(view_count=F('view_count') + views)
+
+
+class ViewCounter:
+    """Накопитель просмотров одного процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._last_flush = time.monotonic()
+        self._timer = None
+
+    def _schedule_flush(self):
+        # Вызывается под self._lock
+        if self._timer is None:
+            self._timer = threading.Timer(
+                settings.VIEW_COUNT_FLUSH_INTERVAL, self._flush_on_timer
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        finally:
+            # У потока таймера свое подключение к базе
+            connection.close()
+
+    def record(self, ad_id):
+        with self._lock:
+            self._pending[ad_id] += 1
+            flush_now = (
+                len(self._pending) >= settings.VIEW_COUNT_MAX_PENDING or
+                time.monotonic() - self._last_flush >= settings.VIEW_COUNT_FLUSH_INTERVAL
+            )
+            if not flush_now:
+                self._schedule_flush()
+        if flush_now:
+            self.flush()
+
+    def flush(self):
+        """Записывает накопленные просмотры, возвращает число объявлений"""
+        with self._lock:
+            counts, self._pending = self._pending, Counter()
+            self._last_flush = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not counts:
+            return 0
+
+        try:
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    _update_postgresql(counts)
+                else:
+                    _update_generic(counts)
+                record_views(counts)
+        except DatabaseError:
+            logger.exception('Не удалось записать просмотры объявлений')
+            # Просмотры вернутся в буфер и запишутся следующей пачкой
+            with self._lock:
+                self._pending.update(counts)
+                self._schedule_flush()
+            return 0
+        return len(counts)
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
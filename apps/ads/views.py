@@ -1,21 +1,56 @@
+import asyncio
+import json
+
+from django.conf import settings
 from django.contrib import messages
 from django.db import transaction
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Q
-from .models import Ad, ExchangeProposal, Category
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.http import (
+    Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotAllowed,
+    JsonResponse, StreamingHttpResponse
+)
+from django.views.decorators.csrf import csrf_exempt
+from .models import (
+    Ad, ArchivedAd, ExchangeProposal, Category, SavedSearch, SavedSearchMatch,
+    SimilarAd
+)
+from .activation import deactivate_ads
+from .autocomplete import get_prefix_index
+from .events import broker, proposal_created, proposal_status_changed
 from .forms import AdForm, ExchangeProposalForm
-
-
+from .geo import (
+    DEFAULT_RADIUS_KM, RADIUS_CHOICES, parse_location, within_radius
+)
+from .http_cache import public_cache
+from .object_cache import get_ad, get_proposal
+from .pagination import CursorPaginator, EstimatedCountPaginator
+from .proposals import accept_proposals, reject_proposals
+from .saved_searches import save_search
+from .search import search_ads
+from .throttling import throttle
+from .trending import trending_ads
+from .view_counter import view_counter
+
+# Сортировки списка объявлений без поискового запроса
+AD_LIST_SORTS = [
+    ('', 'Сначала новые'),
+    ('trending', 'В тренде'),
+]
+# Через сколько миллисекунд браузер переподключается к потоку событий
+SSE_RETRY_MS = 5000
+# Как часто отправлять комментарий в простаивающий поток
+SSE_HEARTBEAT_SECONDS = 15
+
+
+@throttle('ad_create')
 @login_required
 def create_ad(request):
     if request.method == 'POST':
-        form = AdForm(request.POST)
+        form = AdForm(request.POST, instance=Ad(user=request.user))
         if form.is_valid():
-            ad = form.save(commit=False)
-            ad.user = request.user
-            ad.save()
+            ad = form.save()
             return redirect('ad_detail', ad_id=ad.id)
     else:
         form = AdForm()
@@ -27,9 +62,44 @@ def create_ad(request):
     )
 
 
+@public_cache(lambda request, ad_id: [f'ad-{ad_id}'])
 def ad_detail(request, ad_id):
-    ad = get_object_or_404(Ad, id=ad_id)
-    return render(request, 'ads/ad_detail.html', {'ad': ad})
+    ad = get_ad(ad_id)
+    if ad is None:
+        archived_ad = get_object_or_404(ArchivedAd, id=ad_id)
+        return render(
+            request,
+            'ads/ad_detail.html',
+            {'ad': archived_ad, 'similar_ads': []}
+        )
+
+    similar_ads = [
+        entry.similar_ad for entry in
+        SimilarAd.objects
+        .select_related('similar_ad')
+        .filter(ad=ad, similar_ad__is_active=True)
+        [:settings.SIMILAR_ADS_COUNT]
+    ]
+    return render(
+        request,
+        'ads/ad_detail.html',
+        {'ad': ad, 'similar_ads': similar_ads}
+    )
+
+
+# Страница объявления кэшируется nginx, поэтому просмотр отмечает
+# скрипт страницы отдельным запросом
+@csrf_exempt
+@throttle('ad_view')
+def record_ad_view(request, ad_id):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    # Объявление берется из кэша объектов; просмотры несуществующих
+    # и неактивных объявлений не учитываются
+    ad = get_ad(ad_id)
+    if ad is not None and ad.is_active:
+        view_counter.record(ad_id)
+    return HttpResponse(status=204)
 
 
 @login_required
@@ -56,6 +126,7 @@ def edit_ad(request, ad_id):
     )
 
 
+@public_cache(lambda request: ['ads'])
 def ad_list(request):
     query = request.GET.get('q')
 
@@ -65,14 +136,12 @@ def ad_list(request):
     condition = request.GET.get('condition')
     condition_value = dict(Ad.Condition.CHOICES).get(condition)
 
-    ads_query_args = tuple()
+    sort = request.GET.get('sort')
+    if sort not in dict(AD_LIST_SORTS):
+        sort = ''
+
     ads_query_kwargs = {'is_active': True}
 
-    if query:
-        ads_query_args += (
-            Q(title__icontains=query) |
-            Q(description__icontains=query),
-        )
     if category_id:
         ads_query_kwargs['category__id'] = category_id
         category = Category.objects.get(id=category_id)
@@ -80,10 +149,21 @@ def ad_list(request):
         ads_query_kwargs['condition'] = condition
 
     ads = Ad.objects.select_related('user', 'category').filter(
-        *ads_query_args, **ads_query_kwargs
+        **ads_query_kwargs
+    )
+    location = parse_location(request.GET)
+    if location:
+        ads = within_radius(ads, *location)
+    if query:
+        ads = search_ads(ads, query)
+    elif sort == 'trending':
+        ads = trending_ads(ads)
+    elif location:
+        ads = ads.order_by('distance', '-id')
+
+    paginator = EstimatedCountPaginator(
+        ads, 10, base_filter={'is_active': True}
     )
-
-    paginator = Paginator(ads, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -96,11 +176,150 @@ def ad_list(request):
             'current_category': category,
             'current_condition': (condition, condition_value),
             'categories': Category.objects.all(),
-            'conditions': Ad.Condition.CHOICES
+            'conditions': Ad.Condition.CHOICES,
+            'location': location,
+            'radius_choices': RADIUS_CHOICES,
+            'current_radius': location[2] if location else DEFAULT_RADIUS_KM,
+            'sorts': AD_LIST_SORTS,
+            'current_sort': sort,
         }
     )
 
 
+@login_required
+def my_ads(request):
+    def count_by_status(status):
+        return Count(
+            'received_proposals',
+            filter=Q(received_proposals__status=status)
+        )
+
+    latest_proposal = (
+        ExchangeProposal.objects
+        .filter(ad_receiver=OuterRef('pk'))
+        .order_by('-created_at', '-id')
+        .values('id')[:1]
+    )
+    ads = (
+        Ad.objects
+        .select_related('category')
+        .filter(user=request.user)
+        .annotate(
+            waiting_count=count_by_status(ExchangeProposal.Status.WAITING),
+            accepted_count=count_by_status(ExchangeProposal.Status.ACCEPTED),
+            rejected_count=count_by_status(ExchangeProposal.Status.REJECTED),
+            latest_proposal_id=Subquery(latest_proposal),
+        )
+    )
+
+    page_obj = CursorPaginator(ads, 10).get_page(request.GET.get('cursor'))
+
+    latest_proposals = ExchangeProposal.objects.select_related(
+        'ad_sender',
+        'ad_sender__user'
+    ).in_bulk([ad.latest_proposal_id for ad in page_obj if ad.latest_proposal_id])
+    for ad in page_obj:
+        ad.latest_proposal = latest_proposals.get(ad.latest_proposal_id)
+
+    return render(request, 'ads/my_ads.html', {'page_obj': page_obj})
+
+
+@login_required
+def saved_search_list(request):
+    matches = (
+        SavedSearchMatch.objects
+        .select_related('ad', 'ad__category', 'search', 'search__category')
+        .filter(user=request.user, ad__is_active=True)
+    )
+    page_obj = CursorPaginator(matches, 20).get_page(request.GET.get('cursor'))
+
+    return render(
+        request,
+        'ads/saved_searches.html',
+        {
+            'page_obj': page_obj,
+            'saved_searches': (
+                SavedSearch.objects
+                .select_related('category')
+                .filter(user=request.user)
+            ),
+        }
+    )
+
+
+@login_required
+def create_saved_search(request):
+    if request.method != 'POST':
+        return redirect('saved_search_list')
+
+    if request.user.saved_searches.count() >= settings.SAVED_SEARCH_LIMIT:
+        messages.error(
+            request,
+            f'Можно сохранить не больше {settings.SAVED_SEARCH_LIMIT} поисков'
+        )
+        return redirect('saved_search_list')
+
+    category_id = request.POST.get('category')
+    category = (
+        Category.objects.filter(id=category_id).first()
+        if category_id and category_id.isdigit() else None
+    )
+    condition = request.POST.get('condition', '')
+    if condition not in dict(Ad.Condition.CHOICES):
+        condition = ''
+
+    search = save_search(
+        request.user,
+        request.POST.get('q', ''),
+        category,
+        condition
+    )
+    if search is None:
+        messages.error(request, 'Задайте запрос или фильтр для сохранения поиска')
+    else:
+        messages.success(request, f'Поиск сохранен: {search}')
+    return redirect('saved_search_list')
+
+
+@login_required
+def delete_saved_search(request, search_id):
+    if request.method == 'POST':
+        SavedSearch.objects.filter(id=search_id, user=request.user).delete()
+    return redirect('saved_search_list')
+
+
+@login_required
+def ad_lookup(request):
+    scope = request.GET.get('scope')
+    query = request.GET.get('q')
+
+    if scope == 'sender':
+        ads = Ad.objects.filter(user=request.user, is_active=True)
+    elif scope == 'receiver':
+        ads = Ad.objects.filter(is_active=True).exclude(user=request.user)
+    else:
+        return JsonResponse({'error': 'Неизвестный scope'}, status=400)
+
+    if query:
+        ads = ads.filter(title__icontains=query)
+
+    page_obj = CursorPaginator(ads.only('id', 'title', 'created_at'), 20) \
+        .get_page(request.GET.get('cursor'))
+
+    return JsonResponse({
+        'results': [{'id': ad.id, 'text': ad.title} for ad in page_obj],
+        'next_cursor': page_obj.next_cursor,
+    })
+
+
+def autocomplete(request):
+    suggestions = get_prefix_index().suggest(
+        request.GET.get('q', ''),
+        settings.AUTOCOMPLETE_LIMIT
+    )
+    return JsonResponse({'suggestions': suggestions})
+
+
 @login_required
 def delete_ad(request, ad_id):
     ad = get_object_or_404(Ad, id=ad_id)
@@ -119,29 +338,21 @@ def delete_ad(request, ad_id):
     )
 
 
+@throttle('proposal_create')
 @login_required
 def create_proposal(request):
     user_ads = Ad.objects.filter(user=request.user, is_active=True)
 
     if request.method == 'POST':
-        form = ExchangeProposalForm(request.POST)
+        form = ExchangeProposalForm(request.POST, user=request.user)
 
         if form.is_valid():
             proposal = form.save(commit=False)
             proposal.save()
+            proposal_created(proposal)
             return redirect('proposal_detail', proposal_id=proposal.id)
     else:
-        form = ExchangeProposalForm(request.GET) if request.GET\
-            else ExchangeProposalForm()
-        form.fields['ad_sender'].queryset = Ad.objects.filter(
-            user=request.user,
-            is_active=True
-        )
-        form.fields['ad_receiver'].queryset = (
-            Ad.objects
-            .filter(is_active=True)
-            .exclude(user=request.user)
-        )
+        form = ExchangeProposalForm(request.GET or None, user=request.user)
 
     return render(request, 'ads/proposal_form.html', {
         'form': form,
@@ -173,11 +384,11 @@ def exchange_proposal_list(request):
         Q(ad_sender__user=request.user) |
         Q(ad_receiver__user=request.user),
         **proposals_query_kwargs
-    ).order_by('-created_at')
+    )
 
-    paginator = Paginator(proposals, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Во входящих у активного пользователя могут быть тысячи предложений,
+    # курсор выбирает страницу по индексу без COUNT(*) и OFFSET
+    page_obj = CursorPaginator(proposals, 10).get_page(request.GET.get('cursor'))
 
     status_choices = ExchangeProposal.Status.CHOICES
 
@@ -189,17 +400,77 @@ def exchange_proposal_list(request):
     return render(request, 'ads/proposal_list.html', context)
 
 
+@login_required
+def bulk_update_proposals(request):
+    if request.method != 'POST':
+        return redirect('proposal_list')
+
+    actions = {
+        ExchangeProposal.Status.ACCEPTED: (accept_proposals, 'Принято'),
+        ExchangeProposal.Status.REJECTED: (reject_proposals, 'Отклонено'),
+    }
+    action = actions.get(request.POST.get('status'))
+    proposal_ids = [
+        proposal_id for proposal_id in request.POST.getlist('proposal_ids')
+        if proposal_id.isdigit()
+    ]
+    if action is None or not proposal_ids:
+        messages.error(request, 'Выберите предложения и действие')
+        return redirect('proposal_list')
+
+    update, verb = action
+    # Изменить можно только адресованные пользователю предложения
+    updated = update(ExchangeProposal.objects.filter(
+        id__in=proposal_ids,
+        ad_receiver__user=request.user
+    ))
+
+    skipped = len(set(proposal_ids)) - len(updated)
+    message = f'{verb} предложений: {len(updated)}'
+    if skipped:
+        message += f', пропущено: {skipped}'
+    messages.success(request, message)
+    return redirect('proposal_list')
+
+
+async def proposal_events(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden()
+
+    async def stream():
+        queue = broker.subscribe(user.id)
+        try:
+            yield f'retry: {SSE_RETRY_MS}\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(),
+                        SSE_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # Комментарий не дает прокси закрыть простаивающее соединение
+                    yield ': ping\n\n'
+                    continue
+                data = json.dumps({
+                    key: value for key, value in event.items()
+                    if key != 'user_ids'
+                })
+                yield f'event: {event["type"]}\ndata: {data}\n\n'
+        finally:
+            broker.unsubscribe(user.id, queue)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def proposal_detail(request, proposal_id):
-    proposal = get_object_or_404(
-        ExchangeProposal.objects.select_related(
-            'ad_sender',
-            'ad_sender__user',
-            'ad_receiver',
-            'ad_receiver__user'
-        ),
-        id=proposal_id
-    )
+    proposal = get_proposal(proposal_id)
+    if proposal is None:
+        raise Http404
 
     if request.user.id not in [proposal.ad_sender.user_id, proposal.ad_receiver.user_id]:
         return render(request, 'errors/403.html', status=403)
@@ -216,9 +487,12 @@ def proposal_detail(request, proposal_id):
 
 @login_required
 def update_proposal(request, proposal_id):
-    proposal = get_object_or_404(ExchangeProposal, id=proposal_id)
+    proposal = get_object_or_404(
+        ExchangeProposal.objects.select_related('ad_sender', 'ad_receiver'),
+        id=proposal_id
+    )
 
-    if request.user != proposal.ad_receiver.user:
+    if request.user.id != proposal.ad_receiver.user_id:
         return render(request, 'errors/403.html', status=403)
 
     if request.method == 'POST':
@@ -228,12 +502,15 @@ def update_proposal(request, proposal_id):
             with transaction.atomic():
                 proposal.status = new_status
                 proposal.save()
+                proposal_status_changed([(
+                    proposal.id,
+                    new_status,
+                    proposal.ad_sender.user_id,
+                    proposal.ad_receiver.user_id
+                )])
 
                 if new_status == ExchangeProposal.Status.ACCEPTED:
-                    proposal.ad_sender.is_active = False
-                    proposal.ad_receiver.is_active = False
-                    proposal.ad_sender.save()
-                    proposal.ad_receiver.save()
+                    deactivate_ads([proposal.ad_sender_id, proposal.ad_receiver_id])
 
 
                 messages.success(request, 'Статус предложения обновлен')
@@ -0,0 +1,37 @@
+import copy
+
+from django import forms
+from django.urls import reverse_lazy
+
+
+class AdLookupWidget(forms.Select):
+    """
+    Выбор объявления с подгрузкой вариантов по мере ввода.
+
+    В HTML попадает только выбранное объявление, остальные варианты
+    скрипт static/js/ad_lookup.js запрашивает постранично у ad_lookup.
+    """
+
+    def __init__(self, scope, attrs=None):
+        super().__init__(attrs)
+        self.scope = scope
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-lookup-url'] = (
+            f'{reverse_lazy("ad_lookup")}?scope={self.scope}'
+        )
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        selected_ids = [item for item in value if str(item).isdigit()]
+        choices = [('', self.choices.field.empty_label)]
+        if selected_ids:
+            choices += [
+                (ad.pk, str(ad))
+                for ad in self.choices.queryset.filter(pk__in=selected_ids)
+            ]
+
+        widget = copy.copy(self)
+        widget.choices = choices
+        return super(AdLookupWidget, widget).optgroups(name, value, attrs)
@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from .models import SlowQuery
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'view', 'duration', 'fingerprint', 'created_at')
+    list_filter = ('view',)
+    search_fields = ('fingerprint',)
+    readonly_fields = (
+        'fingerprint', 'view', 'sql', 'params', 'duration', 'plan', 'created_at'
+    )
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class MetricsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.metrics'
+
+    def ready(self):
+        from . import collectors
+        from .registry import registry
+
+        registry.register_collector(collectors.object_cache)
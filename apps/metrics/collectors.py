@@ -0,0 +1,21 @@
+from apps.ads.object_cache import stats as object_cache_stats
+
+from .registry import COUNTER
+
+
+def object_cache():
+    """Попадания и промахи кэша объектов объявлений и предложений"""
+    samples = []
+    for name, value in list(object_cache_stats.items()):
+        kind, result = name.split(':')
+        samples.append((
+            'object_cache_requests_total',
+            {'kind': kind, 'result': result},
+            value
+        ))
+    yield (
+        'object_cache_requests_total',
+        COUNTER,
+        'Обращения к кэшу объектов (result: hit или miss)',
+        samples
+    )
@@ -0,0 +1,369 @@
+"""
+Генератор нагрузки для стенда docker-compose (nginx → gunicorn → postgres).
+
+Работает только на стандартной библиотеке: каждый виртуальный
+пользователь — корутина asyncio со своим keep-alive соединением
+и cookie. Пользователь входит через accounts/login, листает ad_list
+со случайными фильтрами, открывает объявления, создает предложения
+обмена и принимает адресованные ему. Пользователей и объявления
+создает команда seed_load_data.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+# Слова для поиска; seed_load_data строит из них заголовки объявлений
+WORDS = (
+    'велосипед', 'книга', 'телефон', 'ноутбук', 'куртка', 'гитара',
+    'стол', 'стул', 'лампа', 'часы', 'рюкзак', 'палатка', 'самокат',
+    'монитор', 'кресло', 'чайник', 'коляска', 'лыжи', 'шахматы', 'камера',
+)
+CONDITIONS = ('new', 'like_new', 'used_good', 'used_fair', 'used_poor')
+
+# Вес действий виртуального пользователя
+ACTIONS = (
+    ('browse', 5),
+    ('detail', 3),
+    ('propose', 1),
+    ('accept', 1),
+)
+
+REQUEST_TIMEOUT = 30
+
+_AD_LINK_RE = re.compile(r'href="/(\d+)/"')
+_CATEGORY_SELECT_RE = re.compile(r'<select name="category">(.*?)</select>', re.S)
+_CATEGORY_RE = re.compile(r'<option value="(\d+)"')
+_PROPOSAL_LINK_RE = re.compile(r'href="/proposals/(\d+)/"')
+
+
+class HttpClient:
+    """Минимальный клиент HTTP/1.1 с keep-alive и cookie"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.host_header = parts.netloc
+        self.cookies = {}
+        self._reader = None
+        self._writer = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port
+        )
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    def _store_cookie(self, header):
+        pair, *attributes = header.split(';')
+        name, _, value = pair.strip().partition('=')
+        attributes = [attribute.strip().lower() for attribute in attributes]
+        if not value or 'max-age=0' in attributes:
+            self.cookies.pop(name, None)
+        else:
+            self.cookies[name] = value
+
+    async def _read_body(self, headers):
+        reader = self._reader
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Завершающие заголовки не используются
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return b''.join(chunks)
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+        if 'content-length' in headers:
+            return await reader.readexactly(int(headers['content-length']))
+        body = await reader.read()
+        self.close()
+        return body
+
+    async def _exchange(self, request):
+        self._writer.write(request)
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Соединение закрыто сервером')
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            if name == 'set-cookie':
+                self._store_cookie(value.strip())
+            else:
+                headers[name] = value.strip()
+
+        body = await self._read_body(headers)
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, headers, body
+
+    async def request(self, method, path, form=None):
+        """Возвращает (статус, заголовки, тело)"""
+        body = urlencode(form).encode() if form is not None else b''
+        lines = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self.host_header}',
+            'Connection: keep-alive',
+            'Accept-Encoding: identity',
+        ]
+        if self.cookies:
+            lines.append('Cookie: ' + '; '.join(
+                f'{name}={value}' for name, value in self.cookies.items()
+            ))
+        if form is not None:
+            lines.append('Content-Type: application/x-www-form-urlencoded')
+            lines.append(f'Content-Length: {len(body)}')
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+
+        reused = self._writer is not None
+        if not reused:
+            await self._connect()
+        try:
+            return await self._exchange(request)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            if not reused:
+                raise
+        # Сервер закрыл простаивавшее соединение — повторяем на новом
+        await self._connect()
+        return await self._exchange(request)
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу для отсортированного списка"""
+    if not values:
+        return 0
+    rank = max(1, round(percent / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+class LoadTestStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    def record(self, endpoint, latency, status):
+        """status — код ответа или None при ошибке соединения"""
+        self.latencies[endpoint].append(latency)
+        self.statuses[endpoint][status or 'error'] += 1
+        if status is None or (status >= 400 and status != 429):
+            self.errors[endpoint] += 1
+
+    def rows(self):
+        """Строки отчета по каждому эндпоинту"""
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        result = []
+        for endpoint in sorted(self.latencies):
+            latencies = sorted(self.latencies[endpoint])
+            count = len(latencies)
+            result.append({
+                'endpoint': endpoint,
+                'requests': count,
+                'rps': count / elapsed if elapsed else 0,
+                'error_rate': self.errors[endpoint] / count,
+                'throttled': self.statuses[endpoint][429],
+                'p50': percentile(latencies, 50),
+                'p90': percentile(latencies, 90),
+                'p99': percentile(latencies, 99),
+                'max': latencies[-1],
+                'statuses': dict(self.statuses[endpoint]),
+            })
+        return result
+
+    def report(self):
+        lines = [
+            f'{"эндпоинт":<18}{"запросов":>9}{"rps":>8}{"ошибки":>8}'
+            f'{"429":>6}{"p50 мс":>9}{"p90 мс":>9}{"p99 мс":>9}{"max мс":>9}'
+        ]
+        for row in self.rows():
+            lines.append(
+                f'{row["endpoint"]:<18}{row["requests"]:>9}{row["rps"]:>8.1f}'
+                f'{row["error_rate"]:>8.1%}{row["throttled"]:>6}'
+                f'{row["p50"] * 1000:>9.0f}{row["p90"] * 1000:>9.0f}'
+                f'{row["p99"] * 1000:>9.0f}{row["max"] * 1000:>9.0f}'
+            )
+        total = sum(len(values) for values in self.latencies.values())
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        lines.append(
+            f'Всего запросов: {total}, {total / elapsed:.1f} в секунду '
+            f'за {elapsed:.1f} с'
+        )
+        return '\n'.join(lines)
+
+
+class VirtualUser:
+    def __init__(self, username, password, base_url, stats, rng, think_time):
+        self.username = username
+        self.password = password
+        self.client = HttpClient(base_url)
+        self.stats = stats
+        self.rng = rng
+        self.think_time = think_time
+        self.ad_ids = []
+        self.category_ids = []
+
+    async def call(self, endpoint, method, path, form=None):
+        start = time.monotonic()
+        try:
+            status, headers, body = await asyncio.wait_for(
+                self.client.request(method, path, form),
+                REQUEST_TIMEOUT
+            )
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            self.client.close()
+            self.stats.record(endpoint, time.monotonic() - start, None)
+            return None, b''
+        self.stats.record(endpoint, time.monotonic() - start, status)
+        return status, body
+
+    async def post(self, endpoint, path, form):
+        form = {**form, 'csrfmiddlewaretoken': self.client.cookies.get('csrftoken', '')}
+        return await self.call(endpoint, 'POST', path, form)
+
+    async def login(self):
+        await self.call('login_page', 'GET', '/accounts/login/')
+        status, _ = await self.post('login', '/accounts/login/', {
+            'username': self.username,
+            'password': self.password,
+        })
+        return status == 302
+
+    async def browse(self):
+        params = {}
+        filter_kind = self.rng.choice(('none', 'q', 'category', 'condition', 'page'))
+        if filter_kind == 'q':
+            params['q'] = self.rng.choice(WORDS)
+        elif filter_kind == 'category' and self.category_ids:
+            params['category'] = self.rng.choice(self.category_ids)
+        elif filter_kind == 'condition':
+            params['condition'] = self.rng.choice(CONDITIONS)
+        elif filter_kind == 'page':
+            params['page'] = self.rng.randint(1, 20)
+
+        path = '/?' + urlencode(params) if params else '/'
+        status, body = await self.call('ad_list', 'GET', path)
+        if status == 200:
+            text = body.decode('utf-8', 'replace')
+            self.ad_ids = _AD_LINK_RE.findall(text) or self.ad_ids
+            select = _CATEGORY_SELECT_RE.search(text)
+            if select:
+                self.category_ids = (
+                    _CATEGORY_RE.findall(select.group(1)) or self.category_ids
+                )
+
+    async def detail(self):
+        if not self.ad_ids:
+            return await self.browse()
+        await self.call('ad_detail', 'GET', f'/{self.rng.choice(self.ad_ids)}/')
+
+    async def _lookup(self, scope):
+        params = {'scope': scope}
+        if scope == 'receiver':
+            params['q'] = self.rng.choice(WORDS)
+        status, body = await self.call('ad_lookup', 'GET', '/lookup/?' + urlencode(params))
+        if status != 200:
+            return None
+        results = json.loads(body)['results']
+        return self.rng.choice(results)['id'] if results else None
+
+    async def propose(self):
+        sender = await self._lookup('sender')
+        receiver = await self._lookup('receiver')
+        if sender is None or receiver is None:
+            return
+        await self.post('proposal_create', '/create_proposal/', {
+            'ad_sender': sender,
+            'ad_receiver': receiver,
+            'comment': 'Нагрузочный тест',
+        })
+
+    async def accept(self):
+        query = urlencode({'status': 'waiting', 'receiver': self.username})
+        status, body = await self.call('proposal_list', 'GET', f'/proposals/?{query}')
+        if status != 200:
+            return
+        proposal_ids = _PROPOSAL_LINK_RE.findall(body.decode('utf-8', 'replace'))
+        if proposal_ids:
+            await self.post(
+                'proposal_accept',
+                f'/proposals/{self.rng.choice(proposal_ids)}/update/',
+                {'status': 'accepted'}
+            )
+
+    async def run(self, deadline):
+        try:
+            if self.username is None:
+                # Анонимный посетитель только смотрит объявления
+                actions = [action for action in ACTIONS
+                           if action[0] in ('browse', 'detail')]
+            elif await self.login():
+                actions = ACTIONS
+            else:
+                return
+            names, weights = zip(*actions)
+            while time.monotonic() < deadline:
+                action = self.rng.choices(names, weights)[0]
+                await getattr(self, action)()
+                if self.think_time:
+                    await asyncio.sleep(self.rng.uniform(0, 2 * self.think_time))
+        finally:
+            self.client.close()
+
+
+async def _run(base_url, users, duration, ramp_up, think_time, password,
+               user_prefix, seed, anonymous):
+    stats = LoadTestStats()
+    deadline = time.monotonic() + duration
+    registered = users - round(users * anonymous)
+
+    async def start_user(index):
+        await asyncio.sleep(ramp_up * index / users)
+        user = VirtualUser(
+            f'{user_prefix}{index}' if index < registered else None,
+            password,
+            base_url,
+            stats,
+            random.Random(seed + index),
+            think_time
+        )
+        await user.run(deadline)
+
+    await asyncio.gather(*(start_user(index) for index in range(users)))
+    stats.finished_at = time.monotonic()
+    return stats
+
+
+def run_load_test(base_url, users=10, duration=60, ramp_up=10, think_time=0.5,
+                  password='loadtest-password', user_prefix='loaduser', seed=0,
+                  anonymous=0.0):
+    """
+    Запускает нагрузку и возвращает LoadTestStats.
+
+    anonymous — доля виртуальных пользователей без входа в систему.
+    """
+    return asyncio.run(_run(
+        base_url, users, duration, ramp_up, think_time, password,
+        user_prefix, seed, anonymous
+    ))
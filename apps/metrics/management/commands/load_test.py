@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+
+from apps.metrics.loadtest import run_load_test
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест стенда: виртуальные пользователи входят, '
+        'смотрят объявления, создают и принимают предложения обмена'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url',
+            default='http://localhost',
+            help='Адрес стенда (nginx)',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=10,
+            help='Число виртуальных пользователей',
+        )
+        parser.add_argument(
+            '--anonymous',
+            type=float,
+            default=0.0,
+            help='Доля пользователей без входа в систему',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=60,
+            help='Длительность теста в секундах',
+        )
+        parser.add_argument(
+            '--ramp-up',
+            type=float,
+            default=10,
+            help='За сколько секунд запускаются все пользователи',
+        )
+        parser.add_argument(
+            '--think-time',
+            type=float,
+            default=0.5,
+            help='Средняя пауза между действиями пользователя в секундах',
+        )
+        parser.add_argument(
+            '--user-prefix',
+            default='loaduser',
+            help='Префикс имен пользователей из seed_load_data',
+        )
+        parser.add_argument(
+            '--password',
+            default='loadtest-password',
+            help='Пароль пользователей из seed_load_data',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Начальное значение генератора случайных чисел',
+        )
+
+    def handle(self, *args, **options):
+        stats = run_load_test(
+            options['base_url'],
+            users=options['users'],
+            duration=options['duration'],
+            ramp_up=options['ramp_up'],
+            think_time=options['think_time'],
+            password=options['password'],
+            user_prefix=options['user_prefix'],
+            seed=options['seed'],
+            anonymous=options['anonymous'],
+        )
+        self.stdout.write(stats.report())
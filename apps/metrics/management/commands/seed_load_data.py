@@ -0,0 +1,90 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.ads.models import Ad, Category
+from apps.metrics.loadtest import CONDITIONS, WORDS
+
+CATEGORIES = (
+    'Электроника', 'Одежда', 'Спорт', 'Дом и сад', 'Книги', 'Детские товары',
+)
+
+
+class Command(BaseCommand):
+    help = 'Создает пользователей и объявления для нагрузочного теста'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=50,
+            help='Число пользователей',
+        )
+        parser.add_argument(
+            '--ads-per-user',
+            type=int,
+            default=20,
+            help='Сколько активных объявлений должно быть у пользователя',
+        )
+        parser.add_argument(
+            '--user-prefix',
+            default='loaduser',
+            help='Префикс имен пользователей',
+        )
+        parser.add_argument(
+            '--password',
+            default='loadtest-password',
+            help='Пароль пользователей',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Начальное значение генератора случайных чисел',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        password = make_password(options['password'])
+
+        with transaction.atomic():
+            categories = [
+                Category.objects.get_or_create(name=name)[0]
+                for name in CATEGORIES
+            ]
+            usernames = [
+                f'{options["user_prefix"]}{index}'
+                for index in range(options['users'])
+            ]
+            existing = set(
+                User.objects
+                .filter(username__in=usernames)
+                .values_list('username', flat=True)
+            )
+            User.objects.bulk_create([
+                User(username=username, password=password)
+                for username in usernames
+                if username not in existing
+            ])
+            User.objects.filter(username__in=existing).update(password=password)
+
+            ads = []
+            for user in User.objects.filter(username__in=usernames):
+                missing = options['ads_per_user'] - user.ads.filter(is_active=True).count()
+                for _ in range(max(missing, 0)):
+                    word = rng.choice(WORDS)
+                    ads.append(Ad(
+                        user=user,
+                        title=f'{word.capitalize()} №{rng.randint(1, 10 ** 6)}',
+                        description=' '.join(rng.choices(WORDS, k=12)),
+                        category=rng.choice(categories),
+                        condition=rng.choice(CONDITIONS),
+                    ))
+            Ad.objects.bulk_create(ads, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(usernames)}, создано объявлений: {len(ads)}'
+        ))
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Sum
+from django.utils import timezone
+
+from apps.metrics.models import SlowQuery
+
+
+class Command(BaseCommand):
+    help = 'Отчет по медленным SQL-запросам, сгруппированным по отпечатку'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='За сколько последних дней строить отчет',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Сколько групп вывести',
+        )
+        parser.add_argument(
+            '--view',
+            help='Только запросы указанного представления',
+        )
+        parser.add_argument(
+            '--plans',
+            action='store_true',
+            help='Выводить последний сохраненный план запроса',
+        )
+
+    def handle(self, *args, **options):
+        queries = SlowQuery.objects.filter(
+            created_at__gte=timezone.now() - timedelta(days=options['days'])
+        )
+        if options['view']:
+            queries = queries.filter(view=options['view'])
+
+        groups = list(
+            queries
+            .values('fingerprint')
+            .annotate(
+                count=Count('id'),
+                total=Sum('duration'),
+                average=Avg('duration'),
+                maximum=Max('duration'),
+            )
+            .order_by('-total')
+            [:options['limit']]
+        )
+        if not groups:
+            self.stdout.write('Медленных запросов нет')
+            return
+
+        for group in groups:
+            group_queries = queries.filter(fingerprint=group['fingerprint'])
+            latest = group_queries.latest('created_at')
+            views = group_queries.values_list('view', flat=True).distinct()
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{group["fingerprint"][:12]}  запросов: {group["count"]}, '
+                f'всего: {group["total"]:.3f} с, '
+                f'среднее: {group["average"]:.3f} с, '
+                f'максимум: {group["maximum"]:.3f} с'
+            ))
+            self.stdout.write(f'Представления: {", ".join(sorted(views))}')
+            self.stdout.write(f'SQL: {latest.sql}')
+            self.stdout.write(f'Параметры: {latest.params}')
+            if options['plans']:
+                plan = (
+                    group_queries
+                    .exclude(plan='')
+                    .order_by('-created_at')
+                    .values_list('plan', flat=True)
+                    .first()
+                )
+                if plan:
+                    self.stdout.write(plan)
+            self.stdout.write('')
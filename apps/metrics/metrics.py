@@ -0,0 +1,30 @@
+from .registry import Counter, Gauge, Histogram
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Время обработки запроса',
+    ('view', 'method')
+)
+REQUESTS = Counter(
+    'http_requests_total',
+    'Обработанные запросы',
+    ('view', 'method', 'status')
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight',
+    'Запросы, которые обрабатываются сейчас'
+)
+BUSY_SECONDS = Counter(
+    'worker_busy_seconds_total',
+    'Суммарное время, когда воркер был занят запросами'
+)
+DB_QUERIES = Counter(
+    'db_queries_total',
+    'SQL-запросы',
+    ('view',)
+)
+DB_QUERY_SECONDS = Counter(
+    'db_query_duration_seconds_total',
+    'Суммарное время SQL-запросов',
+    ('view',)
+)
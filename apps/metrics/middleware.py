@@ -0,0 +1,80 @@
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from . import metrics
+from .registry import registry
+from .slow_queries import record_slow_queries
+from .tracing import SQL_LIMIT, start_trace
+
+
+class QueryObserver:
+    """Обертка execute_wrapper, считающая SQL-запросы одного запроса"""
+
+    def __init__(self, trace=None):
+        self.trace = trace
+        self.count = 0
+        self.duration = 0
+        # Запросы дольше SLOW_QUERY_THRESHOLD: (sql, params, many, duration)
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if self.trace is not None:
+                self.trace.add_span('sql', start, duration, sql=sql[:SQL_LIMIT])
+            threshold = settings.SLOW_QUERY_THRESHOLD
+            if threshold is not None and duration >= threshold:
+                self.slow.append((sql, params, many, duration))
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else '<unresolved>'
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики запроса: время по имени URL, число и время
+    SQL-запросов, занятость воркера, а также записывает медленные
+    запросы. Должен стоять первым в MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        trace = start_trace(request)
+        observer = QueryObserver(trace)
+        start = time.perf_counter()
+        status = 500
+        try:
+            with connection.execute_wrapper(observer):
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            duration = time.perf_counter() - start
+            view = view_name(request)
+            metrics.REQUESTS_IN_FLIGHT.dec()
+            metrics.BUSY_SECONDS.inc(duration)
+            metrics.REQUEST_DURATION.observe(
+                duration,
+                view=view,
+                method=request.method
+            )
+            metrics.REQUESTS.inc(view=view, method=request.method, status=status)
+            metrics.DB_QUERIES.inc(observer.count, view=view)
+            metrics.DB_QUERY_SECONDS.inc(observer.duration, view=view)
+            if observer.slow:
+                record_slow_queries(view, observer.slow)
+            if trace is not None:
+                trace.finish(view, status)
+            registry.maybe_dump()
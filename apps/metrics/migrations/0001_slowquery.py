@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('fingerprint', models.CharField(max_length=40, verbose_name='Отпечаток')),
+                ('view', models.CharField(max_length=200, verbose_name='Представление')),
+                ('sql', models.TextField(verbose_name='Нормализованный SQL')),
+                ('params', models.JSONField(default=list, verbose_name='Параметры')),
+                ('duration', models.FloatField(verbose_name='Длительность, с')),
+                ('plan', models.TextField(blank=True, verbose_name='План запроса')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'indexes': [models.Index(fields=['fingerprint', '-created_at'], name='metrics_slo_fingerp_722cfa_idx'), models.Index(fields=['-created_at'], name='metrics_slo_created_a393df_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from db.model_mixins import CreatedAtMixin
+
+
+class SlowQuery(CreatedAtMixin):
+    """Модель медленного SQL-запроса"""
+
+    fingerprint = models.CharField(_('Отпечаток'), max_length=40)
+    view = models.CharField(_('Представление'), max_length=200)
+    sql = models.TextField(_('Нормализованный SQL'))
+    params = models.JSONField(_('Параметры'), default=list)
+    duration = models.FloatField(_('Длительность, с'))
+    plan = models.TextField(_('План запроса'), blank=True)
+
+    class Meta:
+        verbose_name = _('Медленный запрос')
+        verbose_name_plural = _('Медленные запросы')
+        indexes = [
+            models.Index(fields=['fingerprint', '-created_at']),
+            models.Index(fields=['-created_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.view}: {self.duration:.3f} с'
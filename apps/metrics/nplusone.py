@@ -0,0 +1,151 @@
+"""
+Поиск N+1 запросов в тестах.
+
+Детектор записывает SQL-запросы, выполненные во время запроса
+тестового клиента, и группирует их по отпечатку (см. slow_queries)
+и месту вызова. Если один и тот же SELECT с разными параметрами
+выполнен из одного места NPLUSONE_THRESHOLD и более раз, это похоже
+на ленивую загрузку связанных объектов в цикле, например
+{{ ad.category.name }} в шаблоне без select_related. Место вызова —
+строка шаблона, если запрос выполнен при его отрисовке, иначе первая
+строка кода проекта в стеке.
+"""
+import os
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+
+from .slow_queries import fingerprint, normalize_params, normalize_sql
+
+# С какого числа похожих запросов из одного места считать их N+1
+NPLUSONE_THRESHOLD = 3
+
+_PROJECT_DIR = os.path.realpath(str(settings.BASE_DIR))
+_THIS_FILE = os.path.realpath(__file__)
+_PACKAGE_DIRS = tuple(
+    os.path.realpath(path) for path in sys.path
+    if 'site-packages' in path or 'dist-packages' in path
+)
+
+
+def _template_location(frame):
+    node = frame.f_locals.get('self')
+    token = getattr(node, 'token', None)
+    origin = getattr(node, 'origin', None)
+    if token is None or origin is None:
+        return None
+    return f'{origin.template_name or origin.name}:{token.lineno}'
+
+
+def _is_project_file(path):
+    path = os.path.realpath(path)
+    return (
+        path.startswith(_PROJECT_DIR) and
+        path != _THIS_FILE and
+        not path.startswith(_PACKAGE_DIRS)
+    )
+
+
+def query_location(frame):
+    """
+    Строка шаблона, отрисовка которой выполнила запрос, или первая
+    строка кода проекта в стеке.
+    """
+    code_location = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == 'render_annotated':
+            location = _template_location(frame)
+            if location is not None:
+                return location
+        if code_location is None and _is_project_file(code.co_filename):
+            path = os.path.relpath(code.co_filename, _PROJECT_DIR)
+            code_location = f'{path}:{frame.f_lineno}'
+        frame = frame.f_back
+    return code_location or '<unknown>'
+
+
+class NPlusOne:
+    """Найденная группа похожих запросов"""
+
+    def __init__(self, location, sql, count):
+        self.location = location
+        self.sql = sql
+        self.count = count
+
+    def __str__(self):
+        return f'{self.location}: {self.count} похожих запросов: {self.sql}'
+
+
+class NPlusOneDetector:
+    """
+    Контекстный менеджер, собирающий запросы всех подключений к базе.
+    После выхода в problems лежат найденные N+1.
+    """
+
+    def __init__(self, threshold=NPLUSONE_THRESHOLD):
+        self.threshold = threshold
+        self.problems = []
+        self._queries = defaultdict(list)
+        self._wrappers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            key = (fingerprint(sql), query_location(sys._getframe(1)))
+            self._queries[key].append((sql, repr(normalize_params(params))))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        for connection in connections.all():
+            wrapper = connection.execute_wrapper(self)
+            wrapper.__enter__()
+            self._wrappers.append(wrapper)
+        return self
+
+    def __exit__(self, *exc_info):
+        while self._wrappers:
+            self._wrappers.pop().__exit__(*exc_info)
+        self.problems = self._find_problems()
+
+    def _find_problems(self):
+        problems = []
+        for (_, location), queries in self._queries.items():
+            # Одинаковые запросы — это дубли, а не N+1 по разным объектам
+            distinct_params = {params for _, params in queries}
+            if len(queries) >= self.threshold and len(distinct_params) > 1:
+                problems.append(
+                    NPlusOne(location, normalize_sql(queries[0][0]), len(queries))
+                )
+        return problems
+
+    def report(self):
+        return '\n'.join(str(problem) for problem in self.problems)
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+class NPlusOneClient(Client):
+    """
+    Тестовый клиент, проверяющий каждый запрос на N+1. Проверку можно
+    отключить для отдельного теста: client.detect_nplusone = False.
+    """
+
+    detect_nplusone = True
+    nplusone_threshold = NPLUSONE_THRESHOLD
+
+    def request(self, **request):
+        if not self.detect_nplusone:
+            return super().request(**request)
+
+        with NPlusOneDetector(self.nplusone_threshold) as detector:
+            response = super().request(**request)
+        if detector.problems:
+            raise NPlusOneError(
+                f'N+1 запросы в {request.get("PATH_INFO")}:\n{detector.report()}'
+            )
+        return response
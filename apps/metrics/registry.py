@@ -0,0 +1,229 @@
+"""
+Метрики процесса в формате Prometheus.
+
+Каждый воркер gunicorn считает метрики у себя и, если задан
+METRICS_DIR, периодически сохраняет снимок в METRICS_DIR/<pid>.json.
+Эндпоинт метрик суммирует снимки всех воркеров. Счетчики и гистограммы
+умерших воркеров учитываются всегда, а gauge — только из свежих снимков.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return dict(zip(self.labelnames, key))
+
+    def samples(self):
+        """Список (имя, метки, значение)"""
+        with self._lock:
+            return [
+                (self.name, self._labels(key), value)
+                for key, value in self._values.items()
+            ]
+
+
+class Counter(Metric):
+    type = COUNTER
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = GAUGE
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = HISTOGRAM
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Счетчики корзин, затем сумма и количество наблюдений
+                state = self._values[key] = [0] * (len(self.buckets) + 3)
+            state[bisect_left(self.buckets, value)] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        result = []
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                result.append((
+                    f'{self.name}_bucket',
+                    {**labels, 'le': _format_value(bound)},
+                    cumulative
+                ))
+            result.append((f'{self.name}_sum', labels, state[-2]))
+            result.append((f'{self.name}_count', labels, state[-1]))
+        return result
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._last_dump = 0
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def register_collector(self, collector):
+        """
+        collector() возвращает список (имя, тип, описание, сэмплы)
+        для значений, которые считаются вне реестра.
+        """
+        self._collectors.append(collector)
+
+    def families(self):
+        """Метрики процесса: {имя: {'type', 'help', 'samples'}}"""
+        result = {
+            metric.name: {
+                'type': metric.type,
+                'help': metric.documentation,
+                'samples': metric.samples(),
+            }
+            for metric in self._metrics
+        }
+        for collector in self._collectors:
+            for name, metric_type, documentation, samples in collector():
+                result[name] = {
+                    'type': metric_type,
+                    'help': documentation,
+                    'samples': list(samples),
+                }
+        return result
+
+    def dump(self):
+        """Сохраняет снимок метрик процесса в METRICS_DIR"""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.families(), file)
+        os.replace(temp_path, path)
+        self._last_dump = time.monotonic()
+
+    def maybe_dump(self):
+        if time.monotonic() - self._last_dump >= settings.METRICS_SNAPSHOT_INTERVAL:
+            self.dump()
+
+    def _snapshots(self):
+        directory = settings.METRICS_DIR
+        if not directory:
+            yield self.families(), True
+            return
+
+        self.dump()
+        max_age = settings.METRICS_SNAPSHOT_INTERVAL * 3
+        now = time.time()
+        for file_name in os.listdir(directory):
+            if not file_name.endswith('.json'):
+                continue
+            path = os.path.join(directory, file_name)
+            try:
+                with open(path) as file:
+                    families = json.load(file)
+                fresh = now - os.path.getmtime(path) <= max_age
+            except (OSError, ValueError):
+                continue
+            yield families, fresh
+
+    def collect(self):
+        """Метрики всех воркеров, просуммированные по меткам"""
+        merged = {}
+        for families, fresh in self._snapshots():
+            for name, family in families.items():
+                if family['type'] == GAUGE and not fresh:
+                    continue
+                target = merged.setdefault(name, {
+                    'type': family['type'],
+                    'help': family['help'],
+                    'samples': {},
+                })
+                for sample_name, labels, value in family['samples']:
+                    key = (sample_name, tuple(sorted(labels.items())))
+                    target['samples'][key] = target['samples'].get(key, 0) + value
+        return merged
+
+    def render(self):
+        """Текстовый формат Prometheus"""
+        lines = []
+        for name, family in sorted(self.collect().items()):
+            lines.append(f'# HELP {name} {family["help"]}')
+            lines.append(f'# TYPE {name} {family["type"]}')
+            for (sample_name, labels), value in family['samples'].items():
+                label_text = ','.join(
+                    f'{label}="{_escape(label_value)}"'
+                    for label, label_value in labels
+                )
+                if label_text:
+                    sample_name = f'{sample_name}{{{label_text}}}'
+                lines.append(f'{sample_name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,122 @@
+"""
+Запись SQL-запросов дольше SLOW_QUERY_THRESHOLD секунд.
+
+Запросы с одинаковой структурой получают один отпечаток: литералы
+и плейсхолдеры заменяются на ?, списки IN сворачиваются. Для доли
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE медленных SELECT в PostgreSQL
+сохраняется план: EXPLAIN (ANALYZE, BUFFERS) для простого чтения из
+таблиц и EXPLAIN без выполнения для SELECT ... FOR UPDATE и вызовов
+функций вроде SELECT pg_notify(...), которые нельзя выполнять повторно.
+"""
+import hashlib
+import logging
+import random
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+# Сколько символов строкового параметра сохранять
+PARAM_LIMIT = 100
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+_FROM_RE = re.compile(r'\bFROM\b', re.IGNORECASE)
+_LOCKING_RE = re.compile(
+    r'\bFOR\s+(?:NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b',
+    re.IGNORECASE
+)
+
+
+def normalize_sql(sql):
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    """Отпечаток нормализованного SQL"""
+    return hashlib.sha1(normalize_sql(sql).encode()).hexdigest()
+
+
+def normalize_params(params):
+    """Параметры запроса в виде, пригодном для JSON"""
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        return {key: _normalize_param(value) for key, value in params.items()}
+    return [_normalize_param(value) for value in params]
+
+
+def _normalize_param(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_normalize_param(item) for item in value]
+    return str(value)[:PARAM_LIMIT]
+
+
+def is_plain_read(sql):
+    """SELECT из таблиц без блокировки строк, который безопасно выполнить повторно"""
+    sql = _STRING_RE.sub('?', sql)
+    return (
+        sql.lstrip().upper().startswith('SELECT') and
+        _FROM_RE.search(sql) is not None and
+        _LOCKING_RE.search(sql) is None
+    )
+
+
+def capture_plan(sql, params):
+    """План SELECT в PostgreSQL или ''"""
+    if connection.vendor != 'postgresql':
+        return ''
+    if not sql.lstrip().upper().startswith('SELECT'):
+        # Изменяющие запросы не трогаем
+        return ''
+
+    analyze = is_plain_read(sql)
+    options = 'ANALYZE, BUFFERS' if analyze else 'COSTS'
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            if analyze:
+                # ANALYZE выполняет запрос; функции с побочными эффектами
+                # в транзакции только для чтения завершатся ошибкой
+                cursor.execute('SET LOCAL transaction_read_only = on')
+            cursor.execute(f'EXPLAIN ({options}) {sql}', params)
+            plan = '\n'.join(line for line, in cursor.fetchall())
+            # Откат снимает transaction_read_only и все, что сделал запрос
+            transaction.set_rollback(True)
+            return plan
+    except DatabaseError as error:
+        logger.warning('Не удалось получить план запроса: %s', error)
+        return ''
+
+
+def record_slow_queries(view, queries):
+    """queries — список (sql, params, many, duration)"""
+    entries = []
+    for sql, params, many, duration in queries:
+        plan = ''
+        if not many and random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+            plan = capture_plan(sql, params)
+        entries.append(SlowQuery(
+            fingerprint=fingerprint(sql),
+            view=view,
+            sql=normalize_sql(sql),
+            params=normalize_params(params) if not many else [],
+            duration=duration,
+            plan=plan,
+        ))
+    try:
+        SlowQuery.objects.bulk_create(entries)
+    except DatabaseError as error:
+        logger.warning('Не удалось сохранить медленные запросы: %s', error)
@@ -0,0 +1,315 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from apps.ads import object_cache
+from apps.ads.models import Ad, Category
+from apps.metrics import metrics
+from apps.metrics.loadtest import HttpClient, percentile, run_load_test
+from apps.metrics.models import SlowQuery
+from apps.metrics.nplusone import NPlusOneClient
+from apps.metrics.registry import Counter, Gauge, Histogram, Registry, registry
+from apps.metrics.slow_queries import (
+    fingerprint, is_plain_read, normalize_params, normalize_sql
+)
+
+
+class RegistryTest(TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def _metric(self, metric_class, *args, **kwargs):
+        metric = metric_class(*args, **kwargs)
+        self.registry.register(metric)
+        return metric
+
+    def test_counter_render(self):
+        """Тест вывода счетчика с метками"""
+        counter = self._metric(Counter, 'test_total', 'Тест', ('kind',))
+        counter.inc(kind='a')
+        counter.inc(2, kind='a')
+
+        text = self.registry.render()
+        self.assertIn('# TYPE test_total counter', text)
+        self.assertIn('test_total{kind="a"} 3', text)
+
+    def test_histogram_buckets(self):
+        """Тест накопительных корзин гистограммы"""
+        histogram = self._metric(
+            Histogram, 'test_seconds', 'Тест', buckets=(0.1, 1.0)
+        )
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        text = self.registry.render()
+        self.assertIn('test_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn('test_seconds_count 3', text)
+
+    def test_snapshots_merged(self):
+        """Тест суммирования снимков нескольких воркеров"""
+        counter = self._metric(Counter, 'test_total', 'Тест')
+        gauge = self._metric(Gauge, 'test_in_flight', 'Тест')
+        counter.inc(2)
+        gauge.inc()
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            stale_path = os.path.join(directory, '1.json')
+            with open(stale_path, 'w') as file:
+                json.dump({
+                    'test_total': {
+                        'type': 'counter',
+                        'help': 'Тест',
+                        'samples': [['test_total', {}, 5]],
+                    },
+                    'test_in_flight': {
+                        'type': 'gauge',
+                        'help': 'Тест',
+                        'samples': [['test_in_flight', {}, 7]],
+                    },
+                }, file)
+            os.utime(stale_path, (0, 0))
+
+            text = self.registry.render()
+
+        # Счетчик умершего воркера учитывается, его gauge — нет
+        self.assertIn('test_total 7', text)
+        self.assertIn('test_in_flight 1', text)
+
+
+class MetricsMiddlewareTest(TestCase):
+    client_class = NPlusOneClient
+
+    def setUp(self):
+        cache.clear()
+        object_cache.stats.clear()
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.ad = Ad.objects.create(
+            title='Test Ad',
+            description='description',
+            user=user,
+            category=Category.objects.create(name='Категория')
+        )
+
+    def _sample(self, metric, **labels):
+        key = metric._key(labels)
+        value = metric._values.get(key, 0)
+        return value[-1] if isinstance(metric, Histogram) and value else value
+
+    def test_request_metrics(self):
+        """Тест учета времени и SQL-запросов по имени URL"""
+        requests_before = self._sample(
+            metrics.REQUEST_DURATION, view='ad_detail', method='GET'
+        )
+        queries_before = self._sample(metrics.DB_QUERIES, view='ad_detail')
+
+        self.client.get(reverse('ad_detail', kwargs={'ad_id': self.ad.id}))
+
+        self.assertEqual(
+            self._sample(metrics.REQUEST_DURATION, view='ad_detail', method='GET'),
+            requests_before + 1
+        )
+        self.assertGreater(
+            self._sample(metrics.DB_QUERIES, view='ad_detail'),
+            queries_before
+        )
+        self.assertEqual(self._sample(metrics.REQUESTS_IN_FLIGHT), 0)
+
+    def test_metrics_endpoint(self):
+        """Тест эндпоинта метрик"""
+        self.client.get(reverse('ad_detail', kwargs={'ad_id': self.ad.id}))
+        response = self.client.get(reverse('metrics'))
+        text = response.content.decode()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('http_request_duration_seconds_bucket{', text)
+        self.assertIn('view="ad_detail"', text)
+        self.assertIn(
+            'object_cache_requests_total{kind="ad",result="miss"} 1',
+            text
+        )
+
+    def test_trace_file(self):
+        """Тест записи трассировки запроса в файл"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.jsonl')
+            with override_settings(METRICS_TRACE_FILE=path):
+                self.client.get(reverse('ad_detail', kwargs={'ad_id': self.ad.id}))
+
+            with open(path) as file:
+                record = json.loads(file.readline())
+
+        self.assertEqual(record['view'], 'ad_detail')
+        self.assertEqual(record['status'], 200)
+        self.assertTrue(any(span['name'] == 'sql' for span in record['spans']))
+
+    def test_global_registry_has_request_metrics(self):
+        """Тест регистрации метрик запросов в общем реестре"""
+        self.assertIn('http_requests_total', registry.families())
+        self.assertIn('object_cache_requests_total', registry.families())
+
+
+class SlowQueryTest(TestCase):
+    client_class = NPlusOneClient
+
+    def setUp(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.ad = Ad.objects.create(
+            title='Test Ad',
+            description='description',
+            user=user,
+            category=Category.objects.create(name='Категория')
+        )
+
+    def test_normalize_sql(self):
+        """Тест замены литералов и сворачивания списков IN"""
+        self.assertEqual(
+            normalize_sql(
+                "SELECT *  FROM ads_ad WHERE id IN (%s, %s, %s)\n"
+                "AND title = 'Книга' AND band_0 = 15"
+            ),
+            'SELECT * FROM ads_ad WHERE id IN (...) AND title = ? AND band_0 = ?'
+        )
+
+    def test_fingerprint_ignores_values(self):
+        """Тест одинакового отпечатка запросов с разными значениями"""
+        self.assertEqual(
+            fingerprint('SELECT * FROM ads_ad WHERE id IN (%s, %s)'),
+            fingerprint('SELECT * FROM ads_ad WHERE id IN (%s, %s, %s, %s)')
+        )
+        self.assertNotEqual(
+            fingerprint('SELECT * FROM ads_ad WHERE id = %s'),
+            fingerprint('SELECT * FROM ads_category WHERE id = %s')
+        )
+
+    def test_plain_reads_detected(self):
+        """Тест отбора запросов, которые можно выполнить под EXPLAIN ANALYZE"""
+        self.assertTrue(is_plain_read('SELECT * FROM ads_ad WHERE id = %s'))
+        self.assertFalse(is_plain_read(
+            'SELECT * FROM ads_ad WHERE id = %s FOR UPDATE'
+        ))
+        self.assertFalse(is_plain_read(
+            'SELECT "id" FROM "ads_exchangeproposal" FOR NO KEY UPDATE OF "ads_exchangeproposal"'
+        ))
+        self.assertFalse(is_plain_read("SELECT pg_notify('events', 'from ad')"))
+        self.assertFalse(is_plain_read('UPDATE ads_ad SET view_count = 1'))
+
+    def test_normalize_params(self):
+        """Тест приведения параметров к JSON"""
+        self.assertEqual(
+            normalize_params((1, None, 'x' * 150, self.ad.created_at.date())),
+            [1, None, 'x' * 100, str(self.ad.created_at.date())]
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_EXPLAIN_SAMPLE_RATE=0)
+    def test_slow_queries_recorded(self):
+        """Тест записи медленных запросов с именем представления"""
+        self.client.get(reverse('ad_list'), {'condition': 'new'})
+
+        queries = SlowQuery.objects.filter(view='ad_list')
+        self.assertTrue(queries.exists())
+        self.assertTrue(all(query.plan == '' for query in queries))
+        self.assertTrue(any('new' in query.params for query in queries))
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_EXPLAIN_SAMPLE_RATE=1)
+    def test_plan_captured_for_sampled_queries(self):
+        """Тест сохранения плана для выбранных медленных запросов"""
+        with patch(
+            'apps.metrics.slow_queries.capture_plan',
+            return_value='Seq Scan on ads_ad'
+        ) as capture_plan:
+            self.client.get(reverse('ad_detail', kwargs={'ad_id': self.ad.id}))
+
+        capture_plan.assert_called()
+        self.assertTrue(
+            SlowQuery.objects.filter(plan='Seq Scan on ads_ad').exists()
+        )
+
+    def test_disabled_threshold(self):
+        """Тест отключения записи медленных запросов"""
+        with override_settings(SLOW_QUERY_THRESHOLD=None):
+            self.client.get(reverse('ad_list'))
+        self.assertFalse(SlowQuery.objects.exists())
+
+    def test_report_groups_by_fingerprint(self):
+        """Тест отчета, сгруппированного по отпечатку"""
+        sql = 'SELECT * FROM ads_ad WHERE id = ?'
+        for duration in (0.6, 0.8):
+            SlowQuery.objects.create(
+                fingerprint=fingerprint(sql),
+                view='ad_detail',
+                sql=sql,
+                params=[1],
+                duration=duration,
+                plan='Index Scan',
+            )
+
+        out = StringIO()
+        call_command('slow_queries_report', '--plans', stdout=out)
+        report = out.getvalue()
+
+        self.assertIn('запросов: 2', report)
+        self.assertIn('всего: 1.400 с', report)
+        self.assertIn('максимум: 0.800 с', report)
+        self.assertIn('Представления: ad_detail', report)
+        self.assertIn('Index Scan', report)
+
+    def test_report_empty(self):
+        """Тест отчета без медленных запросов"""
+        out = StringIO()
+        call_command('slow_queries_report', stdout=out)
+        self.assertIn('Медленных запросов нет', out.getvalue())
+
+
+class LoadTestTest(LiveServerTestCase):
+    def test_percentile(self):
+        """Тест перцентиля по ближайшему рангу"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 90), 0)
+
+    def test_cookie_deletion(self):
+        """Тест удаления cookie с нулевым max-age"""
+        client = HttpClient('http://localhost')
+        client._store_cookie('messages=abc; Path=/')
+        self.assertEqual(client.cookies, {'messages': 'abc'})
+        client._store_cookie('messages=""; Max-Age=0; Path=/')
+        self.assertEqual(client.cookies, {})
+
+    def test_seed_and_run(self):
+        """Тест короткого прогона против живого сервера"""
+        call_command(
+            'seed_load_data', '--users', '2', '--ads-per-user', '3',
+            stdout=StringIO()
+        )
+        self.assertEqual(Ad.objects.filter(user__username='loaduser0').count(), 3)
+
+        # Живой сервер делит с тестом одно соединение SQLite, поэтому
+        # анонимный пользователь запускается после входа первого.
+        stats = run_load_test(
+            self.live_server_url,
+            users=2,
+            duration=1,
+            ramp_up=0.5,
+            think_time=0,
+            anonymous=0.5
+        )
+        rows = {row['endpoint']: row for row in stats.rows()}
+
+        self.assertEqual(rows['login']['statuses'], {302: 1})
+        self.assertGreater(rows['ad_list']['requests'], 0)
+        self.assertEqual(sum(row['error_rate'] for row in rows.values()), 0)
+        self.assertIn('ad_list', stats.report())
@@ -0,0 +1,62 @@
+"""
+Трассировка запросов в файл METRICS_TRACE_FILE.
+
+Для каждого выбранного запроса в файл дописывается строка JSON
+с общим временем и спанами SQL-запросов, отсортировав которые
+по длительности можно найти горячие места под реальной нагрузкой.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+# Сколько символов SQL сохранять в спане
+SQL_LIMIT = 500
+
+_write_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self, request):
+        self.trace_id = uuid.uuid4().hex
+        self.method = request.method
+        self.path = request.path
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans = []
+
+    def add_span(self, name, start, duration, **attributes):
+        """start — значение time.perf_counter() в начале спана"""
+        self.spans.append({
+            'name': name,
+            'offset': round(start - self._start, 6),
+            'duration': round(duration, 6),
+            **attributes,
+        })
+
+    def finish(self, view, status):
+        record = {
+            'trace_id': self.trace_id,
+            'started_at': self.started_at,
+            'view': view,
+            'method': self.method,
+            'path': self.path,
+            'status': status,
+            'duration': round(time.perf_counter() - self._start, 6),
+            'spans': self.spans,
+        }
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with _write_lock, open(settings.METRICS_TRACE_FILE, 'a') as file:
+            file.write(line)
+
+
+def start_trace(request):
+    """Trace для запроса или None, если трассировка выключена"""
+    if not settings.METRICS_TRACE_FILE:
+        return None
+    if random.random() >= settings.METRICS_TRACE_SAMPLE_RATE:
+        return None
+    return Trace(request)
@@ -22,12 +22,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'apps.ads',
     'apps.users',
+    'apps.metrics',
 ]
 
 MIDDLEWARE = [
+    'apps.metrics.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +60,11 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 
 
+# Минимальная схожесть заголовка с запросом для нечеткого поиска
+FUZZY_SEARCH_THRESHOLD = float(os.getenv('FUZZY_SEARCH_THRESHOLD', 0.3))
+# Максимальное число ранжируемых результатов поиска
+FUZZY_SEARCH_LIMIT = 200
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -65,9 +73,43 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASS'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT', 5432),
+        'OPTIONS': {
+            'options': (
+                '-c pg_trgm.word_similarity_threshold='
+                f'{FUZZY_SEARCH_THRESHOLD}'
+            ),
+        },
     }
 }
 
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Сколько секунд хранить в кэше объявления и предложения обмена
+OBJECT_CACHE_TIMEOUT = 300
+
+# Как часто процесс сверяет свои индексы поиска и подсказок с общей
+# версией и перестраивает их после изменений в других процессах, секунд
+SEARCH_INDEX_REFRESH_INTERVAL = 30
+
+# Сколько секунд nginx кэширует страницы для анонимных пользователей
+MICROCACHE_SECONDS = 10
+# Служебный сервер nginx для обновления кэша, например http://nginx:8081
+NGINX_PURGE_URL = os.getenv('NGINX_PURGE_URL')
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -105,3 +147,77 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+SIMILAR_ADS_COUNT = 5
+
+AUTOCOMPLETE_LIMIT = 10
+
+# Максимальное расстояние Хэмминга между SimHash дубликатов (не больше 3)
+DUPLICATE_AD_MAX_DISTANCE = 3
+# Среди чьих объявлений искать дубликаты: 'user' - только свои, 'all' - все
+DUPLICATE_AD_SCOPE = 'user'
+
+# Через сколько дней неактивности объявление переносится в архив
+AD_ARCHIVE_AFTER_DAYS = 180
+
+# Сколько дней хранить предложения обмена по статусам после последнего
+# изменения (принятые хранятся всегда), см. manage.py purge_proposals
+PROPOSAL_RETENTION_DAYS = {
+    'rejected': 90,
+    'waiting': 180,
+}
+
+# Сколько поисков может сохранить один пользователь
+SAVED_SEARCH_LIMIT = 20
+
+# Как часто воркер записывает накопленные просмотры объявлений, секунд
+VIEW_COUNT_FLUSH_INTERVAL = 10
+# При скольких объявлениях с просмотрами запись идет раньше интервала
+VIEW_COUNT_MAX_PENDING = 1000
+
+# Очки рейтинга популярности за просмотр и за полученное предложение обмена
+TRENDING_VIEW_WEIGHT = 1.0
+TRENDING_PROPOSAL_WEIGHT = 10.0
+# За сколько часов рейтинг уменьшается вдвое
+TRENDING_HALF_LIFE_HOURS = 24
+# Рейтинги ниже этого значения удаляются при затухании
+TRENDING_MIN_SCORE = 0.5
+
+# Лимиты POST-запросов: {view: {'user' | 'ip': (запросов, за секунд)}}
+THROTTLE_RATES = {
+    'ad_create': {
+        'user': (10, 60),
+        'ip': (30, 60),
+    },
+    'proposal_create': {
+        'user': (20, 60),
+        'ip': (60, 60),
+    },
+    # Отметка просмотра доступна без входа, поэтому лимит только по IP
+    'ad_view': {
+        'ip': (60, 60),
+    },
+}
+# Заголовок с адресом клиента, который выставляет nginx
+THROTTLE_IP_HEADER = 'HTTP_X_REAL_IP'
+
+# Каталог снимков метрик воркеров gunicorn; без него метрики по процессу
+METRICS_DIR = os.getenv('METRICS_DIR')
+# Как часто воркер сохраняет снимок метрик, секунд
+METRICS_SNAPSHOT_INTERVAL = 5
+# Файл трассировки запросов (JSON Lines); без него трассировка выключена
+METRICS_TRACE_FILE = os.getenv('METRICS_TRACE_FILE')
+# Доля трассируемых запросов
+METRICS_TRACE_SAMPLE_RATE = float(os.getenv('METRICS_TRACE_SAMPLE_RATE', 1.0))
+
+# Запросы дольше стольких секунд записываются в SlowQuery; пустое
+# значение или off выключает запись (SLOW_QUERY_THRESHOLD = None)
+_slow_query_threshold = os.getenv('SLOW_QUERY_THRESHOLD', '0.5').strip()
+SLOW_QUERY_THRESHOLD = (
+    None if _slow_query_threshold.lower() in ('', 'off', 'none')
+    else float(_slow_query_threshold)
+)
+# Для какой доли медленных запросов сохранять EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(
+    os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1)
+)
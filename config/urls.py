@@ -8,4 +8,5 @@ urlpatterns = [
     path('', include('apps.ads.urls')),
     path('users/', include('apps.users.urls')),
     path('accounts/', include('django.contrib.auth.urls')),
+    path('metrics/', include('apps.metrics.urls')),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
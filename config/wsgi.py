@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+from apps.ads.autocomplete import warm_up_prefix_index  # noqa: E402
+
+warm_up_prefix_index()
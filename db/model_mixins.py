@@ -10,3 +10,13 @@ class CreatedAtMixin(models.Model):
 
     class Meta:
         abstract = True
+
+
+class UpdatedAtMixin(models.Model):
+    updated_at = models.DateTimeField(
+        _('Дата изменения'),
+        auto_now=True,
+    )
+
+    class Meta:
+        abstract = True
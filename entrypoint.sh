@@ -2,4 +2,8 @@
 
 python manage.py collectstatic --noinput
 python manage.py migrate --noinput
+# Снимки метрик прошлого запуска не должны попасть в новые значения
+if [ -n "$METRICS_DIR" ]; then
+    rm -rf "$METRICS_DIR"
+fi
 gunicorn config.wsgi:application --bind 0.0.0.0:8000 --log-level warning
\ No newline at end of file
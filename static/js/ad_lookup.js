@@ -0,0 +1,64 @@
+// Поиск объявлений для полей формы предложения обмена
+document.querySelectorAll('select[data-lookup-url]').forEach((select) => {
+    const input = document.createElement('input');
+    input.type = 'search';
+    input.placeholder = 'Начните вводить название';
+    const more = document.createElement('button');
+    more.type = 'button';
+    more.textContent = 'Ещё';
+    more.hidden = true;
+    select.before(input);
+    select.after(more);
+
+    let timer = null;
+    let controller = null;
+    let nextCursor = null;
+
+    const load = async (append) => {
+        if (controller) {
+            controller.abort();
+        }
+        controller = new AbortController();
+
+        const params = new URLSearchParams({q: input.value.trim()});
+        if (append && nextCursor) {
+            params.set('cursor', nextCursor);
+        }
+        try {
+            const response = await fetch(
+                `${select.dataset.lookupUrl}&${params}`,
+                {signal: controller.signal}
+            );
+            const data = await response.json();
+            if (!append) {
+                const selected = select.selectedOptions[0];
+                select.replaceChildren(select.options[0]);
+                if (selected && selected.value) {
+                    select.append(selected);
+                }
+            }
+            data.results.forEach((ad) => {
+                if (!select.querySelector(`option[value="${ad.id}"]`)) {
+                    select.append(new Option(ad.text, ad.id));
+                }
+            });
+            nextCursor = data.next_cursor;
+            more.hidden = !nextCursor;
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                more.hidden = true;
+            }
+        }
+    };
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => load(false), 200);
+    });
+    more.addEventListener('click', () => load(true));
+    select.addEventListener('focus', () => {
+        if (select.options.length <= 2 && nextCursor === null) {
+            load(false);
+        }
+    }, {once: true});
+});
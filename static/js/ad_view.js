@@ -0,0 +1,8 @@
+// Отметка просмотра объявления. Страница может прийти из кэша nginx,
+// поэтому просмотр отправляется отдельным запросом.
+document.querySelectorAll('[data-view-url]').forEach((element) => {
+    const url = element.dataset.viewUrl;
+    if (!navigator.sendBeacon || !navigator.sendBeacon(url)) {
+        fetch(url, {method: 'POST', keepalive: true}).catch(() => {});
+    }
+});
@@ -0,0 +1,37 @@
+// Подсказки для строки поиска объявлений
+document.querySelectorAll('input[data-autocomplete-url]').forEach((input) => {
+    const datalist = document.getElementById(input.getAttribute('list'));
+    let timer = null;
+    let controller = null;
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(async () => {
+            const query = input.value.trim();
+            if (query.length < 2) {
+                datalist.replaceChildren();
+                return;
+            }
+
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+
+            const url = `${input.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`;
+            try {
+                const response = await fetch(url, {signal: controller.signal});
+                const data = await response.json();
+                datalist.replaceChildren(...data.suggestions.map((suggestion) => {
+                    const option = document.createElement('option');
+                    option.value = suggestion;
+                    return option;
+                }));
+            } catch (error) {
+                if (error.name !== 'AbortError') {
+                    datalist.replaceChildren();
+                }
+            }
+        }, 150);
+    });
+});
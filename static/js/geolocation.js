@@ -0,0 +1,33 @@
+// Заполнение координат формы по местоположению браузера.
+// В форме поиска ищутся поля lat/lon и форма сразу отправляется,
+// в форме объявления заполняются поля latitude/longitude.
+document.querySelectorAll('button[data-geolocate]').forEach((button) => {
+    const form = button.form;
+    const latitude = form.elements.lat || form.elements.latitude;
+    const longitude = form.elements.lon || form.elements.longitude;
+    const submit = form.method.toLowerCase() === 'get';
+
+    if (!navigator.geolocation) {
+        button.disabled = true;
+        return;
+    }
+
+    button.addEventListener('click', () => {
+        button.disabled = true;
+        navigator.geolocation.getCurrentPosition(
+            (position) => {
+                latitude.value = position.coords.latitude.toFixed(6);
+                longitude.value = position.coords.longitude.toFixed(6);
+                button.disabled = false;
+                if (submit) {
+                    form.submit();
+                }
+            },
+            () => {
+                button.disabled = false;
+                alert('Не удалось определить местоположение');
+            },
+            {maximumAge: 600000, timeout: 10000}
+        );
+    });
+});
@@ -0,0 +1,16 @@
+// Уведомления о новых предложениях и изменении статусов без обновления страницы
+const notice = document.getElementById('proposal-events-notice');
+if (notice && window.EventSource) {
+    const source = new EventSource(notice.dataset.eventsUrl);
+    const messages = {
+        created: 'Пришло новое предложение обмена.',
+        status_changed: 'Статус предложения обмена изменился.',
+    };
+
+    Object.keys(messages).forEach((type) => {
+        source.addEventListener(type, () => {
+            notice.querySelector('.text').textContent = messages[type];
+            notice.hidden = false;
+        });
+    });
+}